@@ -0,0 +1,130 @@
+"""
+Stress test: one Agent shared by many threads.
+
+Every thread count runs the same mixed workload against a single shared Agent:
+one-shot predictions of distinct conversations, plus incremental predictions that
+all threads make on a few shared conversation ids. Reports throughput and latency
+per thread count, and checks that sharing is safe:
+
+- every one-shot result equals the single-threaded result for that conversation;
+- no incremental update is lost: each shared conversation's turn counter equals
+  the number of incremental predictions made on it.
+
+Runs offline against the stub models. With the opensource backend, LLM calls share
+one llama.cpp context and are serialized (--no-llm measures the encoder and PPO
+alone); the remote backends scale with threads until the (fake) API latency is hidden.
+
+    python benchmarks/bench_concurrency.py --backends opensource openai --threads 1 2 4 8 16
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import _patched_openai, build_agent
+from stubs import synthetic_conversation
+
+SHARED_CONVERSATIONS = 4
+
+
+def _workload(requests: int, turns: int):
+    """(kind, conversation_id, history) items: 3 of 4 one-shot, 1 of 4 incremental on a shared id"""
+    items = []
+    for i in range(requests):
+        history = synthetic_conversation(turns, seed=i)
+        if i % 4 == 3:
+            items.append(('incremental', f"shared-{(i // 4) % SHARED_CONVERSATIONS}", history))
+        else:
+            items.append(('one_shot', f"conversation-{i}", history))
+    return items
+
+
+def _run(predictor, item):
+    kind, conversation_id, history = item
+    start = time.perf_counter()
+    result = predictor.predict_conversion(
+        history, conversation_id, is_incremental_prediction=(kind == 'incremental')
+    )
+    return time.perf_counter() - start, result
+
+
+def bench_backend(backend: str, args):
+    with _patched_openai(args):
+        agent, _ = build_agent(backend, args)
+    predictor = agent.predictor
+    if args.no_llm and backend == "opensource":
+        predictor.embedding_provider.llm = None
+    items = _workload(args.requests, args.turns)
+    one_shot = [item for item in items if item[0] == 'one_shot']
+    expected = {item[1]: _run(predictor, item)[1]['probability'] for item in one_shot[:16]}
+    _run(predictor, items[0])   # warm up lazy initialization outside the timed runs
+
+    rows = []
+    for threads in args.threads:
+        for j in range(SHARED_CONVERSATIONS):
+            predictor.conversation_states.pop(f"shared-{j}", None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            outcomes = list(pool.map(lambda item: _run(predictor, item), items))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _ in outcomes)
+        mismatches = sum(
+            1 for item, (_, result) in zip(items, outcomes)
+            if item[1] in expected and abs(result['probability'] - expected[item[1]]) > 1e-6
+        )
+        increments = sum(1 for item in items if item[0] == 'incremental')
+        recorded = sum(
+            predictor.conversation_states.get(f"shared-{j}", {}).get('turn_number', 0)
+            for j in range(SHARED_CONVERSATIONS)
+        )
+        rows.append({
+            'threads': threads,
+            'requests_per_s': round(len(items) / elapsed, 2),
+            'p50_ms': round(1000 * statistics.median(latencies), 2),
+            'p95_ms': round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+            'result_mismatches': mismatches,
+            'lost_updates': increments - recorded,
+        })
+        print(f"{backend:>10} {threads:>3} threads: {rows[-1]['requests_per_s']:8.1f} req/s, "
+              f"p50 {rows[-1]['p50_ms']:.1f} ms, mismatches {mismatches}, lost updates {increments - recorded}",
+              file=sys.stderr, flush=True)
+
+    base = rows[0]['requests_per_s']
+    for row in rows:
+        row['speedup'] = round(row['requests_per_s'] / base, 2)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["opensource", "openai"], choices=["opensource", "openai", "azure"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=64, help="Stub encoder hidden size")
+    parser.add_argument("--layers", type=int, default=2, help="Stub encoder layers")
+    parser.add_argument("--remote-embedding-dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Fake remote embedding latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Fake remote chat base latency (s)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0005, help="Fake LLM decode time per token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Log-normal sigma for fake remote latency")
+    parser.add_argument("--no-llm", action="store_true", help="Opensource: heuristic metrics only (encoder + PPO)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    args = parser.parse_args()
+
+    report = {backend: bench_backend(backend, args) for backend in args.backends}
+    print(json.dumps(report, indent=2))
+    failed = any(row['result_mismatches'] or row['lost_updates'] for rows in report.values() for row in rows)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Sweep: how to divide a core budget between scoring workers, the embedding encoder
+and the LLM.
+
+For one core count, every combination of worker count and LLM share is run as a
+CPUBudget in a fresh interpreter (thread settings are per process and some can only
+be set once) that scores the same conversations with score_jsonl. Prints
+conversations per second for each configuration, plus an unmanaged baseline (no
+CPUBudget: every library picks its own thread count), and the best configuration.
+
+The encoder is real (a randomly initialized BERT, or --embedding-model). Without
+--llm-model the LLM is a stub whose compute time shrinks with the llama.cpp threads
+it is given, as threads ** -efficiency; pass a GGUF file to measure a real one.
+
+    python benchmarks/bench_cpu_sweep.py --cores 8
+    python benchmarks/bench_cpu_sweep.py --cores 0-15 --pin --llm-model model.gguf
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from stubs import FakeLlama, build_synthetic_ppo, build_tiny_embedding_model, synthetic_conversation
+
+
+class ThreadScaledLlama(FakeLlama):
+    """FakeLlama whose prompt evaluation and decode get faster with more threads"""
+
+    def __init__(self, threads: int, efficiency: float, **kwargs):
+        super().__init__(**kwargs)
+        scale = max(1, threads) ** -efficiency
+        self.prompt_seconds_per_char *= scale
+        self.seconds_per_token *= scale
+
+
+def _run_config(config):
+    """Score config['input'] under one CPU budget (runs in its own interpreter)"""
+    from deepmost import sales
+    from deepmost.core.resources import CPUBudget
+    from deepmost.scoring import score_jsonl
+
+    budget = None
+    if config['llm_share'] is not None:
+        budget = CPUBudget(
+            cores=config['cores'], workers=config['workers'], llm_share=config['llm_share'], pin=config['pin']
+        )
+    agent = sales.Agent(
+        model_path=config['ppo'], embedding_model=config['encoder'], llm_model=config['llm_model'],
+        use_gpu=False, force_backend="opensource", cpu_budget=budget
+    )
+    predictor = agent.predictor
+    if not config['llm_model']:
+        llm_threads = os.cpu_count() or 1
+        if budget is not None:
+            # The stub stands in for a local LLM, so plan with one
+            predictor.cpu_plan = budget.plan(llm=True)
+            predictor.cpu_plan.apply()
+            llm_threads = predictor.cpu_plan.llm_threads
+        predictor.embedding_provider.llm = ThreadScaledLlama(
+            llm_threads, config['efficiency'], seconds_per_token=config['seconds_per_token']
+        )
+
+    summary = score_jsonl(
+        agent, config['input'], config['output'], batch_size=config['batch_size'],
+        resume=False, report_interval=0, workers=config['workers']
+    )
+    return {
+        'conversations_per_s': round(summary['conversations_per_s'], 2),
+        'errors': summary['errors'],
+        'plan': predictor.cpu_plan.as_dict() if predictor.cpu_plan else None,
+    }
+
+
+def _sweep(args, cores, encoder, ppo, input_path):
+    configs = [(workers, None) for workers in args.workers]
+    configs += [(workers, share) for workers in args.workers for share in args.llm_shares]
+    rows = []
+    for workers, share in configs:
+        config = {
+            'cores': cores, 'workers': workers, 'llm_share': share, 'pin': args.pin,
+            'ppo': ppo, 'encoder': encoder, 'llm_model': args.llm_model,
+            'efficiency': args.llm_efficiency, 'seconds_per_token': args.seconds_per_token,
+            'input': input_path, 'output': os.path.join(args.workdir, "sweep-output.jsonl"),
+            'batch_size': max(1, args.conversations // (4 * workers)),
+        }
+        if os.path.exists(config['output']):
+            os.remove(config['output'])
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-config", json.dumps(config)],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            print(completed.stderr[-2000:], file=sys.stderr)
+            raise SystemExit(f"configuration workers={workers} llm_share={share} failed")
+        row = {'workers': workers, 'llm_share': share, **json.loads(completed.stdout.strip().splitlines()[-1])}
+        rows.append(row)
+        plan = row['plan']
+        threads = f"{plan['encoder_threads']} encoder + {plan['llm_threads']} LLM threads" if plan else "unmanaged"
+        print(f"{workers:>3} workers, {threads:>28}: {row['conversations_per_s']:8.2f} conversations/s",
+              file=sys.stderr, flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cores", default=None, help="Core count or ids, e.g. 8 or 0-7 (default: all available)")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Worker counts to try (default: powers of two up to the core count)")
+    parser.add_argument("--llm-shares", type=float, nargs="+", default=[0.25, 0.5, 0.75])
+    parser.add_argument("--pin", action="store_true", help="Pin each worker to its cores")
+    parser.add_argument("--conversations", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--embedding-model", default=None, help="HF model name; defaults to a tiny random encoder")
+    parser.add_argument("--hidden-size", type=int, default=256, help="Stub encoder hidden size")
+    parser.add_argument("--layers", type=int, default=4, help="Stub encoder layers")
+    parser.add_argument("--llm-model", default=None, help="GGUF model to measure instead of the LLM stub")
+    parser.add_argument("--seconds-per-token", type=float, default=0.01, help="Stub LLM single-thread decode time")
+    parser.add_argument("--llm-efficiency", type=float, default=0.8,
+                        help="Stub LLM parallel efficiency: time scales as threads ** -efficiency")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    parser.add_argument("--run-config", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_config:
+        print(json.dumps(_run_config(json.loads(args.run_config))))
+        return
+
+    from deepmost.core.resources import CPUBudget, parse_cores
+
+    cores = CPUBudget(cores=parse_cores(args.cores) if args.cores else None).cores
+    if args.workers is None:
+        args.workers = [w for w in (1, 2, 4, 8, 16, 32, 64) if w <= len(cores)]
+    os.makedirs(args.workdir, exist_ok=True)
+    encoder = args.embedding_model or build_tiny_embedding_model(
+        os.path.join(args.workdir, f"tiny-encoder-{args.hidden_size}x{args.layers}"),
+        hidden_size=args.hidden_size, num_layers=args.layers
+    )
+    ppo = build_synthetic_ppo(os.path.join(args.workdir, "synthetic_ppo_1024.zip"), embedding_dim=1024)
+    input_path = os.path.join(args.workdir, "sweep-input.jsonl")
+    with open(input_path, "w") as f:
+        for i in range(args.conversations):
+            f.write(json.dumps({'id': f"c{i}", 'conversation': synthetic_conversation(args.turns, seed=i)}) + "\n")
+
+    rows = _sweep(args, cores, encoder, ppo, input_path)
+    best = max(rows, key=lambda row: row['conversations_per_s'])
+    report = {'cores': cores, 'llm': args.llm_model or 'stub', 'results': rows, 'best': best}
+    print(f"best for {len(cores)} cores: {best['workers']} workers, llm_share {best['llm_share']} "
+          f"({best['conversations_per_s']} conversations/s)", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
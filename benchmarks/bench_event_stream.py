@@ -0,0 +1,140 @@
+"""
+Benchmark: per-message event stream versus resending the growing transcript.
+
+Replays an interleaved feed of N conversations, one event per message, two ways:
+
+- resend: the client keeps each history and calls Agent.predict with the whole
+  transcript on every message (O(n^2) bytes per conversation);
+- stream: every message is sent once to a ConversationStream, which keeps the
+  history and incremental state server-side (O(n) bytes).
+
+Reports the bytes a client would send, events per second and per-event latency,
+and the state left behind: the stream expires idle conversations (event time is
+simulated with timestamps) and closes the rest at the end of the feed. Fully offline.
+
+    python benchmarks/bench_event_stream.py --conversations 32 --messages 40
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import _patched_openai, build_agent
+from stubs import synthetic_conversation
+
+from deepmost.streaming import ConversationStream
+
+
+def build_feed(conversations: int, messages: int, idle_every: int, seed: int = 0):
+    """Interleaved turn events; every idle_every-th conversation goes quiet halfway through"""
+    rng = random.Random(seed)
+    transcripts = {f"conversation-{i}": synthetic_conversation(messages, seed=i) for i in range(conversations)}
+    quiet = {cid for i, cid in enumerate(transcripts) if idle_every and i % idle_every == 0}
+    cursors = {cid: 0 for cid in transcripts}
+    events, clock = [], 0.0
+    while True:
+        open_ids = [cid for cid in transcripts if cursors[cid] < len(transcripts[cid])
+                    and not (cid in quiet and cursors[cid] >= messages // 2)]
+        if not open_ids:
+            break
+        cid = rng.choice(open_ids)
+        clock += 1.0
+        events.append({'conversation_id': cid, **transcripts[cid][cursors[cid]], 'timestamp': clock})
+        cursors[cid] += 1
+    return events
+
+
+def run_resend(agent, events):
+    histories, latencies, sent = {}, [], 0
+    start = time.perf_counter()
+    for event in events:
+        history = histories.setdefault(event['conversation_id'], [])
+        history.append({'speaker': event['speaker'], 'message': event['message']})
+        sent += len(json.dumps({'conversation_id': event['conversation_id'], 'conversation': history}))
+        t = time.perf_counter()
+        agent.predict(history, conversation_id=event['conversation_id'])
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - start, latencies, sent
+
+
+def run_stream(stream, events):
+    latencies, sent, updates = [], 0, []
+    start = time.perf_counter()
+    for event in events:
+        line = json.dumps(event)
+        sent += len(line)
+        t = time.perf_counter()
+        updates.extend(stream.push(line))
+        latencies.append(time.perf_counter() - t)
+    updates.extend(stream.close())
+    return time.perf_counter() - start, latencies, sent, updates
+
+
+def _row(events, elapsed, latencies, sent):
+    latencies = sorted(latencies)
+    return {
+        'events_per_s': round(len(events) / elapsed, 2),
+        'p50_ms': round(1000 * statistics.median(latencies), 2),
+        'p95_ms': round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+        'bytes_sent': sent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="opensource", choices=["opensource", "openai", "azure"])
+    parser.add_argument("--conversations", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=40, help="Messages per conversation")
+    parser.add_argument("--idle-every", type=int, default=4, help="Every Nth conversation goes quiet halfway (0: none)")
+    parser.add_argument("--idle-timeout", type=float, default=200.0, help="Idle timeout in feed events (one per second)")
+    parser.add_argument("--hidden-size", type=int, default=64, help="Stub encoder hidden size")
+    parser.add_argument("--layers", type=int, default=2, help="Stub encoder layers")
+    parser.add_argument("--remote-embedding-dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Fake remote embedding latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="Fake remote chat base latency (s)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0, help="Fake LLM decode time per token")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    args = parser.parse_args()
+
+    with _patched_openai(args):
+        agent, _ = build_agent(args.backend, args)
+        events = build_feed(args.conversations, args.messages, args.idle_every)
+        agent.predict(synthetic_conversation(4, seed=10**6))   # warm up lazy initialization
+
+        elapsed, latencies, sent = run_resend(agent, events)
+        resend = {**_row(events, elapsed, latencies, sent), 'states_left': len(agent.predictor.conversation_states)}
+        agent.predictor.conversation_states.clear()
+
+        stream = ConversationStream(agent, idle_timeout=args.idle_timeout)
+        elapsed, latencies, sent, updates = run_stream(stream, events)
+        streamed = {
+            **_row(events, elapsed, latencies, sent),
+            'states_left': len(agent.predictor.conversation_states),
+            **{kind: stream.counts[kind] for kind in ('predictions', 'expired', 'closed', 'errors')},
+        }
+
+    report = {
+        'events': len(events),
+        'conversations': args.conversations,
+        'resend': resend,
+        'stream': streamed,
+        'bytes_ratio': round(resend['bytes_sent'] / streamed['bytes_sent'], 1),
+    }
+    for label in ('resend', 'stream'):
+        row = report[label]
+        print(f"{label:>7}: {row['events_per_s']:8.1f} events/s, p50 {row['p50_ms']:.1f} ms, "
+              f"{row['bytes_sent'] / 1e6:.2f} MB sent, {row['states_left']} states left", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    return 1 if streamed['errors'] or streamed['states_left'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
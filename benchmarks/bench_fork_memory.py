@@ -0,0 +1,125 @@
+"""
+Benchmark: per-worker memory of N scoring workers that each load their own models,
+versus N workers forked from a parent that loaded them once (preload-then-fork),
+with and without Agent.prepare_for_fork().
+
+Reports rss / pss / uss per worker. uss (pages no other process maps) is what each
+additional worker costs; pss splits shared pages evenly between their users.
+Linux only (reads /proc/<pid>/smaps_rollup). Runs offline with a randomly
+initialized encoder; pass --embedding-model BAAI/bge-m3 for the real one.
+
+    python benchmarks/bench_fork_memory.py --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from deepmost import sales
+from deepmost.core.forking import fork_pool, process_memory
+from stubs import build_synthetic_ppo, build_tiny_embedding_model, synthetic_conversation
+
+_INDEPENDENT_WORKER = """
+import json, sys
+from deepmost import sales
+from deepmost.core.forking import process_memory
+agent = sales.Agent(model_path=sys.argv[1], embedding_model=sys.argv[2], use_gpu=False, force_backend="opensource")
+conversations = json.loads(sys.argv[3])
+for conversation in conversations:
+    agent.predict(conversation)
+print(json.dumps(process_memory()))
+"""
+
+_agent = None
+
+
+def _score(conversations):
+    for conversation in conversations:
+        _agent.predict(conversation)
+    return os.getpid()
+
+
+def _forked(agent, conversations, workers: int, prepare: bool):
+    global _agent
+    _agent = agent
+    if prepare:
+        agent.prepare_for_fork()
+    pool = fork_pool(workers)
+    try:
+        shards = [conversations[i::workers] for i in range(workers)]
+        # map may hand several shards to one worker; repeat until every worker has scored
+        pids = set()
+        while len(pids) < workers:
+            pids.update(pool.map(_score, shards, chunksize=1))
+        return [process_memory(pid) for pid in sorted(pids)]
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _independent(ppo_path, embedding_model, conversations, workers: int):
+    shards = [conversations[i::workers] for i in range(workers)]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", _INDEPENDENT_WORKER, ppo_path, embedding_model, json.dumps(shard)],
+            cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        for shard in shards
+    ]
+    return [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in processes]
+
+
+def _summary(per_worker):
+    return {
+        key: round(sum(m[key] for m in per_worker) / len(per_worker), 1)
+        for key in ('rss_mb', 'pss_mb', 'uss_mb', 'shared_mb')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--conversations", type=int, default=32)
+    parser.add_argument("--embedding-model", default=None, help="HF model name; defaults to a tiny random encoder")
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    args = parser.parse_args()
+
+    if process_memory() is None:
+        raise SystemExit("Needs /proc/<pid>/smaps_rollup (Linux)")
+
+    embedding_model = args.embedding_model or build_tiny_embedding_model(
+        os.path.join(args.workdir, f"tiny-encoder-{args.hidden_size}x{args.layers}"),
+        hidden_size=args.hidden_size,
+        num_layers=args.layers
+    )
+    ppo_path = build_synthetic_ppo(os.path.join(args.workdir, "synthetic_ppo_1024.zip"), embedding_dim=1024)
+    conversations = [synthetic_conversation(4 + i % 8, seed=i) for i in range(args.conversations)]
+
+    report = {'workers': args.workers, 'embedding_model': embedding_model}
+    per_worker = _independent(ppo_path, embedding_model, conversations, args.workers)
+    report['independent'] = {'mean': _summary(per_worker), 'workers': per_worker}
+
+    # Unprepared runs first: prepare_for_fork changes the parent's models for good
+    agent = sales.Agent(model_path=ppo_path, embedding_model=embedding_model, use_gpu=False, force_backend="opensource")
+    agent.predict(conversations[0])
+    for label, prepare in (('forked', False), ('forked_prepared', True)):
+        per_worker = _forked(agent, conversations, args.workers, prepare)
+        report[label] = {'parent': process_memory(), 'mean': _summary(per_worker), 'workers': per_worker}
+
+    for label in ('independent', 'forked', 'forked_prepared'):
+        mean = report[label]['mean']
+        print(f"{label:>16}: {mean['uss_mb']:8.1f} MB unique / {mean['pss_mb']:8.1f} MB proportional "
+              f"/ {mean['rss_mb']:8.1f} MB resident per worker", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: end-to-end latency of generate_response_and_predict with and without
+overlapping history-prefix embedding work with response generation.
+
+Runs fully offline with a randomly initialized encoder, a synthetic PPO policy and
+a fake llama.cpp LLM. Pass --embedding-model BAAI/bge-m3 to measure the real encoder.
+
+    python benchmarks/bench_response_pipeline.py --turns 4 16 64
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepmost.core.predictor import SalesPredictor
+from stubs import FakeLlama, build_synthetic_ppo, build_tiny_embedding_model, synthetic_conversation
+
+
+def _time_calls(predictor: SalesPredictor, conversation, repeats: int):
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        predictor.generate_response_and_predict(
+            conversation_history=conversation,
+            user_input="That sounds good, what does the plan cost per month?",
+            conversation_id=f"bench-{i}"
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--embedding-model", default=None, help="HF model name; defaults to a tiny random encoder")
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--seconds-per-token", type=float, default=0.01)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    args = parser.parse_args()
+
+    embedding_model = args.embedding_model or build_tiny_embedding_model(
+        os.path.join(args.workdir, f"tiny-encoder-{args.hidden_size}x{args.layers}"),
+        hidden_size=args.hidden_size,
+        num_layers=args.layers
+    )
+    ppo_path = build_synthetic_ppo(os.path.join(args.workdir, "synthetic_ppo_1024.zip"), embedding_dim=1024)
+
+    predictor = SalesPredictor(model_path=ppo_path, embedding_model=embedding_model, use_gpu=False)
+    predictor.embedding_provider.llm = FakeLlama(seconds_per_token=args.seconds_per_token)
+
+    results = []
+    for turns in args.turns:
+        conversation = synthetic_conversation(turns)
+        row = {'turns': turns}
+        for label, enabled in (('sequential', False), ('pipelined', True)):
+            predictor.pipeline_history = enabled
+            _time_calls(predictor, conversation, 1)  # warmup
+            timings = _time_calls(predictor, conversation, args.repeats)
+            row[f'{label}_mean_s'] = statistics.mean(timings)
+            row[f'{label}_p50_s'] = statistics.median(timings)
+        row['latency_reduction_pct'] = 100.0 * (1 - row['pipelined_mean_s'] / row['sequential_mean_s'])
+        results.append(row)
+        print(
+            f"turns={turns:4d}  sequential={row['sequential_mean_s'] * 1000:8.1f} ms  "
+            f"pipelined={row['pipelined_mean_s'] * 1000:8.1f} ms  "
+            f"reduction={row['latency_reduction_pct']:5.1f}%",
+            file=sys.stderr
+        )
+
+    print(json.dumps({'benchmark': 'response_pipeline', 'embedding_model': embedding_model, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
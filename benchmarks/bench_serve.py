@@ -0,0 +1,174 @@
+"""
+Benchmark: `deepmost serve` under concurrent load, with and without dynamic batching.
+
+Starts a PredictionServer in-process on a free local port with a stub-backed Agent,
+then N client threads send POST /predict requests over keep-alive connections.
+Runs once with --max-batch-size 1 (every request scored on its own) and once per
+batch size given, and reports throughput, latency and the mean batch size the
+server formed. Also checks that served results equal Agent.predict_batch, that the
+other endpoints answer, and that a flood beyond --max-queue is rejected with 503.
+Fully offline.
+
+    python benchmarks/bench_serve.py --clients 32 --batch-sizes 8 32
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import _patched_openai, build_agent
+from stubs import synthetic_conversation
+
+from deepmost.server import PredictionServer, ServerConfig
+
+
+class _ServerThread:
+    """A PredictionServer running on its own event loop in a background thread"""
+
+    def __init__(self, agent, config: ServerConfig):
+        self.server = PredictionServer(agent, config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.host, self.port = asyncio.run_coroutine_threadsafe(self.server.start("127.0.0.1", 0), self.loop).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def _request(connection, method, path, body=None):
+    connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                       headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def _load(server, conversations, clients: int):
+    local = threading.local()
+
+    def send(conversation):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection(server.host, server.port, timeout=60)
+        start = time.perf_counter()
+        status, payload = _request(local.connection, 'POST', '/predict', {'conversation': conversation})
+        return time.perf_counter() - start, status, payload
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(send, conversations))
+    return time.perf_counter() - start, outcomes
+
+
+def bench_batch_size(agent, conversations, expected, batch_size: int, args):
+    server = _ServerThread(agent, ServerConfig(
+        max_batch_size=batch_size, max_wait_ms=args.max_wait_ms, max_queue=args.max_queue, warmup=False
+    ))
+    try:
+        elapsed, outcomes = _load(server, conversations, args.clients)
+        stats = server.server.batcher.stats()
+    finally:
+        server.close()
+    latencies = sorted(latency for latency, _, _ in outcomes)
+    failures = sum(1 for _, status, _ in outcomes if status != 200)
+    mismatches = sum(
+        1 for (_, status, payload), probability in zip(outcomes, expected)
+        if status == 200 and abs(payload['probability'] - probability) > 1e-6
+    )
+    row = {
+        'max_batch_size': batch_size,
+        'requests_per_s': round(len(conversations) / elapsed, 2),
+        'p50_ms': round(1000 * statistics.median(latencies), 2),
+        'p95_ms': round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+        'mean_batch_size': stats['mean_batch_size'],
+        'failures': failures,
+        'result_mismatches': mismatches,
+    }
+    print(f"max batch {batch_size:>3}: {row['requests_per_s']:8.1f} req/s, p50 {row['p50_ms']:.1f} ms, "
+          f"p95 {row['p95_ms']:.1f} ms, mean batch {row['mean_batch_size']}", file=sys.stderr, flush=True)
+    return row
+
+
+def check_endpoints(agent, conversations, args):
+    """Health, readiness, progression, responses and 503 backpressure"""
+    # A queue just deep enough for one progression request, so the flood below overflows it
+    queue = len(conversations[0])
+    server = _ServerThread(agent, ServerConfig(max_batch_size=args.batch_sizes[-1], max_queue=queue, max_wait_ms=50))
+    try:
+        connection = http.client.HTTPConnection(server.host, server.port, timeout=60)
+        checks = {
+            'healthz': _request(connection, 'GET', '/healthz')[0],
+            'progression_turns': len(_request(connection, 'POST', '/progression', {'conversation': conversations[0]})[1]),
+            'predict_with_response': sorted(_request(connection, 'POST', '/predict_with_response', {
+                'conversation': conversations[0], 'user_input': "What does it cost?"
+            })[1]),
+            'bad_request': _request(connection, 'POST', '/predict', {'messages': "not a list"})[0],
+        }
+        for _ in range(100):
+            if server.server.ready:
+                break
+            time.sleep(0.05)
+        checks['readyz'] = _request(connection, 'GET', '/readyz')[0]
+        _, outcomes = _load(server, conversations[:64], clients=32)
+        checks['flood_statuses'] = {
+            str(status): sum(1 for _, s, _ in outcomes if s == status) for status in sorted({s for _, s, _ in outcomes})
+        }
+    finally:
+        server.close()
+    print(f"endpoints: {checks}", file=sys.stderr)
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="opensource", choices=["opensource", "openai", "azure"])
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-queue", type=int, default=4096)
+    parser.add_argument("--hidden-size", type=int, default=256, help="Stub encoder hidden size")
+    parser.add_argument("--layers", type=int, default=4, help="Stub encoder layers")
+    parser.add_argument("--remote-embedding-dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Fake remote embedding latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Fake remote chat base latency (s)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0005, help="Fake LLM decode time per token")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--with-llm", action="store_true",
+                        help="Opensource: keep the stub LLM for metrics (one call per conversation, not batched)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    args = parser.parse_args()
+
+    with _patched_openai(args):
+        agent, _ = build_agent(args.backend, args)
+        if args.backend == "opensource" and not args.with_llm:
+            agent.predictor.embedding_provider.llm = None
+        conversations = [synthetic_conversation(args.turns, seed=i) for i in range(args.requests)]
+        expected = [result['probability'] for result in agent.predict_batch(conversations)]
+        agent.warmup(shapes=[(size, 256) for size in args.batch_sizes])
+
+        rows = [bench_batch_size(agent, conversations, expected, size, args) for size in [1] + args.batch_sizes]
+        checks = check_endpoints(agent, conversations, args)
+
+    base = rows[0]['requests_per_s']
+    for row in rows:
+        row['speedup'] = round(row['requests_per_s'] / base, 2)
+    print(json.dumps({'backend': args.backend, 'clients': args.clients, 'results': rows, 'endpoints': checks}, indent=2))
+    failed = any(row['failures'] or row['result_mismatches'] for row in rows)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Load test for the remote (OpenAI / Azure) backends against the local mock server.
+
+Starts deepmost.mock_server in-process (or targets --url), points the real
+OpenAIEmbeddings / AzureEmbeddings providers at it and drives each operation at
+increasing concurrency, reporting throughput, p50/p95/p99 latency and how many
+requests the server rate-limited. With --client-rpm/--client-tpm/--client-concurrency
+the calls go through deepmost.core.clients.RateLimiter instead of the openai
+client's built-in retries.
+
+    python benchmarks/load_test.py --concurrency 1 4 16 64 --requests 400
+    python benchmarks/load_test.py --embedding-latency lognormal:40,0.6 --rate-limit-probability 0.05
+    python benchmarks/load_test.py --rate-limit-rpm 600 --client-rpm 550 --client-concurrency 16
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from stubs import build_synthetic_ppo, synthetic_conversation
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _server_stats(url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{url}/stats") as response:
+        return json.loads(response.read())
+
+
+def build_rate_limiter(args):
+    """Client-side RateLimiter from --client-* options, or None to use the openai client's own retries"""
+    if not (args.client_rpm or args.client_tpm or args.client_concurrency):
+        return None
+    from deepmost.core.clients import RateLimiter
+    return RateLimiter(
+        requests_per_minute=args.client_rpm,
+        tokens_per_minute=args.client_tpm,
+        max_concurrency=args.client_concurrency or 8
+    )
+
+
+def build_provider(backend: str, url: str, args, rate_limiter=None):
+    from deepmost.core.embeddings import AzureEmbeddings, OpenAIEmbeddings
+
+    if backend == "openai":
+        return OpenAIEmbeddings(
+            api_key="mock", embedding_model="text-embedding-3-large", chat_model="mock-chat",
+            expected_dim=args.embedding_dim, base_url=f"{url}/v1", rate_limiter=rate_limiter
+        )
+    return AzureEmbeddings(
+        api_key="mock", endpoint=url, embedding_deployment="mock-embedding",
+        chat_deployment="mock-chat", expected_dim=args.embedding_dim, rate_limiter=rate_limiter
+    )
+
+
+def build_operations(backend: str, url: str, args, rate_limiter=None) -> Dict[str, Callable[[int], Any]]:
+    provider = build_provider(backend, url, args, rate_limiter)
+    conversations = [synthetic_conversation(args.turns, seed=i) for i in range(64)]
+    texts = [" ".join(m['message'] for m in c) for c in conversations]
+    operations: Dict[str, Callable[[int], Any]] = {
+        'embedding': lambda i: provider.get_embedding(texts[i % len(texts)], args.turns - 1),
+        'metrics': lambda i: provider.analyze_metrics(conversations[i % len(conversations)], args.turns - 1),
+        'response': lambda i: provider.generate_response(conversations[i % len(conversations)], "What does it cost?"),
+    }
+
+    if args.predict:
+        from deepmost import sales
+        ppo = build_synthetic_ppo(
+            os.path.join(args.workdir, f"synthetic_ppo_{args.embedding_dim}.zip"), embedding_dim=args.embedding_dim
+        )
+        if backend == "openai":
+            agent = sales.Agent(model_path=ppo, openai_api_key="mock", openai_chat_model="mock-chat",
+                                openai_base_url=f"{url}/v1", rate_limiter=rate_limiter, use_gpu=False)
+        else:
+            agent = sales.Agent(model_path=ppo, azure_api_key="mock", azure_endpoint=url,
+                                azure_deployment="mock-embedding", azure_chat_deployment="mock-chat",
+                                rate_limiter=rate_limiter, use_gpu=False)
+        operations['predict'] = lambda i: agent.predict(
+            conversations[i % len(conversations)], conversation_id=f"load-{i}"
+        )
+    return operations
+
+
+def run_level(operation: Callable[[int], Any], concurrency: int, requests: int) -> Dict[str, float]:
+    """Issue `requests` calls with `concurrency` worker threads and summarize latencies"""
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        operation(i)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'elapsed_s': elapsed,
+        'throughput_rps': requests / elapsed,
+        'mean_s': sum(latencies) / len(latencies),
+        'p50_s': _percentile(latencies, 0.50),
+        'p95_s': _percentile(latencies, 0.95),
+        'p99_s': _percentile(latencies, 0.99),
+        'max_s': latencies[-1],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["openai", "azure"], choices=["openai", "azure"])
+    parser.add_argument("--operations", nargs="+", default=["embedding", "metrics", "response"],
+                        choices=["embedding", "metrics", "response", "predict"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--url", default=None, help="Use an already running mock server instead of starting one")
+    parser.add_argument("--embedding-dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency", default="lognormal:30,0.4")
+    parser.add_argument("--chat-latency", default="lognormal:80,0.4")
+    parser.add_argument("--ms-per-token", type=float, default=2.0)
+    parser.add_argument("--rate-limit-rpm", type=int, default=None)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--client-rpm", type=float, default=None, help="Route calls through a RateLimiter with this RPM")
+    parser.add_argument("--client-tpm", type=float, default=None, help="RateLimiter tokens per minute")
+    parser.add_argument("--client-concurrency", type=int, default=None, help="RateLimiter max in-flight requests")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    parser.add_argument("--output", "-o", default=None, help="Write JSON results here (default: stdout)")
+    args = parser.parse_args()
+    args.predict = "predict" in args.operations
+
+    server = None
+    url: Optional[str] = args.url
+    if url is None:
+        from deepmost.mock_server import MockOpenAIServer, MockServerConfig
+        server = MockOpenAIServer(config=MockServerConfig(
+            embedding_dim=args.embedding_dim,
+            embedding_latency=args.embedding_latency,
+            chat_latency=args.chat_latency,
+            ms_per_output_token=args.ms_per_token,
+            rate_limit_rpm=args.rate_limit_rpm,
+            rate_limit_probability=args.rate_limit_probability,
+            retry_after=args.retry_after,
+        )).start()
+        url = server.url
+
+    report: Dict[str, Any] = {
+        'meta': {k: v for k, v in vars(args).items() if k != 'output'},
+        'backends': {},
+    }
+    try:
+        for backend in args.backends:
+            rate_limiter = build_rate_limiter(args)
+            operations = build_operations(backend, url, args, rate_limiter)
+            report['backends'][backend] = {}
+            for name in args.operations:
+                levels = []
+                for concurrency in args.concurrency:
+                    print(f"{backend}/{name} @ concurrency {concurrency}...", file=sys.stderr, flush=True)
+                    before = _server_stats(url)
+                    level = run_level(operations[name], concurrency, args.requests)
+                    after = _server_stats(url)
+                    level['server_rate_limited'] = after['rate_limited'] - before['rate_limited']
+                    level['server_requests'] = sum(after.values()) - sum(before.values())
+                    levels.append(level)
+                report['backends'][backend][name] = levels
+            if rate_limiter is not None:
+                report['backends'][backend]['client_limiter'] = rate_limiter.stats()
+        from deepmost.core.clients import shared_http_pool
+        report['http_pool'] = shared_http_pool().stats()
+    finally:
+        if server is not None:
+            server.stop()
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+"""
+Offline benchmark suite for DeepMost.
+
+Every backend runs against deterministic stand-ins: a tiny randomly initialized
+encoder, a synthetic PPO policy with the right observation space, a fake llama.cpp
+LLM and a fake OpenAI/Azure client with configurable latency. No network or model
+downloads are needed.
+
+Measures import time, startup time (including offline start from a model bundle),
+first-request latency with and without Agent.warmup(), per-stage latency (embedding,
+metrics, PPO), predict / progression / predict_with_response latency, streaming
+time-to-first-token, batch throughput and memory, the metrics-refresh trigger rate of
+a turn-by-turn replay, and writes everything as JSON.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json --threshold 1.2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from stubs import (
+    FakeLlama, FakeOpenAIClient, build_synthetic_ppo, build_tiny_embedding_model, synthetic_conversation
+)
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        'mean_s': statistics.mean(ordered),
+        'p50_s': ordered[len(ordered) // 2],
+        'p95_s': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'min_s': ordered[0],
+        'n': len(ordered),
+    }
+
+
+def _time(fn: Callable[[], Any], repeats: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summarize(samples)
+
+
+def measure_import_time(repeats: int = 3) -> Dict[str, float]:
+    """Cold import of deepmost.sales in a fresh interpreter"""
+    code = "import time; t = time.perf_counter(); import deepmost.sales; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return _summarize(samples)
+
+
+@contextlib.contextmanager
+def _patched_openai(args):
+    def factory(**kwargs):
+        return FakeOpenAIClient(
+            embedding_dim=args.remote_embedding_dim,
+            embedding_latency=args.embedding_latency,
+            chat_latency=args.chat_latency,
+            seconds_per_token=args.seconds_per_token,
+            jitter=args.jitter,
+        )
+    with mock.patch("openai.OpenAI", side_effect=factory), mock.patch("openai.AzureOpenAI", side_effect=factory):
+        yield
+
+
+def build_agent(backend: str, args):
+    """Construct a sales.Agent for backend wired to offline stubs. Returns (agent, startup_seconds)."""
+    from deepmost import sales
+
+    if backend == "opensource":
+        encoder = build_tiny_embedding_model(
+            os.path.join(args.workdir, f"tiny-encoder-{args.hidden_size}x{args.layers}"),
+            hidden_size=args.hidden_size, num_layers=args.layers
+        )
+        ppo = build_synthetic_ppo(os.path.join(args.workdir, "synthetic_ppo_1024.zip"), embedding_dim=1024)
+        start = time.perf_counter()
+        agent = sales.Agent(model_path=ppo, embedding_model=encoder, use_gpu=False, force_backend="opensource")
+        startup = time.perf_counter() - start
+        agent.predictor.embedding_provider.llm = FakeLlama(seconds_per_token=args.seconds_per_token)
+        return agent, startup
+
+    ppo = build_synthetic_ppo(
+        os.path.join(args.workdir, f"synthetic_ppo_{args.remote_embedding_dim}.zip"),
+        embedding_dim=args.remote_embedding_dim
+    )
+    with _patched_openai(args):
+        start = time.perf_counter()
+        if backend == "openai":
+            agent = sales.Agent(
+                model_path=ppo, openai_api_key="offline", openai_chat_model="fake-chat", use_gpu=False
+            )
+        else:
+            agent = sales.Agent(
+                model_path=ppo, azure_api_key="offline", azure_endpoint="http://localhost",
+                azure_deployment="fake-embedding", azure_chat_deployment="fake-chat", use_gpu=False
+            )
+        startup = time.perf_counter() - start
+    return agent, startup
+
+
+_STARTUP_CODE = """
+import sys, time
+t = time.perf_counter()
+from deepmost import sales
+kwargs = {'model_bundle': sys.argv[1]} if sys.argv[1] else {'model_path': sys.argv[2], 'embedding_model': sys.argv[3]}
+sales.Agent(use_gpu=False, force_backend="opensource", **kwargs)
+print(time.perf_counter() - t)
+"""
+
+
+def measure_bundle_startup(args, repeats: int = 3) -> Dict[str, Any]:
+    """
+    Cold opensource Agent startup (import included) in a fresh interpreter, from plain
+    model paths versus an offline bundle made by pull_bundle. The bundle run has the
+    HuggingFace hub forced offline, so any network access would fail it.
+    """
+    from deepmost.core.bundle import pull_bundle
+
+    encoder = build_tiny_embedding_model(
+        os.path.join(args.workdir, f"tiny-encoder-{args.hidden_size}x{args.layers}"),
+        hidden_size=args.hidden_size, num_layers=args.layers
+    )
+    ppo = build_synthetic_ppo(os.path.join(args.workdir, "synthetic_ppo_1024.zip"), embedding_dim=1024)
+    bundle_dir = os.path.join(args.workdir, "bundle")
+    manifest = pull_bundle(bundle_dir, backend="opensource", model_path=ppo, embedding_model=encoder)
+
+    offline_env = dict(os.environ, HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1")
+    result: Dict[str, Any] = {'pull_s': manifest['pull_seconds']}
+    for name, argv, env in (("paths", ["", ppo, encoder], os.environ), ("bundle", [bundle_dir], offline_env)):
+        samples = []
+        for _ in range(repeats):
+            out = subprocess.run(
+                [sys.executable, "-c", _STARTUP_CODE, *argv], cwd=REPO_ROOT, env=env,
+                capture_output=True, text=True, check=True
+            )
+            samples.append(float(out.stdout.strip().splitlines()[-1]))
+        result[name] = _summarize(samples)
+        result[f"{name}_startup_s"] = result[name]['p50_s']
+    return result
+
+
+_FIRST_REQUEST_CODE = """
+import json, sys, time
+sys.path.insert(0, "benchmarks")
+from deepmost import sales
+from stubs import synthetic_conversation
+agent = sales.Agent(model_path=sys.argv[1], embedding_model=sys.argv[2], use_gpu=False, force_backend="opensource")
+report = agent.warmup() if sys.argv[3] == "warm" else None
+t = time.perf_counter()
+agent.predict(synthetic_conversation(8))
+print(json.dumps({'first_predict_s': time.perf_counter() - t, 'warmup': report}))
+"""
+
+
+def measure_first_request(args, repeats: int = 3) -> Dict[str, Any]:
+    """Latency of the first opensource predict in a fresh interpreter, without and after Agent.warmup()"""
+    encoder = build_tiny_embedding_model(
+        os.path.join(args.workdir, f"tiny-encoder-{args.hidden_size}x{args.layers}"),
+        hidden_size=args.hidden_size, num_layers=args.layers
+    )
+    ppo = build_synthetic_ppo(os.path.join(args.workdir, "synthetic_ppo_1024.zip"), embedding_dim=1024)
+    result: Dict[str, Any] = {}
+    for mode in ("cold", "warm"):
+        runs = []
+        for _ in range(repeats):
+            out = subprocess.run(
+                [sys.executable, "-c", _FIRST_REQUEST_CODE, ppo, encoder, mode],
+                cwd=REPO_ROOT, capture_output=True, text=True, check=True
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        result[mode] = _summarize([run['first_predict_s'] for run in runs])
+        if mode == "warm":
+            result['warmup_stages'] = runs[-1]['warmup']['stages']
+    return result
+
+
+def measure_metrics_refresh(conversations: int = 20, turns: int = 32, words_per_message: int = 8) -> Dict[str, Any]:
+    """
+    Replay synthetic conversations one message at a time through the default
+    MetricsRefreshPolicy and report how often it refreshes, and how often because of
+    a trigger keyword. Drift is disabled (no embeddings here) and max_turns is the
+    policy default, so the trigger rate is what the keyword check alone costs.
+    """
+    import numpy as np
+    from deepmost.core.refresh import MetricsRefreshPolicy
+
+    policy = MetricsRefreshPolicy(drift_threshold=None)
+    embedding = np.zeros(1, dtype=np.float32)
+    for seed in range(conversations):
+        conversation = synthetic_conversation(turns, words_per_message=words_per_message, seed=seed)
+        cache = None
+        for end in range(1, turns + 1):
+            history = conversation[:end]
+            reason = policy.refresh_reason(cache, history, embedding)
+            policy.record(reason)
+            if reason is not None:
+                cache = policy.snapshot({}, history, embedding)
+    return {'conversations': conversations, 'turns': turns, 'words_per_message': words_per_message, **policy.stats()}
+
+
+def bench_backend(backend: str, args) -> Dict[str, Any]:
+    rss_before = _rss_mb()
+    with _patched_openai(args):
+        agent, startup = build_agent(backend, args)
+    predictor = agent.predictor
+    provider = predictor.embedding_provider
+    result: Dict[str, Any] = {'startup_s': startup, 'rss_after_startup_mb': _rss_mb(), 'by_turns': {}}
+    result['rss_startup_delta_mb'] = result['rss_after_startup_mb'] - rss_before
+
+    from deepmost.core.utils import ConversationTexts
+
+    for turns in args.turns:
+        conversation = synthetic_conversation(turns)
+        texts = ConversationTexts.from_history(conversation)
+        turn = turns - 1
+        embedding = provider.get_embedding(texts.full_text, turn)
+        metrics = provider.analyze_metrics(conversation, turn)
+        observation = predictor._build_observation(embedding, metrics, turn, [])
+
+        stages = {
+            'embedding': _time(lambda: provider.get_embedding(texts.full_text, turn), args.repeats),
+            'metrics': _time(lambda: provider.analyze_metrics(conversation, turn), args.repeats),
+            'ppo': _time(lambda: predictor.model.predict(observation, deterministic=True), args.repeats),
+        }
+        calls = {
+            'predict': _time(lambda: agent.predict(conversation, conversation_id="bench"), args.repeats),
+            'progression': _time(
+                lambda: agent.analyze_conversation_progression(conversation, print_results=False),
+                max(1, args.repeats // 5)
+            ),
+            'predict_with_response': _time(
+                lambda: agent.predict_with_response(conversation, "What does the plan cost?"), args.repeats
+            ),
+        }
+
+        ttft = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            first = None
+            for event in agent.predict_with_response_stream(conversation, "What does the plan cost?"):
+                if first is None:
+                    first = time.perf_counter() - start
+            ttft.append(first)
+        calls['predict_with_response_stream_ttft'] = _summarize(ttft)
+
+        result['by_turns'][str(turns)] = {'stages': stages, 'calls': calls}
+
+    batch = [synthetic_conversation(args.batch_turns, seed=i) for i in range(args.batch_size)]
+    agent.predict_batch(batch[:2])
+    start = time.perf_counter()
+    agent.predict_batch(batch)
+    elapsed = time.perf_counter() - start
+    result['batch'] = {
+        'batch_size': args.batch_size,
+        'turns': args.batch_turns,
+        'elapsed_s': elapsed,
+        'conversations_per_s': args.batch_size / elapsed,
+    }
+    result['rss_end_mb'] = _rss_mb()
+    return result
+
+
+def _flatten(prefix: str, value: Any, out: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for key, child in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, child, out)
+    elif isinstance(value, (int, float)):
+        out[prefix] = float(value)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Latency metrics (keys ending in _s, except min_s) that got slower than threshold x baseline"""
+    cur, base = {}, {}
+    _flatten("", current, cur)
+    _flatten("", baseline, base)
+    regressions = []
+    for key, value in sorted(cur.items()):
+        if not (key.endswith("mean_s") or key.endswith("p95_s") or key.endswith("startup_s")):
+            continue
+        if key.startswith("meta.") or base.get(key, 0) <= 0:
+            continue
+        ratio = value / base[key]
+        if ratio > threshold:
+            regressions.append(f"{key}: {base[key] * 1000:.2f} ms -> {value * 1000:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["opensource", "openai", "azure"],
+                        choices=["opensource", "openai", "azure"])
+    parser.add_argument("--turns", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-turns", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=64, help="Stub encoder hidden size")
+    parser.add_argument("--layers", type=int, default=2, help="Stub encoder layers")
+    parser.add_argument("--remote-embedding-dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Fake remote embedding latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="Fake remote chat base latency (s)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.002, help="Fake LLM decode time per token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Log-normal sigma for fake remote latency")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "deepmost-bench"))
+    parser.add_argument("--output", "-o", default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as regression")
+    args = parser.parse_args()
+
+    import deepmost
+    import torch
+
+    report: Dict[str, Any] = {
+        'meta': {
+            'deepmost_version': deepmost.__version__,
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.time(),
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'import_time': measure_import_time(),
+        'bundle_startup': measure_bundle_startup(args),
+        'first_request': measure_first_request(args),
+        'metrics_refresh': measure_metrics_refresh(),
+        'backends': {},
+    }
+    for backend in args.backends:
+        print(f"Benchmarking {backend} backend...", file=sys.stderr, flush=True)
+        report['backends'][backend] = bench_backend(backend, args)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
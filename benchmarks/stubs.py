@@ -0,0 +1,244 @@
+"""Deterministic offline stand-ins for the models and services DeepMost normally loads"""
+
+import hashlib
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+WORDS = [
+    "the", "a", "and", "to", "of", "we", "you", "your", "our", "is", "it", "for", "that",
+    "i", "can", "this", "with", "on", "are", "be", "have", "need", "team", "price", "cost",
+    "budget", "crm", "demo", "trial", "month", "user", "users", "plan", "feature", "features",
+    "integration", "sales", "pipeline", "report", "reports", "looks", "sounds", "great", "good",
+    "interested", "expensive", "concern", "contract", "discount", "support", "data", "next",
+    "week", "call", "schedule", "meeting", "decision", "manager", "competitor", "roi", "value",
+]
+
+
+def build_tiny_embedding_model(model_dir: str, hidden_size: int = 64, num_layers: int = 2, seed: int = 0) -> str:
+    """
+    Save a tiny randomly initialized BERT encoder and a matching WordPiece tokenizer
+    to model_dir, loadable with AutoTokenizer/AutoModel.from_pretrained(model_dir).
+    """
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    if os.path.exists(os.path.join(model_dir, "config.json")):
+        return model_dir
+    os.makedirs(model_dir, exist_ok=True)
+
+    letters = [chr(c) for c in range(ord('a'), ord('z') + 1)] + [str(d) for d in range(10)]
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(".,?!'$%-") + letters
+    vocab += [f"##{c}" for c in letters] + WORDS
+    vocab_file = os.path.join(model_dir, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab) + "\n")
+
+    tokenizer = BertTokenizerFast(vocab_file=vocab_file, do_lower_case=True, model_max_length=512)
+    tokenizer.save_pretrained(model_dir)
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        intermediate_size=hidden_size * 4,
+        max_position_embeddings=512,
+    )
+    BertModel(config).eval().save_pretrained(model_dir)
+    return model_dir
+
+
+def build_synthetic_ppo(model_path: str, embedding_dim: int = 1024, seed: int = 0) -> str:
+    """
+    Save an untrained PPO policy whose observation space matches what SalesPredictor
+    expects for embedding_dim (embedding + 5 metrics + turn + 10 previous probabilities).
+    """
+    import gymnasium as gym
+    from stable_baselines3 import PPO
+
+    if os.path.exists(model_path):
+        return model_path
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+
+    class _SyntheticEnv(gym.Env):
+        observation_space = gym.spaces.Box(low=-np.inf, high=np.inf, shape=(embedding_dim + 16,), dtype=np.float32)
+        action_space = gym.spaces.Box(low=0.0, high=1.0, shape=(1,), dtype=np.float32)
+
+        def reset(self, *, seed=None, options=None):
+            super().reset(seed=seed)
+            return np.zeros(self.observation_space.shape, dtype=np.float32), {}
+
+        def step(self, action):
+            return np.zeros(self.observation_space.shape, dtype=np.float32), 0.0, True, False, {}
+
+    PPO("MlpPolicy", _SyntheticEnv(), seed=seed, device="cpu").save(model_path)
+    return model_path
+
+
+def synthetic_conversation(num_turns: int, words_per_message: int = 20, seed: int = 0) -> List[Dict[str, str]]:
+    """Alternating customer/sales_rep turns built from the stub vocabulary."""
+    rng = np.random.default_rng(seed)
+    conversation = []
+    for i in range(num_turns):
+        words = rng.choice(WORDS, size=words_per_message)
+        conversation.append({
+            'speaker': 'customer' if i % 2 == 0 else 'sales_rep',
+            'message': " ".join(words).capitalize() + "."
+        })
+    return conversation
+
+
+CANNED_METRICS = {
+    "customer_engagement": 0.62,
+    "sales_effectiveness": 0.58,
+    "conversation_style": "direct_professional",
+    "conversation_flow": "standard_linear",
+    "communication_channel": "chat",
+    "primary_customer_needs": ["efficiency", "reporting"],
+    "engagement_trend": 0.55,
+    "objection_count": 0.2,
+    "value_proposition_mentions": 0.4,
+    "technical_depth": 0.3,
+    "urgency_level": 0.3,
+    "competitive_context": 0.1,
+    "pricing_sensitivity": 0.4,
+    "decision_authority_signals": 0.5,
+}
+
+
+class FakeLlama:
+    """
+    Stand-in for llama_cpp.Llama. Latency is modelled as prompt evaluation per
+    prompt character plus decode time per generated token; time.sleep releases
+    the GIL like llama.cpp's native calls do.
+    """
+
+    def __init__(
+        self,
+        prompt_seconds_per_char: float = 2e-5,
+        seconds_per_token: float = 0.01,
+        response_tokens: int = 40,
+        metrics: Optional[Dict[str, Any]] = None
+    ):
+        self.prompt_seconds_per_char = prompt_seconds_per_char
+        self.seconds_per_token = seconds_per_token
+        self.response_tokens = response_tokens
+        self.metrics = dict(metrics or CANNED_METRICS)
+
+    def _prompt_eval(self, text: str) -> None:
+        time.sleep(len(text) * self.prompt_seconds_per_char)
+
+    def __call__(self, prompt: str, max_tokens: int = 450, **kwargs) -> Dict[str, Any]:
+        self._prompt_eval(prompt)
+        text = json.dumps(self.metrics)
+        time.sleep(min(max_tokens, len(text) // 4) * self.seconds_per_token)
+        return {'choices': [{'text': text}]}
+
+    def _reply_tokens(self, max_tokens: int) -> List[str]:
+        return [f" {WORDS[i % len(WORDS)]}" for i in range(min(max_tokens, self.response_tokens))]
+
+    def create_chat_completion(self, messages: List[Dict[str, str]], max_tokens: int = 150, stream: bool = False, **kwargs):
+        self._prompt_eval("".join(m['content'] for m in messages))
+        tokens = self._reply_tokens(max_tokens)
+        if stream:
+            return self._stream(tokens)
+        time.sleep(len(tokens) * self.seconds_per_token)
+        return {'choices': [{'message': {'role': 'assistant', 'content': "".join(tokens).strip()}}]}
+
+    def _stream(self, tokens: List[str]) -> Iterator[Dict[str, Any]]:
+        yield {'choices': [{'delta': {'role': 'assistant'}}]}
+        for token in tokens:
+            time.sleep(self.seconds_per_token)
+            yield {'choices': [{'delta': {'content': token}}]}
+        yield {'choices': [{'delta': {}, 'finish_reason': 'stop'}]}
+
+
+def _is_metrics_request(messages: List[Dict[str, str]]) -> bool:
+    return any("JSON" in m.get('content', '') for m in messages if m.get('role') == 'system')
+
+
+def deterministic_embedding(text: str, dim: int) -> List[float]:
+    """Unit-norm pseudo-embedding that only depends on the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _Latency:
+    """Base latency plus a per-unit cost, with optional seeded log-normal jitter"""
+
+    def __init__(self, base_seconds: float, per_unit_seconds: float, jitter: float, seed: int):
+        self.base_seconds = base_seconds
+        self.per_unit_seconds = per_unit_seconds
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+
+    def sleep(self, units: int = 0) -> None:
+        seconds = self.base_seconds + units * self.per_unit_seconds
+        if self.jitter:
+            seconds *= float(self.rng.lognormal(0.0, self.jitter))
+        time.sleep(seconds)
+
+
+class FakeOpenAIClient:
+    """
+    Stand-in for openai.OpenAI / openai.AzureOpenAI covering the calls the providers
+    make: embeddings.create and chat.completions.create (with and without stream=True).
+    Metric-analysis prompts get CANNED_METRICS as JSON; other chats get a canned reply.
+    """
+
+    def __init__(
+        self,
+        embedding_dim: int = 3072,
+        embedding_latency: float = 0.05,
+        chat_latency: float = 0.2,
+        seconds_per_token: float = 0.01,
+        response_tokens: int = 40,
+        jitter: float = 0.0,
+        seed: int = 0,
+        **client_kwargs
+    ):
+        self.embedding_dim = embedding_dim
+        self.response_tokens = response_tokens
+        self.seconds_per_token = seconds_per_token
+        self._embedding_latency = _Latency(embedding_latency, 0.0, jitter, seed)
+        self._chat_latency = _Latency(chat_latency, seconds_per_token, jitter, seed + 1)
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    def _create_embeddings(self, input, model: str, **kwargs):
+        inputs = [input] if isinstance(input, str) else list(input)
+        self._embedding_latency.sleep()
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=deterministic_embedding(text, self.embedding_dim))
+            for i, text in enumerate(inputs)
+        ])
+
+    def _create_chat_completion(self, model: str, messages: List[Dict[str, str]], max_tokens: int = 200,
+                                stream: bool = False, **kwargs):
+        if _is_metrics_request(messages):
+            content = json.dumps(CANNED_METRICS)
+            tokens = [content]
+            units = len(content) // 4
+        else:
+            tokens = [f" {WORDS[i % len(WORDS)]}" for i in range(min(max_tokens, self.response_tokens))]
+            units = len(tokens)
+
+        if stream:
+            return self._stream(tokens)
+        self._chat_latency.sleep(units)
+        message = SimpleNamespace(role="assistant", content="".join(tokens).strip())
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+    def _stream(self, tokens: List[str]):
+        self._chat_latency.sleep(0)
+        for token in tokens:
+            time.sleep(self.seconds_per_token)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=token))])
@@ -10,7 +10,15 @@ __version__ = "0.5.0"
 
 
 from . import sales
-from . import prospecting
+
+
+def __getattr__(name):
+    # prospecting needs the optional smolagents extra, so import it on first use
+    if name == "prospecting":
+        from . import prospecting
+        return prospecting
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "sales",
@@ -0,0 +1,427 @@
+"""Command-line interface: `deepmost <command> ...`"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import List, Optional
+
+
+def _add_agent_arguments(parser: argparse.ArgumentParser) -> None:
+    """Backend options shared by every command that builds a sales.Agent"""
+    group = parser.add_argument_group("backend")
+    group.add_argument("--backend", choices=["opensource", "openai", "azure"],
+                       default=os.getenv("DEEPMOST_BACKEND"),
+                       help="Force a backend (default: chosen from the credentials provided)")
+    group.add_argument("--model-path", default=None, help="PPO model path or URL")
+    group.add_argument("--embedding-model", default="BAAI/bge-m3")
+    group.add_argument("--llm-model", default=os.getenv("OPENSOURCE_LLM_MODEL"))
+    group.add_argument("--openai-api-key", default=os.getenv("OPENAI_API_KEY"))
+    group.add_argument("--openai-embedding-model",
+                       default=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large"))
+    group.add_argument("--openai-chat-model", default=os.getenv("OPENAI_CHAT_MODEL"))
+    group.add_argument("--openai-base-url", default=os.getenv("OPENAI_BASE_URL"))
+    group.add_argument("--azure-api-key", default=os.getenv("AZURE_OPENAI_API_KEY"))
+    group.add_argument("--azure-endpoint", default=os.getenv("AZURE_OPENAI_ENDPOINT"))
+    group.add_argument("--azure-deployment", default=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"))
+    group.add_argument("--azure-chat-deployment", default=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT"))
+    group.add_argument("--cpu", action="store_true", help="Do not use the GPU")
+    group.add_argument("--model-bundle", default=os.getenv("DEEPMOST_MODEL_BUNDLE"),
+                       help="Load every model from a directory made by 'deepmost models pull' (implies --offline)")
+    group.add_argument("--offline", action="store_true", help="Never download models or contact the HuggingFace hub")
+    for stage in ("embedding", "metrics", "response"):
+        group.add_argument(f"--{stage}-backend", choices=["opensource", "openai", "azure"], default=None,
+                           help=f"Run the {stage} stage on this backend (hybrid mode)")
+        group.add_argument(f"--{stage}-concurrency", type=int, default=None,
+                           help=f"Max in-flight {stage} calls (hybrid mode)")
+    group.add_argument("--trajectory-seed", type=int, default=None, help="Seed for reproducible probability_trajectory")
+    group.add_argument("--no-trajectory", action="store_true", help="Skip computing probability_trajectory")
+    group.add_argument("--metrics-source", choices=["llm", "head"], default="llm",
+                       help="Compute conversation metrics with the LLM or a distilled metrics head")
+    group.add_argument("--metrics-head", default=None, help="Trained metrics head (see 'deepmost metrics-head train')")
+    group.add_argument("--log-metrics", default=None, help="Append (embedding, LLM metrics) pairs to this JSONL file")
+    group.add_argument("--cascade-margin", type=float, default=None,
+                       help="Score with heuristic metrics first; call the LLM metrics only within this margin of a status threshold")
+    group.add_argument("--prompt-token-budget", type=int, default=None,
+                       help="Summarize older turns so the conversation in each LLM prompt fits this many tokens")
+    cpus = parser.add_argument_group("CPU budget")
+    cpus.add_argument("--cores", default=None,
+                      help="Cores to use: a count ('8') or core ids ('0-3,8-11') (default: all available)")
+    cpus.add_argument("--llm-share", type=float, default=0.5,
+                      help="Fraction of each worker's cores given to the local LLM")
+    cpus.add_argument("--pin-cpus", action="store_true", help="Pin each worker process to its own cores")
+    limits = parser.add_argument_group("remote rate limits")
+    limits.add_argument("--requests-per-minute", type=float, default=None, help="Client-side RPM quota (split across forked workers)")
+    limits.add_argument("--tokens-per-minute", type=float, default=None, help="Client-side TPM quota (split across forked workers)")
+    limits.add_argument("--max-concurrency", type=int, default=None, help="Maximum in-flight API requests (split across forked workers)")
+    limits.add_argument("--max-retries", type=int, default=6, help="Retries for 429s, timeouts and 5xx")
+    limits.add_argument("--max-connections", type=int, default=100, help="HTTP connection pool size")
+    limits.add_argument("--http2", action="store_true", help="Use HTTP/2 for API requests (requires httpx[http2])")
+
+
+def _agent_from_args(args: argparse.Namespace):
+    from .core.cascade import CascadePolicy
+    from .core.compaction import HistoryCompactor
+    from .core.clients import HTTPPool, RateLimiter
+    from .core.resources import CPUBudget, parse_cores
+    from .sales import Agent
+
+    rate_limiter = None
+    if args.requests_per_minute or args.tokens_per_minute or args.max_concurrency:
+        rate_limiter = RateLimiter(
+            requests_per_minute=args.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute,
+            max_concurrency=args.max_concurrency or 8,
+            max_retries=args.max_retries
+        )
+
+    http_pool = None
+    if args.http2 or args.max_connections != 100:
+        http_pool = HTTPPool(max_connections=args.max_connections, http2=args.http2)
+
+    cpu_budget = None
+    workers = getattr(args, 'workers', 1)
+    if args.cores or args.pin_cpus or workers > 1:
+        cpu_budget = CPUBudget(
+            cores=parse_cores(args.cores) if args.cores else None,
+            workers=workers,
+            llm_share=args.llm_share,
+            pin=args.pin_cpus
+        )
+
+    return Agent(
+        model_path=args.model_path,
+        azure_api_key=args.azure_api_key,
+        azure_endpoint=args.azure_endpoint,
+        azure_deployment=args.azure_deployment,
+        azure_chat_deployment=args.azure_chat_deployment,
+        openai_api_key=args.openai_api_key,
+        openai_embedding_model=args.openai_embedding_model,
+        openai_chat_model=args.openai_chat_model,
+        openai_base_url=args.openai_base_url,
+        rate_limiter=rate_limiter,
+        http_pool=http_pool,
+        embedding_model=args.embedding_model,
+        llm_model=args.llm_model,
+        use_gpu=not args.cpu,
+        force_backend=args.backend,
+        model_bundle=args.model_bundle,
+        offline=args.offline,
+        trajectory_seed=args.trajectory_seed,
+        compute_trajectory=not args.no_trajectory,
+        metrics_source=args.metrics_source,
+        metrics_head=args.metrics_head,
+        metrics_log_path=args.log_metrics,
+        embedding_backend=args.embedding_backend,
+        metrics_backend=args.metrics_backend,
+        response_backend=args.response_backend,
+        source_concurrency={
+            stage: getattr(args, f"{stage}_concurrency")
+            for stage in ("embedding", "metrics", "response") if getattr(args, f"{stage}_concurrency")
+        } or None,
+        cascade=CascadePolicy(args.cascade_margin) if args.cascade_margin is not None else None,
+        history_compactor=HistoryCompactor(args.prompt_token_budget) if args.prompt_token_budget else None,
+        cpu_budget=cpu_budget
+    )
+
+
+def _cmd_score(args: argparse.Namespace) -> int:
+    from .scoring import score_jsonl
+
+    agent = _agent_from_args(args)
+    if args.profile_dir:
+        agent.enable_profiling(args.profile_dir, sample_rate=args.profile_rate, mode=args.profile_mode)
+    summary = score_jsonl(
+        agent,
+        input_path=args.input,
+        output_path=args.output,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        resume=not args.no_resume,
+        include_metrics=args.include_metrics,
+        report_interval=args.report_interval,
+        workers=args.workers
+    )
+    for pid, memory in summary.get('memory', {}).get('workers', {}).items():
+        if memory:
+            print(f"worker {pid}: {memory['uss_mb']:.0f} MB unique, {memory['pss_mb']:.0f} MB proportional, "
+                  f"{memory['rss_mb']:.0f} MB resident", file=sys.stderr)
+    cascade = agent.predictor.cascade
+    # With forked workers the cascade decisions are counted in the workers
+    if cascade is not None and args.workers <= 1:
+        stats = cascade.stats.stats()
+        print(f"cascade: {stats['escalated']}/{stats['calls']} escalated to LLM metrics "
+              f"({stats['escalation_rate']:.1%})", file=sys.stderr)
+    return 0
+
+
+def _cmd_serve(args: argparse.Namespace) -> int:
+    from .server import ServerConfig, serve
+
+    config = ServerConfig(
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue=args.max_queue,
+        request_timeout=args.request_timeout or None,
+        response_threads=args.response_threads,
+        concurrent_batches=args.concurrent_batches,
+        warmup=not args.no_warmup
+    )
+    serve(_agent_from_args(args), args.host, args.port, config)
+    return 0
+
+
+def _cmd_stream(args: argparse.Namespace) -> int:
+    import json
+    from .streaming import stream_jsonl
+
+    summary = stream_jsonl(
+        _agent_from_args(args),
+        input_path=args.input,
+        output_path=args.output,
+        idle_timeout=args.idle_timeout,
+        max_conversations=args.max_conversations,
+        include_metrics=args.include_metrics,
+        close_at_end=not args.keep_open
+    )
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+
+def _cmd_mock_server(args: argparse.Namespace) -> int:
+    import json
+    from .mock_server import MockServerConfig, serve
+
+    config = MockServerConfig(
+        embedding_dim=args.embedding_dim,
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency,
+        ms_per_output_token=args.ms_per_token,
+        rate_limit_rpm=args.rate_limit_rpm,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        files_dir=args.files_dir,
+        file_drop_after=args.file_drop_after
+    )
+    if args.metrics_file:
+        with open(args.metrics_file) as f:
+            config.metrics = json.load(f)
+    serve(args.host, args.port, config)
+    return 0
+
+
+def _cmd_metrics_head_train(args: argparse.Namespace) -> int:
+    import json
+    from .core.metrics_head import train_metrics_head
+
+    head, report = train_metrics_head(
+        args.logs,
+        hidden_size=args.hidden_size,
+        epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        validation_fraction=args.validation_fraction,
+        seed=args.seed
+    )
+    head.save(args.output)
+    report['output'] = args.output
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def _cmd_models(args: argparse.Namespace) -> int:
+    import json
+    from .core.bundle import archive_bundle, load_bundle, pull_bundle
+
+    if args.models_command == "verify":
+        paths = load_bundle(args.directory, verify=True)
+        print(json.dumps(paths, indent=2))
+        return 0
+
+    manifest = pull_bundle(
+        args.directory,
+        backend=args.backend,
+        model_path=args.model_path,
+        embedding_model=args.embedding_model,
+        llm_model=args.llm_model,
+        llm_filename=args.llm_filename
+    )
+    summary = {
+        'directory': os.path.abspath(args.directory),
+        'backend': manifest['backend'],
+        'pull_seconds': manifest['pull_seconds'],
+        'artifacts': {
+            name: {'source': artifact['source'], 'path': artifact['path'],
+                   'bytes': sum(f['size'] for f in artifact['files'].values())}
+            for name, artifact in manifest['artifacts'].items()
+        }
+    }
+    if args.models_command == "bundle":
+        summary['archive'] = archive_bundle(args.directory, args.output)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="deepmost", description="DeepMost sales conversion tools")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable INFO logging")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    score = subparsers.add_parser(
+        "score",
+        help="Bulk-score conversations from JSONL",
+        description=(
+            "Stream conversations from a JSONL file (or '-' for stdin), score them in batches "
+            "and append one JSON result per line. Progress is checkpointed after each batch "
+            "so an interrupted job resumes where it stopped."
+        )
+    )
+    score.add_argument("input", help="JSONL file with one conversation per line, or '-' for stdin")
+    score.add_argument("-o", "--output", default="-", help="Output JSONL path (default: stdout)")
+    score.add_argument("--batch-size", type=int, default=32)
+    score.add_argument("--checkpoint", default=None, help="Checkpoint path (default: <output>.checkpoint)")
+    score.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint and start over")
+    score.add_argument("--include-metrics", action="store_true", help="Include full metrics in each result")
+    score.add_argument("--report-interval", type=float, default=10.0, help="Seconds between throughput reports")
+    score.add_argument("--workers", type=int, default=1,
+                       help="Score in this many forked processes sharing the models loaded once in the parent")
+    score.add_argument("--profile-dir", default=None, help="Write profiles of sampled batches to this directory")
+    score.add_argument("--profile-rate", type=float, default=0.01, help="Fraction of batches to profile")
+    score.add_argument("--profile-mode", choices=["cprofile", "torch"], default="cprofile")
+    _add_agent_arguments(score)
+    score.set_defaults(func=_cmd_score)
+
+    serve = subparsers.add_parser(
+        "serve",
+        help="Serve predictions over HTTP with dynamic batching",
+        description=(
+            "Asyncio HTTP server exposing POST /predict, /progression and /predict_with_response, "
+            "plus GET /healthz, /readyz and /stats. Concurrent requests are merged into batched "
+            "embedding and PPO passes; when the queue is full, requests get 503 with Retry-After."
+        )
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-batch-size", type=int, default=32, help="Conversations per batched pass")
+    serve.add_argument("--max-wait-ms", type=float, default=5.0,
+                       help="How long a request may wait for others to batch with")
+    serve.add_argument("--max-queue", type=int, default=1024,
+                       help="Queued conversations before new requests are rejected with 503")
+    serve.add_argument("--request-timeout", type=float, default=30.0, help="Seconds before a request fails with 504 (0: none)")
+    serve.add_argument("--response-threads", type=int, default=8, help="Concurrent response generations")
+    serve.add_argument("--concurrent-batches", type=int, default=None,
+                       help="Batches scored at once (default: 1 with local metrics, 4 with remote LLM metrics)")
+    serve.add_argument("--no-warmup", action="store_true", help="Report ready without warming up the models")
+    _add_agent_arguments(serve)
+    serve.set_defaults(func=_cmd_serve)
+
+    stream = subparsers.add_parser(
+        "stream",
+        help="Score a live feed of per-message turn events",
+        description=(
+            "Read one JSON event per line ({\"conversation_id\", \"speaker\", \"message\"}, optionally "
+            "\"timestamp\" and \"end\") and write an updated prediction for every message as it arrives. "
+            "Each conversation's history and state are kept here, so the feed sends every message once. "
+            "Conversations idle for --idle-timeout seconds expire with their last probability."
+        )
+    )
+    stream.add_argument("input", nargs="?", default="-", help="JSONL event file, or '-' for stdin (default)")
+    stream.add_argument("-o", "--output", default="-", help="Output JSONL path (default: stdout)")
+    stream.add_argument("--idle-timeout", type=float, default=1800.0, help="Seconds without events before a conversation expires")
+    stream.add_argument("--max-conversations", type=int, default=None,
+                        help="Open conversations to keep; the least recently active beyond this expire")
+    stream.add_argument("--include-metrics", action="store_true", help="Include full metrics in each prediction")
+    stream.add_argument("--keep-open", action="store_true",
+                        help="Do not close the open conversations at the end of the input")
+    _add_agent_arguments(stream)
+    stream.set_defaults(func=_cmd_stream)
+
+    mock = subparsers.add_parser(
+        "mock-server",
+        help="Run a local OpenAI-compatible mock server",
+        description=(
+            "Serve /v1/embeddings and /v1/chat/completions (plus the Azure deployment routes) "
+            "with deterministic embeddings, canned metrics JSON, configurable latency and "
+            "injected 429s, for load-testing the remote backends without an API key. "
+            "Latency specs: fixed:MS, uniform:LO,HI, normal:MEAN,STD, lognormal:MEDIAN,SIGMA, exp:MEAN."
+        )
+    )
+    mock.add_argument("--host", default="127.0.0.1")
+    mock.add_argument("--port", type=int, default=8089)
+    mock.add_argument("--embedding-dim", type=int, default=3072)
+    mock.add_argument("--embedding-latency", default="fixed:20")
+    mock.add_argument("--chat-latency", default="fixed:100")
+    mock.add_argument("--ms-per-token", type=float, default=5.0, help="Decode time per output token")
+    mock.add_argument("--rate-limit-rpm", type=int, default=None, help="Return 429 above this many requests/minute")
+    mock.add_argument("--rate-limit-probability", type=float, default=0.0, help="Fraction of requests answered with 429")
+    mock.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds for injected 429s")
+    mock.add_argument("--metrics-file", default=None, help="JSON file with the metrics returned to analysis prompts")
+    mock.add_argument("--seed", type=int, default=0)
+    mock.add_argument("--files-dir", default=None, help="Serve the files in this directory under /files/ (for download tests)")
+    mock.add_argument("--file-drop-after", type=int, default=None,
+                      help="Close each file response after this many bytes to simulate interrupted downloads")
+    mock.set_defaults(func=_cmd_mock_server)
+
+    metrics_head = subparsers.add_parser(
+        "metrics-head",
+        help="Distilled metrics head that replaces LLM metric analysis",
+        description="Train a small regression head predicting the LLM conversation metrics from the embedding."
+    )
+    metrics_head_commands = metrics_head.add_subparsers(dest="metrics_head_command", required=True)
+    train = metrics_head_commands.add_parser(
+        "train",
+        help="Train a metrics head from logged (embedding, LLM metrics) pairs",
+        description=(
+            "Collect pairs by scoring with --log-metrics PATH on an LLM-backed agent, then train "
+            "here. Prints the held-out error against the LLM and the latency gain."
+        )
+    )
+    train.add_argument("logs", nargs="+", help="JSONL files written by --log-metrics")
+    train.add_argument("-o", "--output", default=os.path.expanduser("~/.deepmost/models/metrics_head.pt"))
+    train.add_argument("--hidden-size", type=int, default=256)
+    train.add_argument("--epochs", type=int, default=200)
+    train.add_argument("--learning-rate", type=float, default=1e-3)
+    train.add_argument("--validation-fraction", type=float, default=0.2)
+    train.add_argument("--seed", type=int, default=0)
+    train.set_defaults(func=_cmd_metrics_head_train)
+
+    models = subparsers.add_parser(
+        "models",
+        help="Prefetch models for offline, fast-starting deployments",
+        description=(
+            "Resolve the PPO model, the embedding encoder and the GGUF LLM of a backend config into "
+            "one directory with a bundle.json manifest. Start agents from it with --model-bundle DIR "
+            "(or DEEPMOST_MODEL_BUNDLE=DIR) without touching the network."
+        )
+    )
+    models_commands = models.add_subparsers(dest="models_command", required=True)
+    pull = models_commands.add_parser("pull", help="Download every model artifact into a bundle directory")
+    bundle = models_commands.add_parser("bundle", help="Pull, then pack the bundle directory into a tar archive")
+    for command in (pull, bundle):
+        command.add_argument("directory", help="Bundle directory (created if missing)")
+        command.add_argument("--backend", choices=["opensource", "openai", "azure"], default="opensource")
+        command.add_argument("--model-path", default=None, help="PPO model URL or path (default: the backend's model)")
+        command.add_argument("--embedding-model", default="BAAI/bge-m3", help="Encoder repo or directory (opensource)")
+        command.add_argument("--llm-model", default=os.getenv("OPENSOURCE_LLM_MODEL"), help="GGUF repo, URL or file")
+        command.add_argument("--llm-filename", default="*Q4_K_M.gguf", help="GGUF file pattern within --llm-model")
+    bundle.add_argument("-o", "--output", default="deepmost-models.tar")
+    verify = models_commands.add_parser("verify", help="Check every bundle file against its SHA-256")
+    verify.add_argument("directory")
+    models.set_defaults(func=_cmd_models)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        stream=sys.stderr
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# deepmost/columnar.py
+
+"""Columnar batch prediction over Arrow tables with one row per message"""
+
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    raise ImportError("pyarrow is not installed. Please install it with `pip install deepmost[arrow]` or `pip install pyarrow`")
+
+from .core.utils import ConversationTexts, SPEAKER_ALIASES
+
+ArrowInput = Union[str, "pa.Table", "pa.RecordBatch", "pa.RecordBatchReader", Iterable["pa.RecordBatch"]]
+
+NUMERIC_METRICS = [
+    'customer_engagement', 'sales_effectiveness', 'engagement_trend', 'objection_count',
+    'value_proposition_mentions', 'technical_depth', 'urgency_level', 'competitive_context',
+    'pricing_sensitivity', 'decision_authority_signals', 'conversation_length', 'progress'
+]
+STRING_METRICS = ['conversation_style', 'conversation_flow', 'communication_channel']
+
+
+def _to_table(data: ArrowInput, columns: List[str]) -> "pa.Table":
+    if isinstance(data, str):
+        import pyarrow.parquet as pq
+        return pq.read_table(data, columns=columns)
+    if isinstance(data, pa.Table):
+        return data.select(columns)
+    if isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data]).select(columns)
+    if isinstance(data, pa.RecordBatchReader):
+        return data.read_all().select(columns)
+    return pa.Table.from_batches(list(data)).select(columns)
+
+
+def conversation_texts_from_arrow(
+    data: ArrowInput,
+    conversation_id_column: str = "conversation_id",
+    turn_column: str = "turn",
+    speaker_column: str = "speaker",
+    message_column: str = "message"
+):
+    """
+    Group a message-per-row table into conversations and build their ConversationTexts
+    with Arrow compute kernels. Only one Python object per conversation is created.
+
+    Returns (conversation_ids, texts) where conversation_ids is an Arrow array in
+    output order.
+    """
+    table = _to_table(data, [conversation_id_column, turn_column, speaker_column, message_column])
+    table = table.sort_by([(conversation_id_column, "ascending"), (turn_column, "ascending")])
+    if table.num_rows == 0:
+        return pa.array([], type=table.schema.field(conversation_id_column).type), []
+
+    ids = table[conversation_id_column].combine_chunks()
+    messages = pc.fill_null(table[message_column].combine_chunks().cast(pa.string()), "")
+    speakers = pc.utf8_lower(pc.fill_null(table[speaker_column].combine_chunks().cast(pa.string()), ""))
+
+    # Conversation boundaries: rows are sorted by id, so each id is one contiguous run
+    codes = np.asarray(pc.dictionary_encode(ids).indices)
+    starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+    offsets = np.append(starts, len(codes)).astype(np.int32)
+    group_index = np.repeat(np.arange(len(starts)), np.diff(offsets))
+
+    # Vectorized speaker normalization (same mapping as normalize_conversation)
+    customer_aliases = pa.array([k for k, v in SPEAKER_ALIASES.items() if v == 'customer'])
+    rep_aliases = pa.array([k for k, v in SPEAKER_ALIASES.items() if v == 'sales_rep'])
+    is_customer = pc.is_in(speakers, value_set=customer_aliases)
+    is_rep = pc.is_in(speakers, value_set=rep_aliases)
+    labels = pc.if_else(is_customer, "Customer", pc.if_else(is_rep, "Sales_rep", pc.utf8_capitalize(speakers)))
+
+    pa_offsets = pa.array(offsets, type=pa.int32())
+    full_texts = pc.binary_join(pa.ListArray.from_arrays(pa_offsets, messages), " ")
+    lines = pc.binary_join_element_wise(labels, messages, ": ")
+    transcripts = pc.binary_join(pa.ListArray.from_arrays(pa_offsets, lines), "\n")
+
+    customer_mask = np.asarray(is_customer.to_numpy(zero_copy_only=False), dtype=bool)
+    customer_counts = np.bincount(group_index[customer_mask], minlength=len(starts))
+    customer_offsets = pa.array(np.concatenate([[0], np.cumsum(customer_counts)]).astype(np.int32), type=pa.int32())
+    customer_messages = pc.utf8_lower(messages.filter(is_customer))
+    customer_texts = pc.binary_join(pa.ListArray.from_arrays(customer_offsets, customer_messages), " ")
+
+    texts = [
+        ConversationTexts(full_text=full, transcript=transcript, customer_text=customer, num_messages=int(n))
+        for full, transcript, customer, n in zip(
+            full_texts.to_pylist(), transcripts.to_pylist(), customer_texts.to_pylist(), np.diff(offsets)
+        )
+    ]
+    return ids.take(pa.array(starts)), texts
+
+
+def _results_to_table(conversation_ids: "pa.Array", results: List[Dict[str, Any]]) -> "pa.Table":
+    columns: Dict[str, Any] = {
+        'conversation_id': conversation_ids,
+        'turn': pa.array([r['turn'] for r in results], type=pa.int32()),
+        'probability': pa.array([r['probability'] for r in results], type=pa.float32()),
+        'status': pa.array([r['status'] for r in results]),
+        'suggested_action': pa.array([r['suggested_action'] for r in results]),
+    }
+    for name in NUMERIC_METRICS:
+        columns[name] = pa.array([r['metrics'].get(name) for r in results], type=pa.float32())
+    for name in STRING_METRICS:
+        columns[name] = pa.array([r['metrics'].get(name) for r in results], type=pa.string())
+    columns['primary_customer_needs'] = pa.array(
+        [r['metrics'].get('primary_customer_needs') for r in results], type=pa.list_(pa.string())
+    )
+    columns['backend'] = pa.array([r['backend'] for r in results])
+    return pa.table(columns)
+
+
+def predict_arrow(
+    agent,
+    data: ArrowInput,
+    batch_size: int = 256,
+    output_path: Optional[str] = None,
+    conversation_id_column: str = "conversation_id",
+    turn_column: str = "turn",
+    speaker_column: str = "speaker",
+    message_column: str = "message"
+) -> "pa.Table":
+    """
+    Score every conversation in a message-per-row Arrow table, RecordBatch, reader,
+    iterable of RecordBatches or Parquet path.
+
+    Returns one row per conversation with the probability, status, suggested action
+    and flattened metrics. If output_path is given, the result is also written as Parquet.
+
+    Example:
+        import pyarrow.parquet as pq
+        from deepmost import sales
+        from deepmost.columnar import predict_arrow
+
+        agent = sales.Agent()
+        scores = predict_arrow(agent, "transcripts.parquet", output_path="scores.parquet")
+    """
+    conversation_ids, texts = conversation_texts_from_arrow(
+        data, conversation_id_column, turn_column, speaker_column, message_column
+    )
+
+    results: List[Dict[str, Any]] = []
+    for start in range(0, len(texts), batch_size):
+        results.extend(agent.predictor.predict_conversions_batch_texts(texts[start:start + batch_size]))
+
+    table = _results_to_table(conversation_ids, results)
+    if output_path:
+        import pyarrow.parquet as pq
+        pq.write_table(table, output_path)
+    return table
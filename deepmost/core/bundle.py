@@ -0,0 +1,194 @@
+"""Model bundles: every artifact a backend config needs, resolved into one local directory"""
+
+import fnmatch
+import json
+import logging
+import os
+import shutil
+import tarfile
+import time
+from typing import Any, Dict, Optional
+
+from .utils import download_model, sha256_file
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_MANIFEST = "bundle.json"
+BUNDLE_FORMAT = 1
+# Default quantization picked from a GGUF repo, as in OpenSourceEmbeddings
+GGUF_FILENAME_PATTERN = "*Q4_K_M.gguf"
+# Repo files an encoder needs for inference; ONNX exports and other frameworks' weights are skipped
+_ENCODER_IGNORE = ["onnx/*", "*.onnx", "*.onnx_data", "*.msgpack", "*.h5", "*.ot", "imgs/*", "*.jpg", "*.png"]
+
+
+def pull_bundle(
+    directory: str,
+    backend: str = "opensource",
+    model_path: Optional[str] = None,
+    embedding_model: Optional[str] = "BAAI/bge-m3",
+    llm_model: Optional[str] = None,
+    llm_filename: str = GGUF_FILENAME_PATTERN
+) -> Dict[str, Any]:
+    """
+    Resolve the PPO model, the encoder (opensource embeddings only) and the GGUF LLM (if
+    any) into directory and write its bundle.json manifest. Each source may be a URL or
+    HuggingFace repo id, or a local file/directory to copy. Encoder weights are stored
+    as safetensors so they can be memory-mapped at load time.
+
+        pull_bundle("./bundle", llm_model="unsloth/Qwen3-4B-GGUF")
+        agent = sales.Agent(model_bundle="./bundle")     # starts without network access
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+
+    if model_path is None:
+        from ..sales import _get_default_model_info
+        model_path, _ = _get_default_model_info(backend)
+    manifest: Dict[str, Any] = {
+        'format': BUNDLE_FORMAT,
+        'backend': backend,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'artifacts': {'ppo_model': _pull_ppo(directory, model_path)},
+    }
+    if backend == "opensource" and embedding_model:
+        manifest['artifacts']['embedding_model'] = _pull_encoder(directory, embedding_model)
+    if llm_model:
+        manifest['artifacts']['llm_model'] = _pull_gguf(directory, llm_model, llm_filename)
+
+    manifest['pull_seconds'] = round(time.perf_counter() - started, 2)
+    _write_json(os.path.join(directory, BUNDLE_MANIFEST), manifest)
+    return manifest
+
+
+def load_bundle(directory: str, verify: bool = False) -> Dict[str, str]:
+    """
+    Absolute local paths of a bundle's artifacts: {'backend', 'ppo_model', and
+    'embedding_model' / 'llm_model' if bundled}. Sizes are always checked; verify=True
+    also checks every file's SHA-256.
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    path = os.path.join(directory, BUNDLE_MANIFEST)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No {BUNDLE_MANIFEST} in {directory}; create one with `deepmost models pull`")
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')} in {path}")
+
+    resolved = {'backend': manifest['backend']}
+    for name, artifact in manifest['artifacts'].items():
+        for relative, record in artifact['files'].items():
+            file_path = os.path.join(directory, relative)
+            if not os.path.isfile(file_path) or os.path.getsize(file_path) != record['size']:
+                raise ValueError(f"Bundle file {file_path} is missing or has the wrong size")
+            if verify and sha256_file(file_path) != record['sha256']:
+                raise ValueError(f"Bundle file {file_path} does not match its SHA-256")
+        resolved[name] = os.path.join(directory, artifact['path'])
+    return resolved
+
+
+def archive_bundle(directory: str, output: str) -> str:
+    """Pack a pulled bundle into an uncompressed tar (model weights barely compress)"""
+    directory = os.path.abspath(os.path.expanduser(directory))
+    load_bundle(directory)
+    with tarfile.open(output, "w") as tar:
+        tar.add(directory, arcname=os.path.basename(directory.rstrip(os.sep)) or "bundle")
+    return output
+
+
+def _pull_ppo(directory: str, source: str) -> Dict[str, Any]:
+    target_dir = os.path.join(directory, "ppo")
+    os.makedirs(target_dir, exist_ok=True)
+    if source.startswith(('http://', 'https://')):
+        target = os.path.join(target_dir, os.path.basename(source.split("?", 1)[0]) or "model.zip")
+        download_model(source, target)
+    else:
+        target = os.path.join(target_dir, os.path.basename(source))
+        _copy(os.path.expanduser(source), target)
+    return _artifact(directory, source, target)
+
+
+def _pull_encoder(directory: str, source: str) -> Dict[str, Any]:
+    target = os.path.join(directory, "embedding")
+    if os.path.isdir(os.path.expanduser(source)):
+        _copy(os.path.expanduser(source), target)
+    else:
+        from huggingface_hub import HfApi, snapshot_download
+
+        ignore = list(_ENCODER_IGNORE)
+        if any(name.endswith(".safetensors") for name in HfApi().list_repo_files(source)):
+            ignore.append("*.bin")
+        logger.info(f"Downloading encoder {source} to {target}")
+        snapshot_download(repo_id=source, local_dir=target, ignore_patterns=ignore)
+
+    if not any(name.endswith(".safetensors") for name in os.listdir(target)):
+        _convert_to_safetensors(target)
+    return _artifact(directory, source, target)
+
+
+def _convert_to_safetensors(model_dir: str) -> None:
+    from transformers import AutoModel
+
+    logger.info(f"Converting {model_dir} weights to safetensors for memory-mapped loading")
+    model = AutoModel.from_pretrained(model_dir, local_files_only=True)
+    model.save_pretrained(model_dir, safe_serialization=True)
+    for name in os.listdir(model_dir):
+        if name.endswith(".bin"):
+            os.remove(os.path.join(model_dir, name))
+
+
+def _pull_gguf(directory: str, source: str, pattern: str) -> Dict[str, Any]:
+    target_dir = os.path.join(directory, "llm")
+    os.makedirs(target_dir, exist_ok=True)
+    if source.lower().endswith(".gguf"):
+        target = os.path.join(target_dir, os.path.basename(source))
+        if source.startswith(('http://', 'https://')):
+            download_model(source, target)
+        else:
+            _copy(os.path.expanduser(source), target)
+        return _artifact(directory, source, target)
+
+    from huggingface_hub import HfApi, hf_hub_download
+
+    matches = sorted(name for name in HfApi().list_repo_files(source) if fnmatch.fnmatch(name, pattern))
+    if not matches:
+        raise FileNotFoundError(f"No file matching {pattern!r} in {source}")
+    logger.info(f"Downloading {source}/{matches[0]} to {target_dir}")
+    target = hf_hub_download(repo_id=source, filename=matches[0], local_dir=target_dir)
+    return _artifact(directory, f"{source}/{matches[0]}", target)
+
+
+def _copy(source: str, target: str) -> None:
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    if os.path.isdir(source):
+        shutil.copytree(source, target, dirs_exist_ok=True)
+    else:
+        shutil.copy2(source, target)
+
+
+def _artifact(directory: str, source: str, path: str) -> Dict[str, Any]:
+    """Manifest entry: where it came from and the size and SHA-256 of every file"""
+    if os.path.isdir(path):
+        paths = [
+            os.path.join(root, name) for root, dirs, names in os.walk(path)
+            for name in names if not root.startswith(os.path.join(path, ".cache"))
+        ]
+    else:
+        paths = [path]
+    return {
+        'source': source,
+        'path': os.path.relpath(path, directory),
+        'files': {
+            os.path.relpath(p, directory): {'size': os.path.getsize(p), 'sha256': sha256_file(p)}
+            for p in sorted(paths)
+        },
+    }
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
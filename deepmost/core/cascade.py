@@ -0,0 +1,87 @@
+"""Cascade scoring: cheap first-pass metrics, LLM metrics only near decision thresholds"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+# Boundaries of the status bands in SalesPredictor._get_status (very low / low / medium / high)
+DEFAULT_THRESHOLDS = (0.3, 0.4, 0.5)
+
+
+class CascadeStats:
+    """
+    Running record of cascade decisions: how many predictions were escalated to the
+    LLM metrics, and the latency of escalated versus first-pass-only predictions.
+    Latencies are kept for the most recent `window` predictions.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._escalated = 0
+        self._latencies = {True: deque(maxlen=window), False: deque(maxlen=window)}
+
+    def record(self, escalated: bool, seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._calls += 1
+            self._escalated += int(escalated)
+            if seconds is not None:
+                self._latencies[bool(escalated)].append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Escalated fraction and latency percentiles (ms) overall and per path"""
+        with self._lock:
+            escalated = list(self._latencies[True])
+            first_pass = list(self._latencies[False])
+            calls, escalations = self._calls, self._escalated
+        return {
+            'calls': calls,
+            'escalated': escalations,
+            'escalation_rate': escalations / calls if calls else 0.0,
+            'latency_ms': {
+                'all': _latency_summary(escalated + first_pass),
+                'first_pass': _latency_summary(first_pass),
+                'escalated': _latency_summary(escalated),
+            }
+        }
+
+
+class CascadePolicy:
+    """
+    Escalate a prediction to the LLM metrics when its first-pass probability lies
+    within `margin` of any decision threshold; elsewhere the cheap metrics cannot
+    change the decision enough to matter.
+
+        CascadePolicy(margin=0.03)              # re-score 0.27-0.33, 0.37-0.43, 0.47-0.53
+        CascadePolicy(0.05, thresholds=[0.5])   # a single accept/reject cut-off
+    """
+
+    def __init__(self, margin: float = 0.03, thresholds: Sequence[float] = DEFAULT_THRESHOLDS):
+        if margin < 0:
+            raise ValueError("margin must be non-negative")
+        if not thresholds:
+            raise ValueError("thresholds must not be empty")
+        self.margin = margin
+        self.thresholds = np.asarray(sorted(thresholds), dtype=np.float64)
+        self.stats = CascadeStats()
+
+    def escalate(self, probabilities) -> np.ndarray:
+        """Boolean mask (same shape as probabilities) of predictions to re-score"""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        distance = np.abs(probabilities[..., None] - self.thresholds).min(axis=-1)
+        return distance <= self.margin
+
+
+def _latency_summary(seconds) -> Optional[Dict[str, float]]:
+    if not seconds:
+        return None
+    ms = np.asarray(seconds) * 1000
+    return {
+        'count': len(ms),
+        'mean': round(float(ms.mean()), 3),
+        'p50': round(float(np.percentile(ms, 50)), 3),
+        'p95': round(float(np.percentile(ms, 95)), 3),
+        'p99': round(float(np.percentile(ms, 99)), 3),
+    }
@@ -0,0 +1,563 @@
+"""HTTP connection pooling and rate-limit-aware wrappers for the OpenAI/Azure clients used by the remote providers"""
+
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Block until `amount` tokens are available; returns the seconds waited"""
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate_per_second
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the server reported the quota exhausted"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed calls and rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(
+                        f"Circuit open after {self._failures} consecutive failures; "
+                        f"retrying in {self.reset_timeout - (time.monotonic() - self._opened_at):.1f}s"
+                    )
+                self.state = "half_open"
+            elif self.state == "half_open":
+                raise CircuitOpenError("Circuit half-open; trial request in flight")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / scale)
+        except ValueError:
+            continue
+    return None
+
+
+def _estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """Rough token count (~4 characters per token) for TPM accounting"""
+    chars = 0
+    payload = kwargs.get("input")
+    if payload is not None:
+        chars += sum(len(str(p)) for p in payload) if isinstance(payload, (list, tuple)) else len(str(payload))
+    for message in kwargs.get("messages") or []:
+        chars += len(str(message.get("content", "")))
+    return chars // 4 + 1 + int(kwargs.get("max_tokens") or 0)
+
+
+class RateLimiter:
+    """
+    Client-side quota management shared by every provider that holds it: request and
+    token per-minute buckets, bounded concurrency, exponential backoff with jitter
+    honoring Retry-After, and a circuit breaker. Pass the same instance to several
+    providers/agents that draw from one deployment's quota.
+
+    Example:
+        limiter = RateLimiter(requests_per_minute=3000, tokens_per_minute=1_000_000, max_concurrency=16)
+        agent = sales.Agent(openai_api_key=key, rate_limiter=limiter)
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 8,
+        max_retries: int = 6,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        request_timeout: Optional[float] = 60.0
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0,
+            'rejected_open_circuit': 0, 'throttled_seconds': 0.0,
+        }
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, circuit_state=self.breaker.state)
+
+    def split(self, workers: int) -> None:
+        """
+        Keep 1/workers of the quota and concurrency in this process. Each forked worker
+        holds its own copy of the limiter, so without this the workers together would
+        use workers times the configured quota.
+        """
+        workers = max(1, workers)
+        if self.requests_per_minute:
+            self.request_bucket = TokenBucket(self.requests_per_minute / workers)
+        if self.tokens_per_minute:
+            self.token_bucket = TokenBucket(self.tokens_per_minute / workers)
+        self._semaphore = threading.BoundedSemaphore(max(1, self.max_concurrency // workers))
+        self.breaker._lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def _wait_for_cooldown(self) -> None:
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            self._count('throttled_seconds', delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, fn: Callable[..., Any], **kwargs) -> Any:
+        """Call fn(**kwargs) within quota, retrying transient failures"""
+        if self.request_timeout is not None:
+            kwargs.setdefault("timeout", self.request_timeout)
+        tokens = _estimate_tokens(kwargs)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count('rejected_open_circuit')
+            instrumentation.count('api_circuit_rejections')
+            raise
+
+        attempt = 0
+        while True:
+            self._wait_for_cooldown()
+            waited = self.request_bucket.acquire(1) if self.request_bucket else 0.0
+            waited += self.token_bucket.acquire(tokens) if self.token_bucket else 0.0
+            if waited:
+                self._count('throttled_seconds', waited)
+                instrumentation.count('api_throttled_seconds', waited)
+
+            # A streamed response keeps its slot until the caller has read or closed it;
+            # the semaphore is captured so split() replacing it cannot unbalance a release
+            semaphore = self._semaphore
+            semaphore.acquire()
+            streaming = False
+            try:
+                self._count('requests')
+                try:
+                    result = fn(**kwargs)
+                except Exception as e:
+                    error = e
+                else:
+                    self.breaker.record_success()
+                    if kwargs.get("stream"):
+                        result = _StreamSlot(result, semaphore.release)
+                        streaming = True
+                    return result
+            finally:
+                if not streaming:
+                    semaphore.release()
+
+            if not _is_retryable(error):
+                # The service answered (e.g. 400), so it is reachable
+                self.breaker.record_success()
+                raise error
+            if getattr(error, "status_code", None) == 429:
+                self._count('rate_limited')
+                instrumentation.count('api_rate_limited')
+            if attempt >= self.max_retries:
+                self._count('failures')
+                instrumentation.count('api_failures')
+                self.breaker.record_failure()
+                raise error
+
+            delay = self._backoff(attempt, error)
+            if getattr(error, "status_code", None) == 429:
+                # Quota is exhausted for everyone sharing this limiter, not just this call
+                with self._lock:
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                if self.request_bucket:
+                    self.request_bucket.drain()
+            logger.debug(f"Retrying remote call in {delay:.2f}s after: {error}")
+            self._count('retries')
+            instrumentation.count('api_retries')
+            attempt += 1
+            time.sleep(delay)
+
+
+class _StreamSlot:
+    """
+    Iterator over a streamed response that releases its RateLimiter concurrency slot
+    once the stream is exhausted, fails, is closed, or is garbage collected unread.
+    Other attributes (e.g. response) are those of the wrapped stream.
+    """
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._iterator = iter(stream)
+        self._release = release
+        self._released = False
+        self._release_lock = threading.Lock()
+
+    def _done(self) -> None:
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self._done()
+            raise
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if not getattr(self, "_released", True):
+            self._done()
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._stream, name)
+
+
+class RateLimitedClient:
+    """
+    Exposes the `embeddings.create` and `chat.completions.create` surface of an
+    OpenAI/AzureOpenAI client with every call routed through a RateLimiter.
+    """
+
+    def __init__(self, client, limiter: RateLimiter):
+        self.client = client
+        self.limiter = limiter
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    def _create_embeddings(self, **kwargs):
+        return self.limiter.call(self.client.embeddings.create, **kwargs)
+
+    def _create_chat_completion(self, **kwargs):
+        return self.limiter.call(self.client.chat.completions.create, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+
+def _httpx_module():
+    """httpx, which openai 1.x clients are built on, or httpx2 for the SDK releases that moved to it"""
+    import openai
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    if httpx is not None and issubclass(openai.DefaultHttpxClient, httpx.Client):
+        return httpx
+    import httpx2
+
+    return httpx2
+
+
+class _CountingTransport:
+    """Wraps an httpx (async) transport to count requests handled by the pool"""
+
+    def __init__(self, transport, pool: "HTTPPool"):
+        self.transport = transport
+        self.pool = pool
+
+    def handle_request(self, request):
+        self.pool._request_started()
+        try:
+            return self.transport.handle_request(request)
+        finally:
+            self.pool._request_finished(self.transport)
+
+    async def handle_async_request(self, request):
+        self.pool._request_started()
+        try:
+            return await self.transport.handle_async_request(request)
+        finally:
+            self.pool._request_finished(self.transport)
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class HTTPPool:
+    """
+    Keep-alive HTTP connection pool shared by the remote providers, with one sync and
+    one async httpx client created on first use. Every provider built without an
+    explicit pool uses shared_http_pool(), so new Agent instances reuse warm
+    connections instead of paying a TLS handshake each time.
+
+    Example:
+        pool = HTTPPool(max_connections=200, max_keepalive_connections=50, http2=True)
+        agent = sales.Agent(openai_api_key=key, http_pool=pool)
+        print(pool.stats())
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeout: Optional[float] = 60.0
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.timeout = timeout
+        self._client = None
+        self._async_client = None
+        self._transports: List[Any] = []
+        self._seen_connections: "weakref.WeakSet" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._in_flight = 0
+
+    def _transport_kwargs(self, httpx) -> Dict[str, Any]:
+        return {
+            'http2': self.http2,
+            'limits': httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+        }
+
+    @property
+    def client(self):
+        """Sync httpx client for openai.OpenAI / openai.AzureOpenAI(http_client=...)"""
+        with self._lock:
+            if self._client is None:
+                import openai
+                httpx = _httpx_module()
+                transport = httpx.HTTPTransport(**self._transport_kwargs(httpx))
+                self._transports.append(transport)
+                self._client = openai.DefaultHttpxClient(
+                    transport=_CountingTransport(transport, self),
+                    **({'timeout': self.timeout} if self.timeout is not None else {})
+                )
+            return self._client
+
+    @property
+    def async_client(self):
+        """Async httpx client for openai.AsyncOpenAI / openai.AsyncAzureOpenAI; use it from one event loop"""
+        with self._lock:
+            if self._async_client is None:
+                import openai
+                httpx = _httpx_module()
+                transport = httpx.AsyncHTTPTransport(**self._transport_kwargs(httpx))
+                self._transports.append(transport)
+                self._async_client = openai.DefaultAsyncHttpxClient(
+                    transport=_CountingTransport(transport, self),
+                    **({'timeout': self.timeout} if self.timeout is not None else {})
+                )
+            return self._async_client
+
+    def _request_started(self) -> None:
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+
+    def _request_finished(self, transport) -> None:
+        connections = getattr(getattr(transport, "_pool", None), "connections", [])
+        with self._lock:
+            self._in_flight -= 1
+            for connection in list(connections):
+                self._seen_connections.add(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counts and connection usage across the sync and async clients"""
+        open_connections = idle_connections = 0
+        for transport in self._transports:
+            for connection in list(getattr(getattr(transport, "_pool", None), "connections", [])):
+                if connection.is_closed():
+                    continue
+                open_connections += 1
+                idle_connections += int(connection.is_idle())
+        with self._lock:
+            # Connections are tracked weakly, so this is a lower bound once closed ones are collected
+            opened = len(self._seen_connections)
+            return {
+                'requests': self._requests,
+                'in_flight': self._in_flight,
+                'open_connections': open_connections,
+                'idle_connections': idle_connections,
+                'connections_seen': opened,
+                'max_connections': self.max_connections,
+                'max_keepalive_connections': self.max_keepalive_connections,
+                'http2': self.http2,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
+
+    def reset_after_fork(self) -> None:
+        """Drop the clients inherited from the parent (in a forked child); new ones are created on first use"""
+        self._lock = threading.Lock()
+        self._client = self._async_client = None
+        self._transports = []
+        self._seen_connections = weakref.WeakSet()
+        self._requests = self._in_flight = 0
+
+
+_shared_pool: Optional[HTTPPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_http_pool() -> HTTPPool:
+    """Process-wide HTTPPool used by providers that were not given one"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HTTPPool()
+        return _shared_pool
+
+
+def _reset_shared_pool_after_fork() -> None:
+    # Sockets inherited from the parent must not be shared with it
+    global _shared_pool, _shared_pool_lock
+    _shared_pool = None
+    _shared_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_shared_pool_after_fork)
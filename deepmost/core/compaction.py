@@ -0,0 +1,198 @@
+"""Token-budgeted compaction of conversation history for LLM prompts"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Speaker of the pseudo-message that carries the summary in a compacted history
+SUMMARY_SPEAKER = 'summary'
+
+Summarizer = Callable[[Optional[str], List[Dict[str, str]], int], Optional[str]]
+
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), as used for TPM accounting"""
+    return len(text) // 4 + 1
+
+
+def format_message(msg: Dict[str, str]) -> str:
+    """One transcript line, as in ConversationTexts.transcript"""
+    return f"{msg['speaker'].capitalize()}: {msg['message']}"
+
+
+@dataclass
+class CompactedHistory:
+    """A history reduced to a summary of its older messages plus the recent ones verbatim"""
+    summary: Optional[str]
+    recent: List[Dict[str, str]]
+    # Number of leading messages of the original history the summary stands for
+    summarized_messages: int = 0
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        """The compacted history, with the summary (if any) as a leading 'summary' message"""
+        if not self.summary:
+            return list(self.recent)
+        return [{'speaker': SUMMARY_SPEAKER, 'message': self.summary}] + self.recent
+
+    @property
+    def transcript(self) -> str:
+        return "\n".join(format_message(msg) for msg in self.history)
+
+
+def extractive_summary(
+    previous_summary: Optional[str],
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    count_tokens: Callable[[str], int] = approximate_tokens
+) -> str:
+    """
+    LLM-free summary: the first sentence of each aged-out message appended to the
+    previous summary, dropping the oldest lines once max_tokens is exceeded.
+    """
+    lines = previous_summary.split("\n") if previous_summary else []
+    for msg in messages:
+        first_sentence = re.split(r"(?<=[.!?])\s", msg['message'].strip(), maxsplit=1)[0]
+        if first_sentence:
+            lines.append(format_message({'speaker': msg['speaker'], 'message': first_sentence}))
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    summary = "\n".join(lines)
+    if lines and count_tokens(summary) > max_tokens:
+        summary = summary[-max_tokens * 4:]
+    return summary
+
+
+class HistoryCompactor:
+    """
+    Keeps the conversation part of every LLM prompt within token_budget tokens.
+
+    The most recent messages are kept verbatim (at least min_recent_messages, more
+    while they fit in the budget left after summary_budget); older ones are replaced
+    by a rolling summary. The summary is kept in conversation state, so each call only
+    summarizes the messages that aged out since the previous one:
+
+        compactor = HistoryCompactor(token_budget=2000)
+        compacted, state = compactor.compact(history, state)   # pass state back next turn
+        compacted.history      # [{'speaker': 'summary', ...}, *recent messages]
+
+    Summaries come from `summarize(previous_summary, new_messages, max_tokens)` (the
+    provider's LLM, see summarize_history), or extractive_summary when it is missing
+    or fails.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        summary_budget: Optional[int] = None,
+        min_recent_messages: int = 2
+    ):
+        if token_budget < 1:
+            raise ValueError("token_budget must be positive")
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget if summary_budget is not None else max(1, token_budget // 4)
+        if self.summary_budget >= token_budget:
+            raise ValueError("summary_budget must be smaller than token_budget")
+        self.min_recent_messages = min_recent_messages
+
+    def compact(
+        self,
+        history: List[Dict[str, str]],
+        state: Optional[Dict[str, Any]] = None,
+        count_tokens: Callable[[str], int] = approximate_tokens,
+        summarize: Optional[Summarizer] = None
+    ) -> Tuple[CompactedHistory, Optional[Dict[str, Any]]]:
+        """Compacted view of history and the summary state to keep for the next call"""
+        line_tokens = [count_tokens(format_message(msg)) + 1 for msg in history]
+        if sum(line_tokens) <= self.token_budget:
+            return CompactedHistory(None, list(history)), None
+
+        available = self.token_budget - self.summary_budget
+        previous, summarized = None, 0
+        if _extends(state, history):
+            previous, summarized = state['summary'], state['messages']
+
+        split = self._split(line_tokens, available)
+        if split > summarized:
+            # Summarizing anyway: age out down to half the verbatim budget, so the next
+            # few turns fit without another summarization call
+            split = max(split, self._split(line_tokens, available // 2))
+        # A summary already covering more than the split is kept: the recent part only shrinks
+        split = max(split, summarized)
+
+        # Fold aged-out messages into the summary in chunks that fit the budget themselves
+        summary = previous
+        chunk_start, chunk_tokens = summarized, 0
+        for i in range(summarized, split):
+            if chunk_tokens and chunk_tokens + line_tokens[i] > available:
+                summary = self._summarize(summary, history[chunk_start:i], count_tokens, summarize)
+                chunk_start, chunk_tokens = i, 0
+            chunk_tokens += line_tokens[i]
+        if chunk_start < split:
+            summary = self._summarize(summary, history[chunk_start:split], count_tokens, summarize)
+
+        state = {
+            'summary': summary,
+            'messages': split,
+            'last_message': history[split - 1]['message'] if split else None
+        }
+        return CompactedHistory(summary, list(history[split:]), split), state
+
+    def _split(self, line_tokens: List[int], budget: int) -> int:
+        """Index of the first message kept verbatim: newest first, while they fit in budget"""
+        split = len(line_tokens)
+        while split > 0 and (
+            len(line_tokens) - split < self.min_recent_messages or budget - line_tokens[split - 1] >= 0
+        ):
+            budget -= line_tokens[split - 1]
+            split -= 1
+        return split
+
+    def _summarize(
+        self,
+        previous: Optional[str],
+        messages: List[Dict[str, str]],
+        count_tokens: Callable[[str], int],
+        summarize: Optional[Summarizer]
+    ) -> str:
+        if summarize is not None:
+            try:
+                summary = summarize(previous, messages, self.summary_budget)
+                if summary and count_tokens(summary) <= self.summary_budget:
+                    return summary
+                if summary:
+                    logger.warning("History summary exceeded summary_budget. Using extractive summary.")
+            except Exception as e:
+                logger.warning(f"History summarization failed: {e}. Using extractive summary.")
+        return extractive_summary(previous, messages, self.summary_budget, count_tokens)
+
+
+def _extends(state: Optional[Dict[str, Any]], history: List[Dict[str, str]]) -> bool:
+    """Whether a summary state still describes a prefix of history"""
+    if not state:
+        return False
+    seen = state['messages']
+    return seen <= len(history) and (seen == 0 or history[seen - 1]['message'] == state['last_message'])
+
+
+SUMMARY_PROMPT = """You maintain a running summary of a sales conversation for a sales assistant.
+
+PREVIOUS SUMMARY:
+{previous}
+
+NEW MESSAGES:
+{messages}
+
+Write the updated summary in at most {max_words} words. Keep customer needs, objections, pricing, commitments and open questions. Respond with ONLY the summary."""
+
+
+def summary_prompt(previous: Optional[str], messages: List[Dict[str, str]], max_tokens: int) -> str:
+    """Prompt asking an LLM to fold messages into the previous summary"""
+    return SUMMARY_PROMPT.format(
+        previous=previous or "(none)",
+        messages="\n".join(format_message(msg) for msg in messages),
+        max_words=max(10, int(max_tokens * 0.7))
+    )
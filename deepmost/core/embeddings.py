@@ -3,12 +3,18 @@
 import numpy as np
 import torch
 import logging
-from typing import List, Dict, Optional, Protocol, Tuple, Any
+from typing import List, Dict, Optional, Protocol, Tuple, Any, Iterator
 from transformers import AutoTokenizer, AutoModel
 import re
 import json
 import os
-import random
+import threading
+from . import instrumentation
+from .clients import HTTPPool, RateLimitedClient, RateLimiter, shared_http_pool
+from .bundle import GGUF_FILENAME_PATTERN
+from .compaction import SUMMARY_SPEAKER, approximate_tokens, summary_prompt
+from .keywords import KeywordMatcher
+from .utils import ConversationTexts, probability_trajectory_dicts
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +29,22 @@ class EmbeddingProvider(Protocol):
         """Analyze conversation metrics"""
         ...
 
+    def analyze_metrics_texts(
+        self,
+        texts: ConversationTexts,
+        turn_number: int,
+        compute_trajectory: Optional[bool] = None,
+        base_metrics: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Analyze conversation metrics from pre-joined conversation texts.
+
+        base_metrics (e.g. from a MetricsHead) replaces the LLM analysis."""
+        ...
+
+    def probability_trajectories(self, texts_list: List[ConversationTexts], metrics_list: List[Dict[str, Any]]) -> List[Dict[int, float]]:
+        """Heuristic probability trajectories for a batch of conversations"""
+        ...
+
     def generate_response(
         self,
         history: List[Dict[str, str]],
@@ -32,26 +54,78 @@ class EmbeddingProvider(Protocol):
         """Generate response (optional method)"""
         return "Thank you for your message. Could you tell me more?"
 
+    def generate_response_stream(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[str]:
+        """Generate response as a stream of text chunks (optional method)"""
+        yield self.generate_response(history, user_input, system_prompt)
+
+
+def _cached_gguf(repo_id: str, pattern: str) -> str:
+    """Path of a GGUF matching pattern in the local HuggingFace cache, without network access"""
+    import fnmatch
+    from huggingface_hub import snapshot_download
+
+    snapshot = snapshot_download(repo_id=repo_id, allow_patterns=[pattern], local_files_only=True)
+    for root, _, names in os.walk(snapshot):
+        for name in sorted(names):
+            if fnmatch.fnmatch(name, pattern):
+                return os.path.join(root, name)
+    raise FileNotFoundError(f"No GGUF matching {pattern!r} for {repo_id} in the local HuggingFace cache")
+
 
 class OpenSourceEmbeddings:
     """Open-source embedding provider using HuggingFace models and LLM for comprehensive metrics analysis."""
 
+    # Customer-message keywords behind the fallback metrics
+    keyword_matcher = KeywordMatcher({
+        'objection': ['expensive', 'costly', 'concern', 'budget', 'not interested', 'problem', 'issue'],
+        'pricing': ['price', 'cost', 'budget', 'expensive'],
+    })
+
     def __init__(
         self,
         model_name: str,
         device: torch.device,
         expected_dim: int,
-        llm_model: Optional[str] = None
+        llm_model: Optional[str] = None,
+        trajectory_seed: Optional[int] = None,
+        compute_trajectory: bool = True,
+        local_files_only: bool = False,
+        llm_threads: Optional[int] = None,
+        llm_batch_threads: Optional[int] = None,
+        load_encoder: bool = True
     ):
         self.device = device
+        self.trajectory_seed = trajectory_seed
+        self.compute_trajectory = compute_trajectory
         self.expected_dim = expected_dim
         self.MAX_TURNS_REFERENCE = 1000
+        self.MAX_SEQ_LENGTH = 512
+        self.EMBEDDING_BATCH_SIZE = 32
 
-        logger.info(f"Loading embedding model: {model_name}")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name).to(device)
-        self.native_dim = self.model.config.hidden_size
-        logger.info(f"Embedding model loaded. Native dim: {self.native_dim}, Expected dim: {self.expected_dim}")
+        self.tokenizer = self.model = None
+        self.native_dim = 0
+        if load_encoder:
+            logger.info(f"Loading embedding model: {model_name}")
+            # local_files_only: never contact the HuggingFace hub (bundles, air-gapped hosts)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+            self.model = AutoModel.from_pretrained(model_name, local_files_only=local_files_only).to(device)
+            self.native_dim = self.model.config.hidden_size
+        else:
+            # Metrics/response-only provider of a hybrid setup: embeddings come from another backend
+            logger.info("Embedding model not loaded; this provider serves metrics and responses only.")
+        self._special_tokens: Optional[Tuple[List[int], List[int]]] = None
+        # The encoder is shared read-only between threads (inference_mode). The fast tokenizer
+        # is not: a call with other truncation/padding settings reconfigures it in place.
+        self._tokenizer_lock = threading.Lock()
+        # A llama.cpp context serves one evaluation at a time
+        self._llm_lock = threading.Lock()
+        if self.model is not None:
+            logger.info(f"Embedding model loaded. Native dim: {self.native_dim}, Expected dim: {self.expected_dim}")
 
         self.llm = None
         if llm_model:
@@ -64,21 +138,31 @@ class OpenSourceEmbeddings:
                     "n_ctx": 8192,
                     "verbose": False 
                 }
+                # Decode and prompt-eval threads (llama.cpp picks from the core count otherwise)
+                if llm_threads:
+                    llama_params["n_threads"] = llm_threads
+                if llm_batch_threads:
+                    llama_params["n_threads_batch"] = llm_batch_threads
 
                 if "/" in llm_model and not llm_model.lower().endswith(".gguf"):
                     repo_id = llm_model
                     logger.info(f"LLM '{repo_id}' is a HuggingFace repo. Using Llama.from_pretrained.")
                     
-                    gguf_filename_pattern = "*Q4_K_M.gguf"
+                    gguf_filename_pattern = GGUF_FILENAME_PATTERN
                     
                     try:
-                        self.llm = Llama.from_pretrained(
-                            repo_id=repo_id,
-                            filename=gguf_filename_pattern, 
-                            local_dir_use_symlinks=False, 
-                            **llama_params
-                        )
-                        logger.info(f"LLM loaded successfully from HuggingFace repo '{repo_id}'.")
+                        if local_files_only:
+                            # from_pretrained lists the repo online; use the hub cache directly
+                            self.llm = Llama(model_path=_cached_gguf(repo_id, gguf_filename_pattern), **llama_params)
+                            logger.info(f"LLM loaded from the local HuggingFace cache for '{repo_id}'.")
+                        else:
+                            self.llm = Llama.from_pretrained(
+                                repo_id=repo_id,
+                                filename=gguf_filename_pattern, 
+                                local_dir_use_symlinks=False, 
+                                **llama_params
+                            )
+                            logger.info(f"LLM loaded successfully from HuggingFace repo '{repo_id}'.")
 
                     except Exception as e_from_pretrained:
                         logger.warning(f"Llama.from_pretrained failed for '{repo_id}' (pattern: '{gguf_filename_pattern}'): {e_from_pretrained}. "
@@ -110,12 +194,98 @@ class OpenSourceEmbeddings:
                 "LLM-derived comprehensive metrics are highly recommended for best accuracy."
             )
 
-    def get_embedding(self, text: str, turn_number: int) -> np.ndarray:
-        inputs = self.tokenizer(
-            text, padding=True, truncation=True, return_tensors='pt', max_length=512
-        ).to(self.device)
+    def get_embedding(self, text: str, turn_number: int, prefix: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        if prefix is not None and text.startswith(prefix['text']):
+            instrumentation.count('cache_hits', cache='embedding_prefix', backend='opensource')
+            embedding_native = self._embed_with_prefix(text, prefix)
+        else:
+            if prefix is not None:
+                instrumentation.count('cache_misses', cache='embedding_prefix', backend='opensource')
+            with instrumentation.stage('tokenize', backend='opensource'):
+                inputs = self._tokenize(
+                    text, padding=True, truncation=True, return_tensors='pt', max_length=self.MAX_SEQ_LENGTH
+                ).to(self.device)
+            embedding_native = self._encode(inputs)
+
+        return self._fit_and_scale(embedding_native, turn_number)
+
+    def prepare_embedding_prefix(self, prefix_text: str) -> Dict[str, Any]:
+        """
+        Pre-tokenize a known conversation prefix so a later get_embedding call only
+        has to tokenize the appended text. If the prefix alone already fills the
+        encoder window, the truncated input cannot change and the forward pass is
+        run here as well.
+        """
+        head, tail = self._special_token_wrapper()
+        token_budget = self.MAX_SEQ_LENGTH - len(head) - len(tail)
+        input_ids = self._tokenize(prefix_text, add_special_tokens=False, verbose=False)['input_ids']
+
+        prefix = {'text': prefix_text, 'input_ids': input_ids[:token_budget]}
+        if len(input_ids) >= token_budget:
+            prefix['embedding_native'] = self._encode(self._inputs_from_ids(input_ids[:token_budget]))
+        return prefix
+
+    def _embed_with_prefix(self, text: str, prefix: Dict[str, Any]) -> np.ndarray:
+        if 'embedding_native' in prefix:
+            return prefix['embedding_native']
+
+        head, tail = self._special_token_wrapper()
+        token_budget = self.MAX_SEQ_LENGTH - len(head) - len(tail)
+        with instrumentation.stage('tokenize', backend='opensource'):
+            delta_ids = self._tokenize(text[len(prefix['text']):], add_special_tokens=False, verbose=False)['input_ids']
+        input_ids = (prefix['input_ids'] + delta_ids)[:token_budget]
+        return self._encode(self._inputs_from_ids(input_ids))
+
+    def _tokenize(self, *args, **kwargs):
+        if self.tokenizer is None:
+            raise RuntimeError("This OpenSourceEmbeddings was created with load_encoder=False and cannot embed text")
+        with self._tokenizer_lock:
+            return self.tokenizer(*args, **kwargs)
+
+    def _special_token_wrapper(self) -> Tuple[List[int], List[int]]:
+        """Special token ids the tokenizer puts before and after a single sequence."""
+        if self._special_tokens is None:
+            probe = "hello"
+            with_special = self._tokenize(probe)['input_ids']
+            without = self._tokenize(probe, add_special_tokens=False)['input_ids']
+            for i in range(len(with_special) - len(without) + 1):
+                if with_special[i:i + len(without)] == without:
+                    self._special_tokens = (with_special[:i], with_special[i + len(without):])
+                    break
+            else:
+                self._special_tokens = ([], [])
+        return self._special_tokens
+
+    def _inputs_from_ids(self, input_ids: List[int]) -> Dict[str, torch.Tensor]:
+        head, tail = self._special_token_wrapper()
+        full_ids = head + input_ids + tail
+        return {
+            'input_ids': torch.tensor([full_ids], device=self.device),
+            'attention_mask': torch.ones((1, len(full_ids)), dtype=torch.long, device=self.device)
+        }
+
+    def get_embeddings_batch(self, texts: List[str], turn_numbers: List[int]) -> List[np.ndarray]:
+        """Embed many texts, grouping texts of similar length into encoder batches to limit padding."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
 
-        with torch.no_grad():
+        for start in range(0, len(order), self.EMBEDDING_BATCH_SIZE):
+            batch_indices = order[start:start + self.EMBEDDING_BATCH_SIZE]
+            with instrumentation.stage('tokenize', backend='opensource'):
+                inputs = self._tokenize(
+                    [texts[i] for i in batch_indices],
+                    padding=True, truncation=True, return_tensors='pt', max_length=self.MAX_SEQ_LENGTH
+                ).to(self.device)
+            for i, embedding_native in zip(batch_indices, self._encode_batch(inputs)):
+                embeddings[i] = self._fit_and_scale(embedding_native, turn_numbers[i])
+
+        return embeddings
+
+    def _encode(self, inputs) -> np.ndarray:
+        return self._encode_batch(inputs)[0]
+
+    def _encode_batch(self, inputs) -> np.ndarray:
+        with torch.inference_mode(), instrumentation.stage('encoder_forward', backend='opensource'):
             outputs = self.model(**inputs)
             embeddings = outputs.last_hidden_state
             attention_mask = inputs['attention_mask']
@@ -124,8 +294,9 @@ class OpenSourceEmbeddings:
             sum_mask = torch.clamp(input_mask_expanded.sum(1), min=1e-9)
             mean_embeddings = sum_embeddings / sum_mask
             normalized = torch.nn.functional.normalize(mean_embeddings, p=2, dim=1)
-            embedding_native = normalized.cpu().numpy()[0]
+            return normalized.cpu().numpy()
 
+    def _fit_and_scale(self, embedding_native: np.ndarray, turn_number: int) -> np.ndarray:
         if embedding_native.shape[0] == self.expected_dim:
             embedding = embedding_native
         elif embedding_native.shape[0] > self.expected_dim:
@@ -138,17 +309,17 @@ class OpenSourceEmbeddings:
         scaled_embedding = embedding * (0.6 + 0.4 * progress)
         return scaled_embedding.astype(np.float32)
 
-    def _get_comprehensive_metrics_from_llm(self, history: List[Dict[str, str]], turn_number: int) -> Tuple[Dict, bool]:
+    def _get_comprehensive_metrics_from_llm(self, texts: ConversationTexts, turn_number: int) -> Tuple[Dict, bool]:
         """Get all sophisticated metrics from LLM via comprehensive JSON analysis."""
         llm_successfully_used = False
         if not self.llm:
-            return self._get_fallback_metrics(history, turn_number), llm_successfully_used
+            return self._get_fallback_metrics(texts, turn_number), llm_successfully_used
         
-        conversation_text = "\n".join([f"{msg['speaker'].capitalize()}: {msg['message']}" for msg in history])
+        conversation_text = texts.prompt_transcript
         
         if not conversation_text.strip():
             logger.warning("Conversation history is empty for LLM comprehensive analysis. Using fallback.")
-            return self._get_fallback_metrics(history, turn_number), llm_successfully_used
+            return self._get_fallback_metrics(texts, turn_number), llm_successfully_used
 
         prompt = f"""Analyze the following sales conversation and provide a comprehensive analysis in JSON format.
 
@@ -179,33 +350,38 @@ Provide a detailed analysis covering ALL aspects below. Respond ONLY with valid
 CRITICAL: Respond with ONLY the JSON object. No explanations or additional text."""
 
         try:
-            llm_response = self.llm(
-                prompt,
-                max_tokens=450,
-                temperature=0.1,
-                stop=["\n\n", "```"],
-            )
+            with self._llm_lock:
+                with instrumentation.stage('llm_metrics', backend='opensource'):
+                    llm_response = self.llm(
+                        prompt,
+                        max_tokens=450,
+                        temperature=0.1,
+                        stop=["\n\n", "```"],
+                    )
+                instrumentation.record_llama_timings(self.llm, backend='opensource', call='metrics')
+            instrumentation.record_usage(llm_response.get('usage'), backend='opensource', call='metrics')
             raw_llm_output = llm_response['choices'][0]['text'].strip()
 
-            json_match = re.search(r"\{.*\}", raw_llm_output, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    parsed_json = json.loads(json_str)
-                    validated_metrics = self._validate_and_normalize_metrics(parsed_json)
-                    logger.info(f"Successfully parsed comprehensive LLM metrics with {len(validated_metrics)} fields")
-                    llm_successfully_used = True
-                    return validated_metrics, llm_successfully_used
+            with instrumentation.stage('json_parse', backend='opensource'):
+                json_match = re.search(r"\{.*\}", raw_llm_output, re.DOTALL)
+                if json_match:
+                    json_str = json_match.group(0)
+                    try:
+                        parsed_json = json.loads(json_str)
+                        validated_metrics = self._validate_and_normalize_metrics(parsed_json)
+                        logger.info(f"Successfully parsed comprehensive LLM metrics with {len(validated_metrics)} fields")
+                        llm_successfully_used = True
+                        return validated_metrics, llm_successfully_used
                     
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to decode JSON from LLM output: '{json_str}'. Error: {e}. Using fallback.")
-            else:
-                logger.warning(f"No JSON object found in LLM output: '{raw_llm_output}'. Using fallback.")
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Failed to decode JSON from LLM output: '{json_str}'. Error: {e}. Using fallback.")
+                else:
+                    logger.warning(f"No JSON object found in LLM output: '{raw_llm_output}'. Using fallback.")
         
         except Exception as e:
             logger.error(f"LLM comprehensive metrics analysis failed: {e}. Using fallback.", exc_info=True)
         
-        return self._get_fallback_metrics(history, turn_number), llm_successfully_used
+        return self._get_fallback_metrics(texts, turn_number), llm_successfully_used
 
     def _validate_and_normalize_metrics(self, parsed_json: Dict) -> Dict:
         """Validate and normalize the LLM-provided metrics."""
@@ -237,9 +413,14 @@ CRITICAL: Respond with ONLY the JSON object. No explanations or additional text.
         
         return validated
 
-    def _get_fallback_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict:
+    def _get_fallback_metrics(self, texts: ConversationTexts, turn_number: int) -> Dict:
         """Generate intelligent fallback metrics when LLM is not available or fails."""
-        customer_text = " ".join([msg['message'].lower() for msg in history if msg['speaker'] == 'customer'])
+        instrumentation.count('fallbacks', component='metrics', backend='opensource')
+        return self.heuristic_metrics(texts, turn_number)
+
+    def heuristic_metrics(self, texts: ConversationTexts, turn_number: int) -> Dict:
+        """Keyword-based base metrics, computed without any LLM call."""
+        signals = self.keyword_matcher.counts_for(texts)
 
         return {
             'customer_engagement': 0.5,
@@ -249,59 +430,43 @@ CRITICAL: Respond with ONLY the JSON object. No explanations or additional text.
             'communication_channel': 'email',
             'primary_customer_needs': ['efficiency', 'cost_reduction'],
             'engagement_trend': 0.5,
-            'objection_count': 0.4 if any(obj in customer_text for obj in ['expensive', 'costly', 'concern', 'budget', 'not interested', 'problem', 'issue']) else 0.1,
+            'objection_count': 0.4 if signals['objection'] else 0.1,
             'value_proposition_mentions': 0.4,
             'technical_depth': 0.3,
             'urgency_level': 0.2,
             'competitive_context': 0.1,
-            'pricing_sensitivity': 0.5 if any(kw in customer_text for kw in ['price', 'cost', 'budget', 'expensive']) else 0.2,
+            'pricing_sensitivity': 0.5 if signals['pricing'] else 0.2,
             'decision_authority_signals': 0.5
         }
 
-    def _generate_probability_trajectory(self, history: List[Dict[str, str]], base_metrics: Dict) -> Dict[int, float]:
-        """Generate realistic probability trajectory using comprehensive metrics."""
-        trajectory = {}
-        num_turns = len(history)
-        
-        if num_turns == 0:
-            return {0: 0.5}
-        
-        engagement = base_metrics.get('customer_engagement', 0.5)
-        effectiveness = base_metrics.get('sales_effectiveness', 0.5)
-        engagement_trend = base_metrics.get('engagement_trend', 0.5)
-        objection_level = base_metrics.get('objection_count', 0.3)
-        
-        current_prob = 0.15
-        
-        for i in range(num_turns):
-            turn_factor = 0.0
-            turn_factor += (engagement - 0.5) * 0.2
-            turn_factor += (effectiveness - 0.5) * 0.15
-            turn_factor -= objection_level * 0.25
-            
-            if engagement_trend > 0.7:
-                turn_factor += 0.05 * (i / max(1, num_turns -1))
-            elif engagement_trend < 0.3:
-                turn_factor -= 0.05 * (i / max(1, num_turns -1))
-
-            max_delta = 0.15 
-            delta = np.clip(turn_factor, -max_delta, max_delta)
-            
-            current_prob += delta
-            current_prob += random.uniform(-0.03, 0.03)
-            current_prob = np.clip(current_prob, 0.05, 0.95)
-            trajectory[i] = round(current_prob, 4)
-            
-            engagement = np.clip(engagement + (engagement_trend - 0.5) * 0.05, 0, 1)
-
-        return trajectory
+    def probability_trajectories(self, texts_list: List[ConversationTexts], metrics_list: List[Dict[str, Any]]) -> List[Dict[int, float]]:
+        """Heuristic probability trajectories for a batch of conversations, one vectorized pass."""
+        return probability_trajectory_dicts(
+            [texts.num_messages for texts in texts_list], metrics_list, [texts.full_text for texts in texts_list],
+            seed=self.trajectory_seed, start=0.15, noise_scale=0.03, engagement_drift=True
+        )
 
     def analyze_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict[str, Any]:
-        conversation_length = float(len(history))
+        return self.analyze_metrics_texts(ConversationTexts.from_history(history), turn_number)
+
+    def analyze_metrics_texts(
+        self,
+        texts: ConversationTexts,
+        turn_number: int,
+        compute_trajectory: Optional[bool] = None,
+        base_metrics: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        conversation_length = float(texts.num_messages)
         progress_metric = min(1.0, turn_number / self.MAX_TURNS_REFERENCE) if self.MAX_TURNS_REFERENCE > 0 else 0.0
         
-        base_metrics, llm_data_was_successfully_used = self._get_comprehensive_metrics_from_llm(history, turn_number)
-        probability_trajectory = self._generate_probability_trajectory(history, base_metrics)
+        if base_metrics is None:
+            base_metrics, llm_data_was_successfully_used = self._get_comprehensive_metrics_from_llm(texts, turn_number)
+        else:
+            llm_data_was_successfully_used = False
+        if self.compute_trajectory if compute_trajectory is None else compute_trajectory:
+            probability_trajectory = self.probability_trajectories([texts], [base_metrics])[0]
+        else:
+            probability_trajectory = None
         
         final_metrics = {
             'customer_engagement': base_metrics['customer_engagement'],
@@ -321,7 +486,8 @@ CRITICAL: Respond with ONLY the JSON object. No explanations or additional text.
             'urgency_level': base_metrics['urgency_level'],
             'competitive_context': base_metrics['competitive_context'],
             'pricing_sensitivity': base_metrics['pricing_sensitivity'],
-            'decision_authority_signals': base_metrics['decision_authority_signals']
+            'decision_authority_signals': base_metrics['decision_authority_signals'],
+            'metrics_source': base_metrics.get('metrics_source', 'llm' if llm_data_was_successfully_used else 'fallback')
         }
         
         logger.info(f"Comprehensive Metrics Analysis (LLM data successfully used: {llm_data_was_successfully_used}) - "
@@ -330,6 +496,27 @@ CRITICAL: Respond with ONLY the JSON object. No explanations or additional text.
         
         return final_metrics
 
+    def count_tokens(self, text: str) -> int:
+        """Prompt tokens of text for the loaded LLM (approximate when none is loaded)"""
+        if self.llm is None or not hasattr(self.llm, 'tokenize'):
+            return approximate_tokens(text)
+        return len(self.llm.tokenize(text.encode('utf-8'), add_bos=False))
+
+    def summarize_history(self, previous_summary: Optional[str], messages: List[Dict[str, str]], max_tokens: int) -> Optional[str]:
+        """Fold aged-out messages into the running conversation summary (None without an LLM)."""
+        if not self.llm:
+            return None
+        with self._llm_lock:
+            with instrumentation.stage('llm_summary', backend='opensource'):
+                llm_response = self.llm(
+                    summary_prompt(previous_summary, messages, max_tokens),
+                    max_tokens=max_tokens,
+                    temperature=0.1,
+                )
+            instrumentation.record_llama_timings(self.llm, backend='opensource', call='summary')
+        instrumentation.record_usage(llm_response.get('usage'), backend='opensource', call='summary')
+        return llm_response['choices'][0]['text'].strip()
+
     def generate_response(
         self,
         history: List[Dict[str, str]],
@@ -340,34 +527,102 @@ CRITICAL: Respond with ONLY the JSON object. No explanations or additional text.
             logger.warning("LLM not available for response generation. Returning canned response.")
             return "Thank you for your message. Could you provide more details?"
 
+        messages_for_llm = self._build_chat_messages(history, user_input, system_prompt)
+        
+        try:
+            with self._llm_lock:
+                with instrumentation.stage('llm_response', backend='opensource'):
+                    chat_completion = self.llm.create_chat_completion(
+                        messages=messages_for_llm,
+                        max_tokens=150,
+                        temperature=0.7,
+                        stop=["\nUser:", "\nCustomer:", "\n<|user|>", "\n<|end|>"] 
+                    )
+                instrumentation.record_llama_timings(self.llm, backend='opensource', call='response')
+            instrumentation.record_usage(chat_completion.get('usage'), backend='opensource', call='response')
+            generated_text = chat_completion['choices'][0]['message']['content'].strip()
+            logger.info(f"LLM generated response: {generated_text}")
+            return generated_text
+        except Exception as e:
+            logger.error(f"LLM response generation failed: {e}", exc_info=True)
+            return "I understand. Could you please provide more details about what you're looking for?"
+
+    def generate_response_stream(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream the generated response chunk by chunk as llama.cpp decodes it."""
+        if not self.llm:
+            logger.warning("LLM not available for response generation. Returning canned response.")
+            yield "Thank you for your message. Could you provide more details?"
+            return
+
+        messages_for_llm = self._build_chat_messages(history, user_input, system_prompt)
+
+        started = False
+        try:
+            # Held until the stream is exhausted or closed; other LLM calls wait for it
+            with self._llm_lock:
+                stream = self.llm.create_chat_completion(
+                    messages=messages_for_llm,
+                    max_tokens=150,
+                    temperature=0.7,
+                    stop=["\nUser:", "\nCustomer:", "\n<|user|>", "\n<|end|>"],
+                    stream=True
+                )
+                for chunk in stream:
+                    choices = chunk.get('choices') or []
+                    if not choices:
+                        continue
+                    text = choices[0].get('delta', {}).get('content')
+                    if not text:
+                        continue
+                    if not started:
+                        text = text.lstrip()
+                        if not text:
+                            continue
+                        started = True
+                    yield text
+                instrumentation.record_llama_timings(self.llm, backend='opensource', call='response_stream')
+        except Exception as e:
+            logger.error(f"LLM streaming response generation failed: {e}", exc_info=True)
+            if not started:
+                yield "I understand. Could you please provide more details about what you're looking for?"
+
+    def _build_chat_messages(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, str]]:
         messages_for_llm = []
         if system_prompt:
             messages_for_llm.append({"role": "system", "content": system_prompt})
 
         for msg in history:
+            if msg['speaker'] == SUMMARY_SPEAKER:
+                messages_for_llm.append({"role": "system", "content": f"Summary of the earlier conversation:\n{msg['message']}"})
+                continue
             role = "user" if msg['speaker'] == 'customer' else "assistant"
             messages_for_llm.append({"role": role, "content": msg['message']})
         
         messages_for_llm.append({"role": "user", "content": user_input})
-        
-        try:
-            chat_completion = self.llm.create_chat_completion(
-                messages=messages_for_llm,
-                max_tokens=150,
-                temperature=0.7,
-                stop=["\nUser:", "\nCustomer:", "\n<|user|>", "\n<|end|>"] 
-            )
-            generated_text = chat_completion['choices'][0]['message']['content'].strip()
-            logger.info(f"LLM generated response: {generated_text}")
-            return generated_text
-        except Exception as e:
-            logger.error(f"LLM response generation failed: {e}", exc_info=True)
-            return "I understand. Could you please provide more details about what you're looking for?"
+        return messages_for_llm
 
 
 class AzureEmbeddings:
     """Azure OpenAI embedding provider with full chat completion support."""
 
+    # Customer-message keywords behind the fallback metrics
+    keyword_matcher = KeywordMatcher({
+        'positive': ['buy', 'purchase', 'interested', 'yes', 'great', 'sounds good'],
+        'negative': ['expensive', 'costly', 'not interested', 'no', 'concern', 'problem'],
+        'objection': ['expensive', 'costly', 'concern', 'not interested'],
+        'pricing': ['price', 'cost', 'budget'],
+    })
+
     def __init__(
         self,
         api_key: str,
@@ -375,10 +630,12 @@ class AzureEmbeddings:
         embedding_deployment: str,
         chat_deployment: Optional[str] = None,
         api_version: str = "2024-10-21",
-        expected_dim: int = 1536
+        expected_dim: int = 1536,
+        rate_limiter: Optional[RateLimiter] = None,
+        http_pool: Optional[HTTPPool] = None,
+        trajectory_seed: Optional[int] = None,
+        compute_trajectory: bool = True
     ):
-        from openai import AzureOpenAI
-
         self.api_key = api_key
         self.endpoint = endpoint
         self.embedding_deployment = embedding_deployment
@@ -387,12 +644,13 @@ class AzureEmbeddings:
         self.expected_dim = expected_dim
         self.native_dim = 0
         self.MAX_TURNS_REFERENCE = 1000
+        self.EMBEDDING_BATCH_SIZE = 64
 
-        self.client = AzureOpenAI(
-            api_key=api_key,
-            azure_endpoint=endpoint,
-            api_version=api_version
-        )
+        self.trajectory_seed = trajectory_seed
+        self.compute_trajectory = compute_trajectory
+        self.rate_limiter = rate_limiter
+        self.http_pool = http_pool or shared_http_pool()
+        self.reconnect()
 
         # Test embedding connection
         try:
@@ -424,17 +682,72 @@ class AzureEmbeddings:
         else:
             logger.info("No chat deployment provided. LLM-powered metrics will be unavailable.")
 
+    def reconnect(self) -> None:
+        """(Re)create the API client on self.http_pool, e.g. in a forked worker after HTTPPool.reset_after_fork"""
+        from openai import AzureOpenAI
+
+        self._async_client = None
+        self.client = AzureOpenAI(
+            api_key=self.api_key,
+            azure_endpoint=self.endpoint,
+            api_version=self.api_version,
+            http_client=self.http_pool.client,
+            **({'max_retries': 0} if self.rate_limiter else {})
+        )
+        if self.rate_limiter:
+            self.client = RateLimitedClient(self.client, self.rate_limiter)
+
+    @property
+    def async_client(self):
+        """AsyncAzureOpenAI client on the provider's shared connection pool (not rate limited)"""
+        if self._async_client is None:
+            from openai import AsyncAzureOpenAI
+            self._async_client = AsyncAzureOpenAI(
+                api_key=self.api_key,
+                azure_endpoint=self.endpoint,
+                api_version=self.api_version,
+                http_client=self.http_pool.async_client
+            )
+        return self._async_client
+
     def get_embedding(self, text: str, turn_number: int) -> np.ndarray:
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.embedding_deployment
-            )
+            with instrumentation.stage('embedding_api', backend='azure'):
+                response = self.client.embeddings.create(
+                    input=text,
+                    model=self.embedding_deployment
+                )
+            instrumentation.record_usage(getattr(response, 'usage', None), backend='azure', call='embedding')
             embedding_native = np.array(response.data[0].embedding, dtype=np.float32)
         except Exception as e:
             logger.error(f"Azure embedding API call failed: {e}")
+            instrumentation.count('fallbacks', component='embedding', backend='azure')
             embedding_native = np.zeros(self.expected_dim, dtype=np.float32)
 
+        return self._fit_and_scale(embedding_native, turn_number)
+
+    def get_embeddings_batch(self, texts: List[str], turn_numbers: List[int]) -> List[np.ndarray]:
+        """Embed many texts with one embeddings request per EMBEDDING_BATCH_SIZE inputs."""
+        natives = []
+        for start in range(0, len(texts), self.EMBEDDING_BATCH_SIZE):
+            chunk = texts[start:start + self.EMBEDDING_BATCH_SIZE]
+            try:
+                with instrumentation.stage('embedding_api', backend='azure'):
+                    response = self.client.embeddings.create(
+                        input=chunk,
+                        model=self.embedding_deployment
+                    )
+                instrumentation.record_usage(getattr(response, 'usage', None), backend='azure', call='embedding')
+                for item in sorted(response.data, key=lambda d: d.index):
+                    natives.append(np.array(item.embedding, dtype=np.float32))
+            except Exception as e:
+                logger.error(f"Azure batch embedding API call failed: {e}")
+                instrumentation.count('fallbacks', len(chunk), component='embedding', backend='azure')
+                natives.extend(np.zeros(self.expected_dim, dtype=np.float32) for _ in chunk)
+
+        return [self._fit_and_scale(native, turn) for native, turn in zip(natives, turn_numbers)]
+
+    def _fit_and_scale(self, embedding_native: np.ndarray, turn_number: int) -> np.ndarray:
         if embedding_native.shape[0] == self.expected_dim:
             embedding = embedding_native
         elif embedding_native.shape[0] > self.expected_dim:
@@ -447,17 +760,17 @@ class AzureEmbeddings:
         scaled_embedding = embedding * (0.6 + 0.4 * progress)
         return scaled_embedding.astype(np.float32)
 
-    def _get_comprehensive_metrics_from_azure_llm(self, history: List[Dict[str, str]], turn_number: int) -> Tuple[Dict, bool]:
+    def _get_comprehensive_metrics_from_azure_llm(self, texts: ConversationTexts, turn_number: int) -> Tuple[Dict, bool]:
         """Get comprehensive metrics from Azure OpenAI chat completions."""
         azure_llm_successfully_used = False
         
         if not self.chat_available:
-            return self._get_fallback_metrics(history, turn_number), azure_llm_successfully_used
+            return self._get_fallback_metrics(texts, turn_number), azure_llm_successfully_used
         
-        conversation_text = "\n".join([f"{msg['speaker'].capitalize()}: {msg['message']}" for msg in history])
+        conversation_text = texts.prompt_transcript
         
         if not conversation_text.strip():
-            return self._get_fallback_metrics(history, turn_number), azure_llm_successfully_used
+            return self._get_fallback_metrics(texts, turn_number), azure_llm_successfully_used
 
         system_prompt = """You are an expert sales conversation analyst. Analyze conversations and provide detailed metrics in JSON format. Always respond with ONLY valid JSON containing the exact keys requested."""
         
@@ -469,37 +782,40 @@ CONVERSATION:
 Respond with ONLY the JSON object."""
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.chat_deployment,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.1
-            )
+            with instrumentation.stage('llm_metrics', backend='azure'):
+                response = self.client.chat.completions.create(
+                    model=self.chat_deployment,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=500,
+                    temperature=0.1
+                )
+            instrumentation.record_usage(getattr(response, 'usage', None), backend='azure', call='metrics')
             
             raw_azure_output = response.choices[0].message.content.strip()
 
-            json_match = re.search(r"\{.*\}", raw_azure_output, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    parsed_json = json.loads(json_str)
-                    validated_metrics = self._validate_and_normalize_metrics(parsed_json)
-                    logger.info(f"Successfully parsed comprehensive Azure LLM metrics")
-                    azure_llm_successfully_used = True
-                    return validated_metrics, azure_llm_successfully_used
+            with instrumentation.stage('json_parse', backend='azure'):
+                json_match = re.search(r"\{.*\}", raw_azure_output, re.DOTALL)
+                if json_match:
+                    json_str = json_match.group(0)
+                    try:
+                        parsed_json = json.loads(json_str)
+                        validated_metrics = self._validate_and_normalize_metrics(parsed_json)
+                        logger.info(f"Successfully parsed comprehensive Azure LLM metrics")
+                        azure_llm_successfully_used = True
+                        return validated_metrics, azure_llm_successfully_used
                     
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to decode JSON from Azure LLM output. Using fallback.")
-            else:
-                logger.warning(f"No JSON object found in Azure LLM output. Using fallback.")
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Failed to decode JSON from Azure LLM output. Using fallback.")
+                else:
+                    logger.warning(f"No JSON object found in Azure LLM output. Using fallback.")
         
         except Exception as e:
             logger.error(f"Azure LLM comprehensive metrics analysis failed: {e}. Using fallback.")
         
-        return self._get_fallback_metrics(history, turn_number), azure_llm_successfully_used
+        return self._get_fallback_metrics(texts, turn_number), azure_llm_successfully_used
 
     def _validate_and_normalize_metrics(self, parsed_json: Dict) -> Dict:
         """Validate and normalize the Azure LLM-provided metrics."""
@@ -531,16 +847,21 @@ Respond with ONLY the JSON object."""
         
         return validated
 
-    def _get_fallback_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict:
+    def _get_fallback_metrics(self, texts: ConversationTexts, turn_number: int) -> Dict:
         """Generate intelligent fallback metrics when Azure LLM is not available."""        
-        customer_text = " ".join([msg['message'].lower() for msg in history if msg['speaker'] == 'customer'])
+        instrumentation.count('fallbacks', component='metrics', backend='azure')
+        return self.heuristic_metrics(texts, turn_number)
+
+    def heuristic_metrics(self, texts: ConversationTexts, turn_number: int) -> Dict:
+        """Keyword-based base metrics, computed without any LLM call."""
+        signals = self.keyword_matcher.counts_for(texts)
         
         engagement = 0.5
         effectiveness = 0.5
         
-        if any(signal in customer_text for signal in ['buy', 'purchase', 'interested', 'yes', 'great', 'sounds good']):
+        if signals['positive']:
             engagement = 0.7
-        if any(obj in customer_text for obj in ['expensive', 'costly', 'not interested', 'no', 'concern', 'problem']):
+        if signals['negative']:
             engagement = 0.3
 
         return {
@@ -551,57 +872,43 @@ Respond with ONLY the JSON object."""
             'communication_channel': 'email',
             'primary_customer_needs': ['efficiency', 'cost_reduction'],
             'engagement_trend': 0.5,
-            'objection_count': 0.3 if any(obj in customer_text for obj in ['expensive', 'costly', 'concern', 'not interested']) else 0.1,
+            'objection_count': 0.3 if signals['objection'] else 0.1,
             'value_proposition_mentions': 0.3,
             'technical_depth': 0.4,
             'urgency_level': 0.2,
             'competitive_context': 0.1,
-            'pricing_sensitivity': 0.4 if any(kw in customer_text for kw in ['price', 'cost', 'budget']) else 0.2,
+            'pricing_sensitivity': 0.4 if signals['pricing'] else 0.2,
             'decision_authority_signals': 0.5
         }
 
-    def _generate_probability_trajectory(self, history: List[Dict[str, str]], base_metrics: Dict) -> Dict[int, float]:
-        """Generate realistic probability trajectory using Azure comprehensive metrics."""
-        trajectory = {}
-        num_turns = len(history)
-        
-        if num_turns == 0:
-            return {0: 0.5}
-        
-        engagement = base_metrics.get('customer_engagement', 0.5)
-        effectiveness = base_metrics.get('sales_effectiveness', 0.5)
-        engagement_trend = base_metrics.get('engagement_trend', 0.5)
-        objection_level = base_metrics.get('objection_count', 0.3)
-        
-        current_prob = 0.2
-        
-        for i in range(num_turns):
-            turn_factor = 0.0
-            turn_factor += (engagement - 0.5) * 0.2
-            turn_factor += (effectiveness - 0.5) * 0.15
-            turn_factor -= objection_level * 0.25
-            
-            if engagement_trend > 0.7:
-                turn_factor += 0.05 * (i / max(1, num_turns - 1))
-            elif engagement_trend < 0.3:
-                turn_factor -= 0.05 * (i / max(1, num_turns - 1))
-
-            max_delta = 0.15
-            delta = np.clip(turn_factor, -max_delta, max_delta)
-            
-            current_prob += delta
-            current_prob += random.uniform(-0.02, 0.02)
-            current_prob = np.clip(current_prob, 0.05, 0.95)
-            trajectory[i] = round(current_prob, 4)
-
-        return trajectory
+    def probability_trajectories(self, texts_list: List[ConversationTexts], metrics_list: List[Dict[str, Any]]) -> List[Dict[int, float]]:
+        """Heuristic probability trajectories for a batch of conversations, one vectorized pass."""
+        return probability_trajectory_dicts(
+            [texts.num_messages for texts in texts_list], metrics_list, [texts.full_text for texts in texts_list],
+            seed=self.trajectory_seed, start=0.2, noise_scale=0.02, engagement_drift=False
+        )
 
     def analyze_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict[str, Any]:
-        conversation_length = float(len(history))
+        return self.analyze_metrics_texts(ConversationTexts.from_history(history), turn_number)
+
+    def analyze_metrics_texts(
+        self,
+        texts: ConversationTexts,
+        turn_number: int,
+        compute_trajectory: Optional[bool] = None,
+        base_metrics: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        conversation_length = float(texts.num_messages)
         progress_metric = min(1.0, turn_number / self.MAX_TURNS_REFERENCE)
         
-        base_metrics, azure_llm_data_was_successfully_used = self._get_comprehensive_metrics_from_azure_llm(history, turn_number)
-        probability_trajectory = self._generate_probability_trajectory(history, base_metrics)
+        if base_metrics is None:
+            base_metrics, azure_llm_data_was_successfully_used = self._get_comprehensive_metrics_from_azure_llm(texts, turn_number)
+        else:
+            azure_llm_data_was_successfully_used = False
+        if self.compute_trajectory if compute_trajectory is None else compute_trajectory:
+            probability_trajectory = self.probability_trajectories([texts], [base_metrics])[0]
+        else:
+            probability_trajectory = None
         
         final_metrics = {
             'customer_engagement': base_metrics['customer_engagement'],
@@ -621,7 +928,8 @@ Respond with ONLY the JSON object."""
             'urgency_level': base_metrics['urgency_level'],
             'competitive_context': base_metrics['competitive_context'],
             'pricing_sensitivity': base_metrics['pricing_sensitivity'],
-            'decision_authority_signals': base_metrics['decision_authority_signals']
+            'decision_authority_signals': base_metrics['decision_authority_signals'],
+            'metrics_source': base_metrics.get('metrics_source', 'llm' if azure_llm_data_was_successfully_used else 'fallback')
         }
         
         backend_type = "Azure LLM" if azure_llm_data_was_successfully_used else "Azure Fallback"
@@ -630,6 +938,20 @@ Respond with ONLY the JSON object."""
         
         return final_metrics
 
+    def summarize_history(self, previous_summary: Optional[str], messages: List[Dict[str, str]], max_tokens: int) -> Optional[str]:
+        """Fold aged-out messages into the running conversation summary (None without chat completions)."""
+        if not self.chat_available:
+            return None
+        with instrumentation.stage('llm_summary', backend='azure'):
+            response = self.client.chat.completions.create(
+                model=self.chat_deployment,
+                messages=[{"role": "user", "content": summary_prompt(previous_summary, messages, max_tokens)}],
+                max_tokens=max_tokens,
+                temperature=0.1
+            )
+        instrumentation.record_usage(getattr(response, 'usage', None), backend='azure', call='summary')
+        return (response.choices[0].message.content or "").strip()
+
     def generate_response(
         self,
         history: List[Dict[str, str]],
@@ -640,6 +962,75 @@ Respond with ONLY the JSON object."""
             logger.warning("Azure chat completions not available. Returning enhanced canned response.")
             return "Thank you for your inquiry. I understand your interest and would be happy to help. Could you provide more details about your specific needs?"
 
+        messages = self._build_chat_messages(history, user_input, system_prompt)
+        
+        try:
+            with instrumentation.stage('llm_response', backend='azure'):
+                response = self.client.chat.completions.create(
+                    model=self.chat_deployment,
+                    messages=messages,
+                    max_tokens=200,
+                    temperature=0.7,
+                    top_p=0.9
+                )
+            instrumentation.record_usage(getattr(response, 'usage', None), backend='azure', call='response')
+            
+            generated_response = response.choices[0].message.content.strip()
+            logger.info(f"Azure OpenAI generated response: {generated_response}")
+            return generated_response
+            
+        except Exception as e:
+            logger.error(f"Azure chat completion failed: {e}")
+            return "I appreciate your message. Let me help you find the right solution. Could you tell me more about what you're looking for?"
+
+    def generate_response_stream(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream the generated response chunk by chunk using stream=True."""
+        if not self.chat_available:
+            logger.warning("Azure chat completions not available. Returning enhanced canned response.")
+            yield "Thank you for your inquiry. I understand your interest and would be happy to help. Could you provide more details about your specific needs?"
+            return
+
+        messages = self._build_chat_messages(history, user_input, system_prompt)
+
+        started = False
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.chat_deployment,
+                messages=messages,
+                max_tokens=200,
+                temperature=0.7,
+                top_p=0.9,
+                stream=True
+            )
+            for chunk in stream:
+                # Azure may send chunks without choices (e.g. content filter results)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not text:
+                    continue
+                if not started:
+                    text = text.lstrip()
+                    if not text:
+                        continue
+                    started = True
+                yield text
+        except Exception as e:
+            logger.error(f"Azure streaming chat completion failed: {e}")
+            if not started:
+                yield "I appreciate your message. Let me help you find the right solution. Could you tell me more about what you're looking for?"
+
+    def _build_chat_messages(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, str]]:
         messages = []
         
         if system_prompt:
@@ -649,49 +1040,53 @@ Respond with ONLY the JSON object."""
             messages.append({"role": "system", "content": default_system_prompt})
         
         for msg in history:
+            if msg['speaker'] == SUMMARY_SPEAKER:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{msg['message']}"})
+                continue
             role = "user" if msg['speaker'] == 'customer' else "assistant"
             messages.append({"role": role, "content": msg['message']})
         
         messages.append({"role": "user", "content": user_input})
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.chat_deployment,
-                messages=messages,
-                max_tokens=200,
-                temperature=0.7,
-                top_p=0.9
-            )
-            
-            generated_response = response.choices[0].message.content.strip()
-            logger.info(f"Azure OpenAI generated response: {generated_response}")
-            return generated_response
-            
-        except Exception as e:
-            logger.error(f"Azure chat completion failed: {e}")
-            return "I appreciate your message. Let me help you find the right solution. Could you tell me more about what you're looking for?"
+        return messages
 
 
 class OpenAIEmbeddings:
     """Standard OpenAI embedding provider with full chat completion support."""
 
+    # Customer-message keywords behind the fallback metrics
+    keyword_matcher = KeywordMatcher({
+        'positive': ['buy', 'purchase', 'interested', 'yes', 'great', 'sounds good'],
+        'negative': ['expensive', 'costly', 'not interested', 'no', 'concern', 'problem'],
+        'objection': ['expensive', 'costly', 'concern', 'not interested'],
+        'pricing': ['price', 'cost', 'budget'],
+    })
+
     def __init__(
         self,
         api_key: str,
         embedding_model: str = "text-embedding-3-large",
         chat_model: Optional[str] = None,
-        expected_dim: int = 3072
+        expected_dim: int = 3072,
+        base_url: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        http_pool: Optional[HTTPPool] = None,
+        trajectory_seed: Optional[int] = None,
+        compute_trajectory: bool = True
     ):
-        from openai import OpenAI
-
         self.api_key = api_key
+        self.base_url = base_url
         self.embedding_model = embedding_model
         self.chat_model = chat_model
         self.expected_dim = expected_dim
         self.native_dim = 0
         self.MAX_TURNS_REFERENCE = 1000
+        self.EMBEDDING_BATCH_SIZE = 64
 
-        self.client = OpenAI(api_key=api_key)
+        self.trajectory_seed = trajectory_seed
+        self.compute_trajectory = compute_trajectory
+        self.rate_limiter = rate_limiter
+        self.http_pool = http_pool or shared_http_pool()
+        self.reconnect()
 
         # Test embedding connection
         try:
@@ -723,17 +1118,70 @@ class OpenAIEmbeddings:
         else:
             logger.info("No chat model provided. LLM-powered metrics will be unavailable.")
 
+    def reconnect(self) -> None:
+        """(Re)create the API client on self.http_pool, e.g. in a forked worker after HTTPPool.reset_after_fork"""
+        from openai import OpenAI
+
+        self._async_client = None
+        self.client = OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=self.http_pool.client,
+            **({'max_retries': 0} if self.rate_limiter else {})
+        )
+        if self.rate_limiter:
+            self.client = RateLimitedClient(self.client, self.rate_limiter)
+
+    @property
+    def async_client(self):
+        """AsyncOpenAI client on the provider's shared connection pool (not rate limited)"""
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self.http_pool.async_client
+            )
+        return self._async_client
+
     def get_embedding(self, text: str, turn_number: int) -> np.ndarray:
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.embedding_model
-            )
+            with instrumentation.stage('embedding_api', backend='openai'):
+                response = self.client.embeddings.create(
+                    input=text,
+                    model=self.embedding_model
+                )
+            instrumentation.record_usage(getattr(response, 'usage', None), backend='openai', call='embedding')
             embedding_native = np.array(response.data[0].embedding, dtype=np.float32)
         except Exception as e:
             logger.error(f"OpenAI embedding API call failed: {e}")
+            instrumentation.count('fallbacks', component='embedding', backend='openai')
             embedding_native = np.zeros(self.expected_dim, dtype=np.float32)
 
+        return self._fit_and_scale(embedding_native, turn_number)
+
+    def get_embeddings_batch(self, texts: List[str], turn_numbers: List[int]) -> List[np.ndarray]:
+        """Embed many texts with one embeddings request per EMBEDDING_BATCH_SIZE inputs."""
+        natives = []
+        for start in range(0, len(texts), self.EMBEDDING_BATCH_SIZE):
+            chunk = texts[start:start + self.EMBEDDING_BATCH_SIZE]
+            try:
+                with instrumentation.stage('embedding_api', backend='openai'):
+                    response = self.client.embeddings.create(
+                        input=chunk,
+                        model=self.embedding_model
+                    )
+                instrumentation.record_usage(getattr(response, 'usage', None), backend='openai', call='embedding')
+                for item in sorted(response.data, key=lambda d: d.index):
+                    natives.append(np.array(item.embedding, dtype=np.float32))
+            except Exception as e:
+                logger.error(f"OpenAI batch embedding API call failed: {e}")
+                instrumentation.count('fallbacks', len(chunk), component='embedding', backend='openai')
+                natives.extend(np.zeros(self.expected_dim, dtype=np.float32) for _ in chunk)
+
+        return [self._fit_and_scale(native, turn) for native, turn in zip(natives, turn_numbers)]
+
+    def _fit_and_scale(self, embedding_native: np.ndarray, turn_number: int) -> np.ndarray:
         if embedding_native.shape[0] == self.expected_dim:
             embedding = embedding_native
         elif embedding_native.shape[0] > self.expected_dim:
@@ -746,17 +1194,17 @@ class OpenAIEmbeddings:
         scaled_embedding = embedding * (0.6 + 0.4 * progress)
         return scaled_embedding.astype(np.float32)
 
-    def _get_comprehensive_metrics_from_openai_llm(self, history: List[Dict[str, str]], turn_number: int) -> Tuple[Dict, bool]:
+    def _get_comprehensive_metrics_from_openai_llm(self, texts: ConversationTexts, turn_number: int) -> Tuple[Dict, bool]:
         """Get comprehensive metrics from OpenAI chat completions."""
         openai_llm_successfully_used = False
         
         if not self.chat_available:
-            return self._get_fallback_metrics(history, turn_number), openai_llm_successfully_used
+            return self._get_fallback_metrics(texts, turn_number), openai_llm_successfully_used
         
-        conversation_text = "\n".join([f"{msg['speaker'].capitalize()}: {msg['message']}" for msg in history])
+        conversation_text = texts.prompt_transcript
         
         if not conversation_text.strip():
-            return self._get_fallback_metrics(history, turn_number), openai_llm_successfully_used
+            return self._get_fallback_metrics(texts, turn_number), openai_llm_successfully_used
 
         system_prompt = """You are an expert sales conversation analyst. Analyze conversations and provide detailed metrics in JSON format. Always respond with ONLY valid JSON containing the exact keys requested."""
         
@@ -768,37 +1216,40 @@ CONVERSATION:
 Respond with ONLY the JSON object."""
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.1
-            )
+            with instrumentation.stage('llm_metrics', backend='openai'):
+                response = self.client.chat.completions.create(
+                    model=self.chat_model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=500,
+                    temperature=0.1
+                )
+            instrumentation.record_usage(getattr(response, 'usage', None), backend='openai', call='metrics')
             
             raw_openai_output = response.choices[0].message.content.strip()
 
-            json_match = re.search(r"\{.*\}", raw_openai_output, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    parsed_json = json.loads(json_str)
-                    validated_metrics = self._validate_and_normalize_metrics(parsed_json)
-                    logger.info(f"Successfully parsed comprehensive OpenAI LLM metrics")
-                    openai_llm_successfully_used = True
-                    return validated_metrics, openai_llm_successfully_used
+            with instrumentation.stage('json_parse', backend='openai'):
+                json_match = re.search(r"\{.*\}", raw_openai_output, re.DOTALL)
+                if json_match:
+                    json_str = json_match.group(0)
+                    try:
+                        parsed_json = json.loads(json_str)
+                        validated_metrics = self._validate_and_normalize_metrics(parsed_json)
+                        logger.info(f"Successfully parsed comprehensive OpenAI LLM metrics")
+                        openai_llm_successfully_used = True
+                        return validated_metrics, openai_llm_successfully_used
                     
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to decode JSON from OpenAI LLM output. Using fallback.")
-            else:
-                logger.warning(f"No JSON object found in OpenAI LLM output. Using fallback.")
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Failed to decode JSON from OpenAI LLM output. Using fallback.")
+                else:
+                    logger.warning(f"No JSON object found in OpenAI LLM output. Using fallback.")
         
         except Exception as e:
             logger.error(f"OpenAI LLM comprehensive metrics analysis failed: {e}. Using fallback.")
         
-        return self._get_fallback_metrics(history, turn_number), openai_llm_successfully_used
+        return self._get_fallback_metrics(texts, turn_number), openai_llm_successfully_used
 
     def _validate_and_normalize_metrics(self, parsed_json: Dict) -> Dict:
         """Validate and normalize the OpenAI LLM-provided metrics."""
@@ -830,16 +1281,21 @@ Respond with ONLY the JSON object."""
         
         return validated
 
-    def _get_fallback_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict:
+    def _get_fallback_metrics(self, texts: ConversationTexts, turn_number: int) -> Dict:
         """Generate intelligent fallback metrics when OpenAI LLM is not available."""        
-        customer_text = " ".join([msg['message'].lower() for msg in history if msg['speaker'] == 'customer'])
+        instrumentation.count('fallbacks', component='metrics', backend='openai')
+        return self.heuristic_metrics(texts, turn_number)
+
+    def heuristic_metrics(self, texts: ConversationTexts, turn_number: int) -> Dict:
+        """Keyword-based base metrics, computed without any LLM call."""
+        signals = self.keyword_matcher.counts_for(texts)
         
         engagement = 0.5
         effectiveness = 0.5
         
-        if any(signal in customer_text for signal in ['buy', 'purchase', 'interested', 'yes', 'great', 'sounds good']):
+        if signals['positive']:
             engagement = 0.7
-        if any(obj in customer_text for obj in ['expensive', 'costly', 'not interested', 'no', 'concern', 'problem']):
+        if signals['negative']:
             engagement = 0.3
 
         return {
@@ -850,57 +1306,43 @@ Respond with ONLY the JSON object."""
             'communication_channel': 'email',
             'primary_customer_needs': ['efficiency', 'cost_reduction'],
             'engagement_trend': 0.5,
-            'objection_count': 0.3 if any(obj in customer_text for obj in ['expensive', 'costly', 'concern', 'not interested']) else 0.1,
+            'objection_count': 0.3 if signals['objection'] else 0.1,
             'value_proposition_mentions': 0.3,
             'technical_depth': 0.4,
             'urgency_level': 0.2,
             'competitive_context': 0.1,
-            'pricing_sensitivity': 0.4 if any(kw in customer_text for kw in ['price', 'cost', 'budget']) else 0.2,
+            'pricing_sensitivity': 0.4 if signals['pricing'] else 0.2,
             'decision_authority_signals': 0.5
         }
 
-    def _generate_probability_trajectory(self, history: List[Dict[str, str]], base_metrics: Dict) -> Dict[int, float]:
-        """Generate realistic probability trajectory using OpenAI comprehensive metrics."""
-        trajectory = {}
-        num_turns = len(history)
-        
-        if num_turns == 0:
-            return {0: 0.5}
-        
-        engagement = base_metrics.get('customer_engagement', 0.5)
-        effectiveness = base_metrics.get('sales_effectiveness', 0.5)
-        engagement_trend = base_metrics.get('engagement_trend', 0.5)
-        objection_level = base_metrics.get('objection_count', 0.3)
-        
-        current_prob = 0.25  # Slightly higher starting point for OpenAI
-        
-        for i in range(num_turns):
-            turn_factor = 0.0
-            turn_factor += (engagement - 0.5) * 0.2
-            turn_factor += (effectiveness - 0.5) * 0.15
-            turn_factor -= objection_level * 0.25
-            
-            if engagement_trend > 0.7:
-                turn_factor += 0.05 * (i / max(1, num_turns - 1))
-            elif engagement_trend < 0.3:
-                turn_factor -= 0.05 * (i / max(1, num_turns - 1))
-
-            max_delta = 0.15
-            delta = np.clip(turn_factor, -max_delta, max_delta)
-            
-            current_prob += delta
-            current_prob += random.uniform(-0.02, 0.02)
-            current_prob = np.clip(current_prob, 0.05, 0.95)
-            trajectory[i] = round(current_prob, 4)
-
-        return trajectory
+    def probability_trajectories(self, texts_list: List[ConversationTexts], metrics_list: List[Dict[str, Any]]) -> List[Dict[int, float]]:
+        """Heuristic probability trajectories for a batch of conversations, one vectorized pass."""
+        return probability_trajectory_dicts(
+            [texts.num_messages for texts in texts_list], metrics_list, [texts.full_text for texts in texts_list],
+            seed=self.trajectory_seed, start=0.25, noise_scale=0.02, engagement_drift=False
+        )
 
     def analyze_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict[str, Any]:
-        conversation_length = float(len(history))
+        return self.analyze_metrics_texts(ConversationTexts.from_history(history), turn_number)
+
+    def analyze_metrics_texts(
+        self,
+        texts: ConversationTexts,
+        turn_number: int,
+        compute_trajectory: Optional[bool] = None,
+        base_metrics: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        conversation_length = float(texts.num_messages)
         progress_metric = min(1.0, turn_number / self.MAX_TURNS_REFERENCE)
         
-        base_metrics, openai_llm_data_was_successfully_used = self._get_comprehensive_metrics_from_openai_llm(history, turn_number)
-        probability_trajectory = self._generate_probability_trajectory(history, base_metrics)
+        if base_metrics is None:
+            base_metrics, openai_llm_data_was_successfully_used = self._get_comprehensive_metrics_from_openai_llm(texts, turn_number)
+        else:
+            openai_llm_data_was_successfully_used = False
+        if self.compute_trajectory if compute_trajectory is None else compute_trajectory:
+            probability_trajectory = self.probability_trajectories([texts], [base_metrics])[0]
+        else:
+            probability_trajectory = None
         
         final_metrics = {
             'customer_engagement': base_metrics['customer_engagement'],
@@ -920,7 +1362,8 @@ Respond with ONLY the JSON object."""
             'urgency_level': base_metrics['urgency_level'],
             'competitive_context': base_metrics['competitive_context'],
             'pricing_sensitivity': base_metrics['pricing_sensitivity'],
-            'decision_authority_signals': base_metrics['decision_authority_signals']
+            'decision_authority_signals': base_metrics['decision_authority_signals'],
+            'metrics_source': base_metrics.get('metrics_source', 'llm' if openai_llm_data_was_successfully_used else 'fallback')
         }
         
         backend_type = "OpenAI LLM" if openai_llm_data_was_successfully_used else "OpenAI Fallback"
@@ -929,6 +1372,20 @@ Respond with ONLY the JSON object."""
         
         return final_metrics
 
+    def summarize_history(self, previous_summary: Optional[str], messages: List[Dict[str, str]], max_tokens: int) -> Optional[str]:
+        """Fold aged-out messages into the running conversation summary (None without chat completions)."""
+        if not self.chat_available:
+            return None
+        with instrumentation.stage('llm_summary', backend='openai'):
+            response = self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=[{"role": "user", "content": summary_prompt(previous_summary, messages, max_tokens)}],
+                max_tokens=max_tokens,
+                temperature=0.1
+            )
+        instrumentation.record_usage(getattr(response, 'usage', None), backend='openai', call='summary')
+        return (response.choices[0].message.content or "").strip()
+
     def generate_response(
         self,
         history: List[Dict[str, str]],
@@ -939,6 +1396,75 @@ Respond with ONLY the JSON object."""
             logger.warning("OpenAI chat completions not available. Returning enhanced canned response.")
             return "Thank you for your inquiry. I understand your interest and would be happy to help. Could you provide more details about your specific needs?"
 
+        messages = self._build_chat_messages(history, user_input, system_prompt)
+        
+        try:
+            with instrumentation.stage('llm_response', backend='openai'):
+                response = self.client.chat.completions.create(
+                    model=self.chat_model,
+                    messages=messages,
+                    max_tokens=200,
+                    temperature=0.7,
+                    top_p=0.9
+                )
+            instrumentation.record_usage(getattr(response, 'usage', None), backend='openai', call='response')
+            
+            generated_response = response.choices[0].message.content.strip()
+            logger.info(f"OpenAI generated response: {generated_response}")
+            return generated_response
+            
+        except Exception as e:
+            logger.error(f"OpenAI chat completion failed: {e}")
+            return "I appreciate your message. Let me help you find the right solution. Could you tell me more about what you're looking for?"
+
+    def generate_response_stream(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream the generated response chunk by chunk using stream=True."""
+        if not self.chat_available:
+            logger.warning("OpenAI chat completions not available. Returning enhanced canned response.")
+            yield "Thank you for your inquiry. I understand your interest and would be happy to help. Could you provide more details about your specific needs?"
+            return
+
+        messages = self._build_chat_messages(history, user_input, system_prompt)
+
+        started = False
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                max_tokens=200,
+                temperature=0.7,
+                top_p=0.9,
+                stream=True
+            )
+            for chunk in stream:
+                # OpenAI may send chunks without choices (e.g. content filter results)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not text:
+                    continue
+                if not started:
+                    text = text.lstrip()
+                    if not text:
+                        continue
+                    started = True
+                yield text
+        except Exception as e:
+            logger.error(f"OpenAI streaming chat completion failed: {e}")
+            if not started:
+                yield "I appreciate your message. Let me help you find the right solution. Could you tell me more about what you're looking for?"
+
+    def _build_chat_messages(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, str]]:
         messages = []
         
         if system_prompt:
@@ -948,24 +1474,11 @@ Respond with ONLY the JSON object."""
             messages.append({"role": "system", "content": default_system_prompt})
         
         for msg in history:
+            if msg['speaker'] == SUMMARY_SPEAKER:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{msg['message']}"})
+                continue
             role = "user" if msg['speaker'] == 'customer' else "assistant"
             messages.append({"role": role, "content": msg['message']})
         
         messages.append({"role": "user", "content": user_input})
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=messages,
-                max_tokens=200,
-                temperature=0.7,
-                top_p=0.9
-            )
-            
-            generated_response = response.choices[0].message.content.strip()
-            logger.info(f"OpenAI generated response: {generated_response}")
-            return generated_response
-            
-        except Exception as e:
-            logger.error(f"OpenAI chat completion failed: {e}")
-            return "I appreciate your message. Let me help you find the right solution. Could you tell me more about what you're looking for?"
\ No newline at end of file
+        return messages
@@ -0,0 +1,196 @@
+"""Preload-then-fork serving: load models once, share them copy-on-write with forked workers"""
+
+import bisect
+import gc
+import itertools
+import logging
+import multiprocessing
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from .resources import CPUPlan
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_for_fork(predictor) -> Dict[str, Any]:
+    """
+    Put a SalesPredictor's torch models (encoder, PPO policy, metrics head) into an
+    inference-only state whose weights forked workers share instead of copying:
+
+    - eval mode with requires_grad off, so no gradient state is ever allocated;
+    - weights already memory-mapped from a file (safetensors loaded by transformers)
+      stay in the page cache, shared by every process that maps them;
+    - all other weights are moved to shared memory (share_memory_), so no write in
+      any process can turn them into private copies;
+    - the garbage collector is frozen (gc.freeze), so collections in the workers do
+      not write to the header of every object inherited from the parent.
+
+    GGUF models are memory-mapped by llama.cpp and shared without any preparation.
+    Keep-alive API connections of remote providers are closed, so no socket is
+    inherited by the workers (fork_pool(predictor=...) gives each worker its own).
+    Call this after loading and before forking; returns how much was shared.
+    """
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        raise RuntimeError("Forked workers cannot use CUDA initialized in the parent; run the workers on CPU")
+
+    mappings = _file_mappings()
+    mapped = shared = 0
+    seen = set()
+    for module in _torch_modules(predictor):
+        module.eval()
+        module.requires_grad_(False)
+        for tensor in itertools.chain(module.parameters(), module.buffers()):
+            storage = tensor.untyped_storage()
+            if storage.data_ptr() in seen or storage.nbytes() == 0:
+                continue
+            seen.add(storage.data_ptr())
+            if _is_file_backed(storage.data_ptr(), mappings):
+                mapped += storage.nbytes()
+                continue
+            nbytes = storage.nbytes()
+            tensor.share_memory_()
+            seen.add(tensor.untyped_storage().data_ptr())
+            shared += nbytes
+
+    # Stop threads that would be forked mid-flight; they are recreated on demand
+    with predictor._prefix_executor_lock:
+        executors = [predictor._prefix_executor, predictor._metrics_executor]
+        predictor._prefix_executor = predictor._metrics_executor = None
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    providers = _remote_providers(predictor)
+    for pool in {id(provider.http_pool): provider.http_pool for provider in providers}.values():
+        pool.close()
+    for provider in providers:
+        provider.reconnect()
+
+    gc.collect()
+    gc.freeze()
+    summary = {'mapped_mb': round(mapped / 2**20, 1), 'shared_mb': round(shared / 2**20, 1)}
+    logger.info(f"Prepared models for fork: {summary['mapped_mb']} MB memory-mapped, {summary['shared_mb']} MB in shared memory")
+    return summary
+
+
+def fork_pool(
+    workers: int,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple = (),
+    torch_threads: Optional[int] = None,
+    cpu_plan: Optional[CPUPlan] = None,
+    predictor=None
+):
+    """
+    multiprocessing.Pool of forked workers that inherit everything loaded in the
+    parent. With a cpu_plan (SalesPredictor.cpu_plan) each worker applies its share
+    of the plan, including core pinning; otherwise each gets torch_threads intra-op
+    threads (default: the CPUs divided among the workers) so they do not
+    oversubscribe the host. With the predictor the workers use, each worker opens its
+    own API connections and keeps 1/workers of every RateLimiter's quota.
+    """
+    if torch_threads is None:
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context("fork")
+    counter = context.Value('i', 0)
+    return context.Pool(
+        workers, initializer=_init_worker,
+        initargs=(torch_threads, cpu_plan, counter, predictor, workers, initializer, initargs)
+    )
+
+
+def _init_worker(
+    torch_threads: int,
+    cpu_plan: Optional[CPUPlan],
+    counter,
+    predictor,
+    workers: int,
+    initializer: Optional[Callable[..., None]],
+    initargs: Tuple
+) -> None:
+    if predictor is not None:
+        providers = _remote_providers(predictor)
+        for pool in {id(provider.http_pool): provider.http_pool for provider in providers}.values():
+            pool.reset_after_fork()
+        for limiter in {id(provider.rate_limiter): provider.rate_limiter for provider in providers
+                        if provider.rate_limiter is not None}.values():
+            limiter.split(workers)
+        for provider in providers:
+            provider.reconnect()
+    if cpu_plan is not None:
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        cpu_plan.apply(index)
+    else:
+        torch.set_num_threads(torch_threads)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def process_memory(pid: Optional[int] = None) -> Optional[Dict[str, float]]:
+    """
+    Memory of a process in MB from /proc/<pid>/smaps_rollup (Linux only, else None):
+    rss, pss (shared pages split between their users), uss (pages only this process
+    uses, i.e. what it costs on top of the others) and shared.
+    """
+    path = f"/proc/{pid or os.getpid()}/smaps_rollup"
+    try:
+        with open(path) as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss_mb': round(fields.get('Rss', 0.0), 1),
+        'pss_mb': round(fields.get('Pss', 0.0), 1),
+        'uss_mb': round(fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0), 1),
+        'shared_mb': round(fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0), 1),
+    }
+
+
+def _remote_providers(predictor) -> List[Any]:
+    """OpenAI/Azure providers behind a predictor, including the stages of a HybridProvider"""
+    from .hybrid import HybridProvider
+
+    provider = predictor.embedding_provider
+    candidates = [provider]
+    if isinstance(provider, HybridProvider):
+        candidates = [provider.embedding_provider, provider.metrics_provider, provider.response_provider]
+    unique = {id(candidate): candidate for candidate in candidates}
+    return [candidate for candidate in unique.values() if hasattr(candidate, 'reconnect')]
+
+
+def _torch_modules(predictor) -> List[torch.nn.Module]:
+    candidates = [
+        getattr(predictor.embedding_provider, 'model', None),
+        getattr(getattr(predictor, 'model', None), 'policy', None),
+        getattr(predictor, 'metrics_head', None),
+    ]
+    return [module for module in candidates if isinstance(module, torch.nn.Module)]
+
+
+def _file_mappings() -> List[Tuple[int, int]]:
+    """Sorted (start, end) address ranges of file-backed mappings of this process"""
+    ranges = []
+    try:
+        with open("/proc/self/maps") as f:
+            for line in f:
+                parts = line.split(maxsplit=5)
+                if len(parts) == 6 and parts[5].startswith('/') and not parts[5].startswith(('/dev/', '/memfd:')):
+                    start, end = parts[0].split('-')
+                    ranges.append((int(start, 16), int(end, 16)))
+    except OSError:
+        pass
+    return sorted(ranges)
+
+
+def _is_file_backed(address: int, mappings: List[Tuple[int, int]]) -> bool:
+    i = bisect.bisect_right(mappings, (address, float('inf'))) - 1
+    return i >= 0 and mappings[i][0] <= address < mappings[i][1]
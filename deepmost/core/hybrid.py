@@ -0,0 +1,119 @@
+"""Composition of separate embedding, metrics and response providers"""
+
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .utils import ConversationTexts
+
+STAGES = ('embedding', 'metrics', 'response')
+
+# Optional provider capabilities, looked up with hasattr/getattr by SalesPredictor
+_EMBEDDING_ATTRIBUTES = {'get_embeddings_batch', 'prepare_embedding_prefix', 'native_dim', 'expected_dim', 'tokenizer', 'model'}
+_METRICS_ATTRIBUTES = {
+    'keyword_matcher', 'compute_trajectory', 'trajectory_seed', 'probability_trajectories', 'heuristic_metrics', 'chat_available'
+}
+# count_tokens / summarize_history depend on the stage being compacted: see compaction_functions
+_RESPONSE_ATTRIBUTES = {'llm'}
+
+
+class HybridProvider:
+    """
+    EmbeddingProvider routing each stage to its own provider, e.g. local bge-m3
+    embeddings with a remote chat model for metrics and responses:
+
+        HybridProvider(embedding=OpenSourceEmbeddings(...), metrics=openai, response=openai,
+                       concurrency={'metrics': 4})
+
+    concurrency caps the number of calls in flight per stage (None = unlimited), so a
+    slow or rate-limited source cannot be flooded by threads serving the others.
+    Stages sharing one provider instance still get separate limits.
+    """
+
+    def __init__(
+        self,
+        embedding: Any,
+        metrics: Any,
+        response: Any,
+        concurrency: Optional[Dict[str, int]] = None
+    ):
+        self.embedding_provider = embedding
+        self.metrics_provider = metrics
+        self.response_provider = response
+        concurrency = concurrency or {}
+        unknown = set(concurrency) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages in concurrency: {sorted(unknown)} (expected {STAGES})")
+        self._limits = {
+            stage: threading.BoundedSemaphore(concurrency[stage]) if concurrency.get(stage) else None
+            for stage in STAGES
+        }
+        self.concurrency = {stage: concurrency.get(stage) for stage in STAGES}
+
+    def _slot(self, stage: str):
+        limit = self._limits[stage]
+        return limit if limit is not None else nullcontext()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes not defined on HybridProvider itself
+        if name.startswith('__') or name in ('embedding_provider', 'metrics_provider', 'response_provider', '_limits'):
+            raise AttributeError(name)
+        if name in _EMBEDDING_ATTRIBUTES:
+            source = self.embedding_provider
+        elif name in _METRICS_ATTRIBUTES:
+            source = self.metrics_provider
+        elif name in _RESPONSE_ATTRIBUTES:
+            source = self.response_provider
+        else:
+            raise AttributeError(f"{type(self).__name__} has no attribute {name!r}")
+
+        value = getattr(source, name)
+        if name in ('get_embeddings_batch', 'prepare_embedding_prefix'):
+            return self._limited('embedding', value)
+        return value
+
+    def compaction_functions(self, stage: str) -> Tuple[Optional[Callable[[str], int]], Optional[Callable[..., Optional[str]]]]:
+        """
+        (count_tokens, summarize_history) of the provider serving stage, for compacting
+        the history of that stage's prompts; either is None if the provider lacks it
+        """
+        source = {'embedding': self.embedding_provider, 'metrics': self.metrics_provider, 'response': self.response_provider}[stage]
+        summarize = getattr(source, 'summarize_history', None)
+        return getattr(source, 'count_tokens', None), self._limited(stage, summarize) if summarize is not None else None
+
+    def _limited(self, stage: str, method):
+        def call(*args, **kwargs):
+            with self._slot(stage):
+                return method(*args, **kwargs)
+        return call
+
+    def get_embedding(self, text: str, turn_number: int, **kwargs) -> np.ndarray:
+        with self._slot('embedding'):
+            return self.embedding_provider.get_embedding(text, turn_number, **kwargs)
+
+    def analyze_metrics(self, history: List[Dict[str, str]], turn_number: int) -> Dict[str, Any]:
+        return self.analyze_metrics_texts(ConversationTexts.from_history(history), turn_number)
+
+    def analyze_metrics_texts(self, texts: ConversationTexts, turn_number: int, **kwargs) -> Dict[str, Any]:
+        with self._slot('metrics'):
+            return self.metrics_provider.analyze_metrics_texts(texts, turn_number, **kwargs)
+
+    def generate_response(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> str:
+        with self._slot('response'):
+            return self.response_provider.generate_response(history, user_input, system_prompt)
+
+    def generate_response_stream(
+        self,
+        history: List[Dict[str, str]],
+        user_input: str,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[str]:
+        with self._slot('response'):
+            yield from self.response_provider.generate_response_stream(history, user_input, system_prompt)
@@ -0,0 +1,255 @@
+"""Per-stage latency and counter instrumentation with pluggable subscribers"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Event(NamedTuple):
+    """A timer ('timer', seconds) or counter ('counter', increment) sample"""
+    kind: str
+    name: str
+    value: float
+    labels: Dict[str, str]
+
+
+Subscriber = Callable[[Event], None]
+
+# Replaced (never mutated) on subscribe/unsubscribe so emitters can iterate without locking
+_subscribers: Tuple[Subscriber, ...] = ()
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(callback: Subscriber) -> Subscriber:
+    """Register callback(event) for every timer and counter event; returns the callback"""
+    global _subscribers
+    with _subscribers_lock:
+        _subscribers = _subscribers + (callback,)
+    return callback
+
+
+def unsubscribe(callback: Subscriber) -> None:
+    global _subscribers
+    with _subscribers_lock:
+        _subscribers = tuple(s for s in _subscribers if s is not callback)
+
+
+def enabled() -> bool:
+    """True when at least one subscriber is registered"""
+    return bool(_subscribers)
+
+
+def _emit(event: Event) -> None:
+    for callback in _subscribers:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.warning(f"Instrumentation subscriber {callback!r} failed: {e}")
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _emit(Event('timer', self.name, time.perf_counter() - self.start, self.labels))
+        return False
+
+
+def stage(name: str, **labels: str):
+    """
+    Context manager timing a pipeline stage. Returns a shared no-op object when
+    nobody is subscribed, so instrumented code pays one tuple truth test.
+
+        with instrumentation.stage('encoder_forward', backend='opensource'):
+            outputs = model(**inputs)
+    """
+    if not _subscribers:
+        return _NULL_STAGE
+    return _Stage(name, labels)
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    """Record a duration measured elsewhere (e.g. llama.cpp's own timings)"""
+    if _subscribers:
+        _emit(Event('timer', name, seconds, labels))
+
+
+def count(name: str, value: float = 1.0, **labels: str) -> None:
+    """Increment counter `name` by value"""
+    if _subscribers:
+        _emit(Event('counter', name, value, labels))
+
+
+def record_llama_timings(llm, **labels: str) -> None:
+    """
+    Split the last llama.cpp call into prompt evaluation and decode time using the
+    context's perf counters, then reset them. Silently does nothing if the installed
+    llama-cpp-python does not expose them.
+    """
+    if not _subscribers or llm is None:
+        return
+    try:
+        import llama_cpp
+        ctx = llm._ctx.ctx
+        perf = llama_cpp.llama_perf_context(ctx)
+        llama_cpp.llama_perf_context_reset(ctx)
+    except Exception:
+        return
+    observe('llm_prompt_eval', perf.t_p_eval_ms / 1000.0, **labels)
+    observe('llm_decode', perf.t_eval_ms / 1000.0, **labels)
+
+
+def record_usage(usage, **labels: str) -> None:
+    """Count prompt/completion tokens from an OpenAI-style usage object or dict"""
+    if not _subscribers or usage is None:
+        return
+    get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+    if get('prompt_tokens'):
+        count('llm_tokens_in', get('prompt_tokens'), **labels)
+    if get('completion_tokens'):
+        count('llm_tokens_out', get('completion_tokens'), **labels)
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class PrometheusExporter:
+    """
+    Subscriber aggregating events into Prometheus metrics: stage timers become the
+    `<namespace>_stage_seconds` histogram (label `stage`), counters become
+    `<namespace>_<name>_total`.
+
+    Example:
+        exporter = PrometheusExporter().install()
+        exporter.serve(9464)            # GET /metrics
+        print(exporter.render())
+    """
+
+    def __init__(self, namespace: str = "deepmost", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._server = None
+
+    def __call__(self, event: Event) -> None:
+        if event.kind == 'timer':
+            key = (('stage', event.name),) + tuple(sorted(event.labels.items()))
+            with self._lock:
+                # bucket counts..., +Inf count, sum
+                series = self._histograms.get(key)
+                if series is None:
+                    series = self._histograms[key] = [0.0] * (len(self.buckets) + 2)
+                for i, bound in enumerate(self.buckets):
+                    if event.value <= bound:
+                        series[i] += 1
+                series[-2] += 1
+                series[-1] += event.value
+        else:
+            key = tuple(sorted(event.labels.items()))
+            with self._lock:
+                series = self._counters.setdefault(event.name, {})
+                series[key] = series.get(key, 0.0) + event.value
+
+    def install(self) -> "PrometheusExporter":
+        subscribe(self)
+        return self
+
+    def uninstall(self) -> None:
+        unsubscribe(self)
+
+    def render(self, openmetrics: bool = False) -> str:
+        """Text exposition format (or OpenMetrics when openmetrics=True)"""
+        lines = []
+        histogram = f"{self.namespace}_stage_seconds"
+        with self._lock:
+            if self._histograms:
+                lines.append(f"# HELP {histogram} Latency of DeepMost pipeline stages.")
+                lines.append(f"# TYPE {histogram} histogram")
+                for key, series in sorted(self._histograms.items()):
+                    for bound, value in zip(self.buckets, series):
+                        lines.append(f"{histogram}_bucket{_format_labels(key, ('le', repr(bound)))} {value:g}")
+                    lines.append(f"{histogram}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-2]:g}")
+                    lines.append(f"{histogram}_count{_format_labels(key)} {series[-2]:g}")
+                    lines.append(f"{histogram}_sum{_format_labels(key)} {series[-1]!r}")
+            for name, series in sorted(self._counters.items()):
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {metric if openmetrics else metric + '_total'} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{metric}_total{_format_labels(key)} {value:g}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0") -> None:
+        """Serve GET /metrics from a background thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                payload = exporter.render(openmetrics=openmetrics).encode("utf-8")
+                content_type = (
+                    "application/openmetrics-text; version=1.0.0; charset=utf-8" if openmetrics
+                    else "text/plain; version=0.0.4; charset=utf-8"
+                )
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="deepmost-metrics", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on http://{host}:{self._server.server_address[1]}/metrics")
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,131 @@
+"""Compiled keyword matching for the heuristic (no-LLM) conversation metrics"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class KeywordMatcher:
+    """
+    Counts keyword hits per signal with one compiled regex, scanning each text once.
+
+    Matching is substring matching on lowercased text, the same semantics as
+    `any(kw in text for kw in keywords)`: a signal fires when its count is positive.
+    With whole_words=True a keyword only matches as whole words ('buy' does not hit
+    'buyers', 'sign' does not hit 'design').
+    Texts passed to count/count_batch must already be lowercased (as
+    ConversationTexts.customer_text is). Example:
+
+        matcher = KeywordMatcher({'pricing': ['price', 'cost'], 'objection': ['costly']})
+        matcher.count("too costly for us")   # {'pricing': 1, 'objection': 1}
+    """
+
+    def __init__(self, signals: Dict[str, Sequence[str]], whole_words: bool = False):
+        self.signals: List[str] = list(signals)
+        self.whole_words = whole_words
+        self.keywords: List[str] = sorted(
+            {kw.lower() for keywords in signals.values() for kw in keywords},
+            key=lambda kw: (-len(kw), kw)
+        )
+
+        # The lookahead reports every start position but only the longest keyword there,
+        # so each keyword also credits the signals of keywords that are its prefixes
+        # (with whole_words, only prefixes that end where a word ends, e.g. 'not' of 'not interested')
+        self._weights = np.array([
+            [any(self._covers(kw, other.lower()) for other in signals[signal]) for signal in self.signals]
+            for kw in self.keywords
+        ], dtype=np.int64).reshape(len(self.keywords), len(self.signals))
+        self._max_length = len(self.keywords[0]) if self.keywords else 1
+        self._keyword_ids = {kw: i for i, kw in enumerate(self.keywords)}
+        self._signal_ids = {kw: tuple(np.flatnonzero(row).tolist()) for kw, row in zip(self.keywords, self._weights)}
+        # One capture group and no re.IGNORECASE: both make the scan several times slower
+        alternatives = "|".join(re.escape(kw) for kw in self.keywords)
+        if whole_words:
+            self._pattern = re.compile(r"(?=\b(" + alternatives + r")\b)")
+        else:
+            self._pattern = re.compile("(?=(" + alternatives + "))")
+
+    def _covers(self, keyword: str, other: str) -> bool:
+        """Whether a hit of keyword is also a hit of other, which starts at the same position"""
+        if not keyword.startswith(other):
+            return False
+        if not self.whole_words or len(keyword) == len(other):
+            return True
+        return not (keyword[len(other) - 1].isalnum() and keyword[len(other)].isalnum())
+
+    def count_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), len(signals)) hit counts from a single regex pass over all texts"""
+        counts = np.zeros((len(texts), len(self.signals)), dtype=np.int64)
+        if not texts or not self.keywords:
+            return counts
+
+        # Keywords never contain newlines, so no hit can span two texts
+        joined = "\n".join(texts)
+        keyword_ids = self._keyword_ids
+        hits = [(m.start(), keyword_ids[m.group(1)]) for m in self._pattern.finditer(joined)]
+        if hits:
+            positions, hit_keywords = np.array(hits, dtype=np.int64).T
+            text_ends = np.cumsum([len(text) + 1 for text in texts])
+            rows = np.searchsorted(text_ends, positions, side='right')
+            np.add.at(counts, rows, self._weights[hit_keywords])
+        return counts
+
+    def count(self, text: str) -> Dict[str, int]:
+        totals = [0] * len(self.signals)
+        self._accumulate(text, totals)
+        return dict(zip(self.signals, totals))
+
+    def update(
+        self,
+        counts: Optional[Dict[str, int]],
+        messages: Sequence[Dict[str, str]],
+        speaker: Optional[str] = 'customer'
+    ) -> Dict[str, int]:
+        """Add the hits in the space-joined messages from speaker (None = everyone) to counts (None = start fresh)"""
+        return self.extend(counts, "", messages, speaker)[0]
+
+    def extend(
+        self,
+        counts: Optional[Dict[str, int]],
+        tail: str,
+        messages: Sequence[Dict[str, str]],
+        speaker: Optional[str] = 'customer'
+    ) -> Tuple[Dict[str, int], str]:
+        """
+        Running counts over the space-joined lowercased messages from speaker, equal to
+        count() of the whole join (customer_text for speaker='customer'), including
+        keywords that span two messages. tail is the tail returned by the previous
+        call ("" to start fresh): the last characters scanned, which are rescanned so
+        that hits starting there can grow into the new text. Returns (counts, tail).
+        """
+        totals = [0] * len(self.signals) if counts is None else [counts.get(signal, 0) for signal in self.signals]
+        texts = [msg['message'].lower() for msg in messages if speaker is None or msg['speaker'] == speaker]
+        if not texts:
+            return dict(zip(self.signals, totals)), tail
+        new_text = " ".join(texts)
+        if not tail:
+            self._accumulate(new_text, totals)
+            text = new_text
+        else:
+            # Only hits starting in the last len(longest keyword) - 1 characters can change
+            # once text is appended; the character before them gives \b its context
+            start = max(0, len(tail) - self._max_length + 1)
+            text = tail + " " + new_text
+            self._accumulate(tail, totals, start, -1)
+            self._accumulate(text, totals, start)
+        return dict(zip(self.signals, totals)), text[-self._max_length:]
+
+    def _accumulate(self, text: str, totals: List[int], pos: int = 0, sign: int = 1) -> None:
+        # Plain-Python path for single short texts, where NumPy setup would dominate
+        signal_ids = self._signal_ids
+        for kw in self._pattern.findall(text, pos):
+            for j in signal_ids[kw]:
+                totals[j] += sign
+
+    def counts_for(self, texts) -> Dict[str, int]:
+        """Counts attached to a ConversationTexts if they cover every signal, else a fresh scan of customer_text"""
+        counts = getattr(texts, 'keyword_counts', None)
+        if counts is not None and all(signal in counts for signal in self.signals):
+            return counts
+        return self.count(texts.customer_text)
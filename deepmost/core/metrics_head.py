@@ -0,0 +1,229 @@
+"""Learned estimator of the LLM conversation metrics from the conversation embedding"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# Same fields (and [0, 1] range) as the LLM analysis prompt
+NUMERIC_METRICS = [
+    'customer_engagement', 'sales_effectiveness', 'engagement_trend',
+    'objection_count', 'value_proposition_mentions', 'technical_depth',
+    'urgency_level', 'competitive_context', 'pricing_sensitivity',
+    'decision_authority_signals'
+]
+CATEGORICAL_METRICS = ['conversation_style', 'conversation_flow', 'communication_channel', 'primary_customer_needs']
+
+
+class MetricsHead(nn.Module):
+    """
+    Small MLP mapping a conversation embedding (the one fed to the PPO model) to the
+    numeric LLM metrics. Categorical fields are not modelled; the head returns the
+    most common value seen in training.
+    """
+
+    def __init__(
+        self,
+        embedding_dim: int,
+        hidden_size: int = 256,
+        categorical_defaults: Optional[Dict[str, Any]] = None
+    ):
+        super().__init__()
+        self.embedding_dim = embedding_dim
+        self.hidden_size = hidden_size
+        self.categorical_defaults = {
+            'conversation_style': 'direct_professional',
+            'conversation_flow': 'standard_linear',
+            'communication_channel': 'email',
+            'primary_customer_needs': ['efficiency', 'cost_reduction'],
+            **(categorical_defaults or {})
+        }
+        self.net = nn.Sequential(
+            nn.Linear(embedding_dim, hidden_size),
+            nn.ReLU(),
+            nn.Linear(hidden_size, len(NUMERIC_METRICS)),
+            nn.Sigmoid()
+        )
+
+    def forward(self, embeddings: torch.Tensor) -> torch.Tensor:
+        return self.net(embeddings)
+
+    @torch.inference_mode()
+    def predict_batch(self, embeddings: Union[np.ndarray, Sequence[np.ndarray]]) -> List[Dict[str, Any]]:
+        """Base metrics (as the LLM analysis would return them) for a batch of embeddings"""
+        device = next(self.parameters()).device
+        inputs = torch.as_tensor(np.asarray(embeddings, dtype=np.float32), device=device).reshape(-1, self.embedding_dim)
+        values = self(inputs).cpu().numpy().astype(float)
+        return [
+            {
+                **dict(zip(NUMERIC_METRICS, np.round(row, 4).tolist())),
+                **{key: list(value) if isinstance(value, list) else value for key, value in self.categorical_defaults.items()},
+                'metrics_source': 'head'
+            }
+            for row in values
+        ]
+
+    def predict(self, embedding: np.ndarray) -> Dict[str, Any]:
+        return self.predict_batch([embedding])[0]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        torch.save({
+            'embedding_dim': self.embedding_dim,
+            'hidden_size': self.hidden_size,
+            'metrics': NUMERIC_METRICS,
+            'categorical_defaults': self.categorical_defaults,
+            'state_dict': self.state_dict(),
+        }, path)
+
+    @classmethod
+    def load(cls, path: str, device: Union[str, torch.device] = "cpu") -> "MetricsHead":
+        checkpoint = torch.load(os.path.expanduser(path), map_location=device, weights_only=True)
+        if checkpoint.get('metrics') != NUMERIC_METRICS:
+            raise ValueError(f"{path} was trained for metrics {checkpoint.get('metrics')}, expected {NUMERIC_METRICS}")
+        head = cls(checkpoint['embedding_dim'], checkpoint['hidden_size'], checkpoint['categorical_defaults'])
+        head.load_state_dict(checkpoint['state_dict'])
+        return head.to(device).eval()
+
+
+class MetricsLog:
+    """
+    Appends (embedding, LLM metrics) pairs to a JSONL file as training data for
+    MetricsHead. Each line also records how long the LLM analysis took.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def write(self, embedding: np.ndarray, metrics: Dict[str, Any], seconds: Optional[float] = None) -> None:
+        record = {
+            'embedding': np.round(np.asarray(embedding, dtype=np.float32), 6).tolist(),
+            'metrics': {key: metrics[key] for key in NUMERIC_METRICS + CATEGORICAL_METRICS if key in metrics},
+            'seconds': seconds
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.written += 1
+
+
+def load_pairs(paths: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, List[Dict[str, Any]], List[float]]:
+    """Read MetricsLog files into (embeddings, numeric targets, raw metrics, LLM seconds)"""
+    embeddings, targets, raw, seconds = [], [], [], []
+    for path in paths:
+        with open(os.path.expanduser(path), encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    metrics = record['metrics']
+                    target = [float(metrics[key]) for key in NUMERIC_METRICS]
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Skipping {path}:{line_number}: {e}")
+                    continue
+                embeddings.append(record['embedding'])
+                targets.append(target)
+                raw.append(metrics)
+                if record.get('seconds'):
+                    seconds.append(float(record['seconds']))
+    if not embeddings:
+        raise ValueError("No (embedding, metrics) pairs found")
+    return np.asarray(embeddings, dtype=np.float32), np.asarray(targets, dtype=np.float32), raw, seconds
+
+
+def _categorical_modes(raw: List[Dict[str, Any]]) -> Dict[str, Any]:
+    modes = {}
+    for key in CATEGORICAL_METRICS:
+        values = [json.dumps(m[key]) for m in raw if key in m]
+        if values:
+            modes[key] = json.loads(Counter(values).most_common(1)[0][0])
+    return modes
+
+
+def train_metrics_head(
+    paths: Iterable[str],
+    hidden_size: int = 256,
+    epochs: int = 200,
+    learning_rate: float = 1e-3,
+    weight_decay: float = 1e-4,
+    batch_size: int = 256,
+    validation_fraction: float = 0.2,
+    seed: int = 0,
+    device: Union[str, torch.device] = "cpu"
+) -> Tuple[MetricsHead, Dict[str, Any]]:
+    """
+    Fit a MetricsHead on logged pairs and report, on a held-out split, the mean
+    absolute error against the LLM per metric (next to a predict-the-mean baseline)
+    and the per-conversation latency of the head versus the logged LLM latency.
+    """
+    embeddings, targets, raw, llm_seconds = load_pairs(paths)
+    rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+
+    order = rng.permutation(len(embeddings))
+    n_val = int(len(order) * validation_fraction) if len(order) >= 5 else 0
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    head = MetricsHead(embeddings.shape[1], hidden_size, _categorical_modes([raw[i] for i in train_idx])).to(device)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=learning_rate, weight_decay=weight_decay)
+    x_train = torch.as_tensor(embeddings[train_idx], device=device)
+    y_train = torch.as_tensor(targets[train_idx], device=device)
+
+    head.train()
+    started = time.perf_counter()
+    for _ in range(epochs):
+        permutation = torch.randperm(len(x_train), device=device)
+        for start in range(0, len(x_train), batch_size):
+            batch = permutation[start:start + batch_size]
+            loss = nn.functional.mse_loss(head(x_train[batch]), y_train[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    train_seconds = time.perf_counter() - started
+    head.eval()
+
+    eval_idx = val_idx if n_val else train_idx
+    eval_x, eval_y = embeddings[eval_idx], targets[eval_idx]
+    predicted = np.array([[m[key] for key in NUMERIC_METRICS] for m in head.predict_batch(eval_x)])
+    errors = np.abs(predicted - eval_y)
+    baseline = np.abs(targets[train_idx].mean(axis=0) - eval_y)
+
+    # Single-conversation latency, the case that replaces one LLM call
+    sample = eval_x[:1]
+    head.predict_batch(sample)
+    timings = []
+    for _ in range(50):
+        t0 = time.perf_counter()
+        head.predict_batch(sample)
+        timings.append(time.perf_counter() - t0)
+    head_seconds = float(np.median(timings))
+    llm_mean = float(np.mean(llm_seconds)) if llm_seconds else None
+
+    report = {
+        'pairs': len(embeddings),
+        'train': len(train_idx),
+        'evaluated_on': 'validation' if n_val else 'train',
+        'evaluation_pairs': len(eval_idx),
+        'train_seconds': round(train_seconds, 2),
+        'mae': round(float(errors.mean()), 4),
+        'baseline_mae': round(float(baseline.mean()), 4),
+        'per_metric_mae': {key: round(float(v), 4) for key, v in zip(NUMERIC_METRICS, errors.mean(axis=0))},
+        'head_ms': round(head_seconds * 1000, 3),
+        'llm_ms': round(llm_mean * 1000, 1) if llm_mean is not None else None,
+        'speedup': round(llm_mean / head_seconds, 1) if llm_mean else None,
+    }
+    return head, report
@@ -1,16 +1,60 @@
 """Main predictor class that handles all three backends"""
 
+import hashlib
 import os
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 import numpy as np
 import torch
-from typing import List, Dict, Optional, Any, Union, Tuple
+from typing import List, Dict, Optional, Any, Union, Tuple, Iterator
 from stable_baselines3 import PPO
+from . import instrumentation
+from .clients import HTTPPool, RateLimiter
 from .embeddings import EmbeddingProvider, OpenSourceEmbeddings, AzureEmbeddings, OpenAIEmbeddings
-from .utils import ConversationState 
+from .cascade import CascadePolicy
+from .compaction import HistoryCompactor, approximate_tokens
+from .hybrid import HybridProvider
+from .metrics_head import MetricsHead, MetricsLog
+from .profiling import Profiler
+from .refresh import MetricsRefreshPolicy
+from .resources import CPUBudget, CPUPlan
+from .utils import ConversationState, ConversationTexts, KeyedLocks
 
 logger = logging.getLogger(__name__)
 
+# Warmup embedding shapes: sequence lengths (batch of 1) or (batch_size, sequence_length)
+DEFAULT_WARMUP_SHAPES = (16, 128, 512, (8, 128))
+# Concurrent remote metrics calls within one batch (the RateLimiter may cap them further)
+REMOTE_METRICS_WORKERS = 16
+_WARMUP_WORDS = (
+    "thanks for the demo yesterday the team liked the reporting features but the price "
+    "per seat is above our budget can you walk me through the annual plan and onboarding"
+).split()
+
+
+def _warmup_text(num_words: int) -> str:
+    """Sales-like text of num_words words (about as many tokens for most tokenizers)"""
+    return " ".join(_WARMUP_WORDS[i % len(_WARMUP_WORDS)] for i in range(num_words))
+
+
+def _warmup_history(num_messages: int) -> List[Dict[str, str]]:
+    return [
+        {'speaker': 'customer' if i % 2 == 0 else 'sales_rep', 'message': _warmup_text(12 + i)}
+        for i in range(num_messages)
+    ]
+
+
+def _hash_messages(digest, messages: List[Dict[str, str]]) -> None:
+    # Length-prefixed fields, so no two different histories feed the same bytes
+    for msg in messages:
+        for field in (msg['speaker'], msg['message']):
+            data = field.encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+
 
 class SalesPredictor:
     """Unified predictor for sales conversion supporting three backends"""
@@ -28,10 +72,29 @@ class SalesPredictor:
         openai_api_key: Optional[str] = None,
         openai_embedding_model: str = "text-embedding-3-large",
         openai_chat_model: Optional[str] = None,
+        openai_base_url: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        http_pool: Optional[HTTPPool] = None,
         # Open-source parameters
         embedding_model: str = "BAAI/bge-m3", 
         llm_model: Optional[str] = None,
-        use_gpu: bool = True
+        use_gpu: bool = True,
+        local_files_only: bool = False,
+        pipeline_history: bool = True,
+        trajectory_seed: Optional[int] = None,
+        compute_trajectory: bool = True,
+        metrics_source: str = "llm",
+        metrics_head: Optional[Union[str, MetricsHead]] = None,
+        metrics_log_path: Optional[str] = None,
+        # Hybrid composition: per-stage backend overrides and concurrency caps
+        embedding_backend: Optional[str] = None,
+        metrics_backend: Optional[str] = None,
+        response_backend: Optional[str] = None,
+        source_concurrency: Optional[Dict[str, int]] = None,
+        metrics_refresh: Optional[MetricsRefreshPolicy] = None,
+        cascade: Optional[CascadePolicy] = None,
+        history_compactor: Optional[HistoryCompactor] = None,
+        cpu_budget: Optional[CPUBudget] = None
     ):
         self.ppo_device = torch.device("cuda" if torch.cuda.is_available() and use_gpu else "cpu")
         logger.info(f"Using device: {self.ppo_device} for PPO model inference.")
@@ -68,68 +131,161 @@ class SalesPredictor:
             raise ValueError("Invalid PPO model observation space structure.")
         logger.info(f"PPO Model expects total_obs_dim: {total_obs_dim}, calculated expected_embedding_dim: {self.expected_embedding_dim}")
 
-        # Determine backend and initialize appropriate embedding provider
+        # Each stage (embedding, metrics, response) may use a different backend. By default
+        # all three use the first configured one: OpenAI, then Azure, then open-source.
         if openai_api_key:
-            logger.info("Using standard OpenAI embeddings and chat completions.")
-            if openai_chat_model:
-                logger.info(f"OpenAI chat completions enabled with model: {openai_chat_model}")
-            else:
-                logger.warning("No OpenAI chat model provided. LLM-powered metrics will use fallbacks.")
+            default_backend = "openai"
+        elif azure_api_key and azure_endpoint and azure_deployment:
+            default_backend = "azure"
+        else:
+            default_backend = "opensource"
+        self.stage_backends = {
+            'embedding': embedding_backend or default_backend,
+            'metrics': metrics_backend or default_backend,
+            'response': response_backend or default_backend,
+        }
+        for stage, backend in self.stage_backends.items():
+            if backend not in ("openai", "azure", "opensource"):
+                raise ValueError(f"{stage}_backend must be 'openai', 'azure' or 'opensource', got {backend!r}")
+        if "openai" in self.stage_backends.values() and not openai_api_key:
+            raise ValueError("The 'openai' backend requires openai_api_key")
+        if "azure" in self.stage_backends.values() and not (azure_api_key and azure_endpoint and azure_deployment):
+            raise ValueError("The 'azure' backend requires azure_api_key, azure_endpoint and azure_deployment")
+
+        # Split the core budget between the encoder and a local LLM before either is created
+        self.cpu_plan: Optional[CPUPlan] = None
+        if cpu_budget is not None:
+            local_llm = bool(llm_model) and "opensource" in (self.stage_backends['metrics'], self.stage_backends['response'])
+            self.cpu_plan = cpu_budget.plan(llm=local_llm)
+            self.cpu_plan.apply()
+            logger.info(f"CPU plan: {self.cpu_plan.as_dict()}")
+
+        def create_provider(backend: str) -> EmbeddingProvider:
+            if backend == "openai":
+                logger.info("Using standard OpenAI embeddings and chat completions.")
+                if openai_chat_model:
+                    logger.info(f"OpenAI chat completions enabled with model: {openai_chat_model}")
+                else:
+                    logger.warning("No OpenAI chat model provided. LLM-powered metrics will use fallbacks.")
             
-            try:
-                self.embedding_provider: EmbeddingProvider = OpenAIEmbeddings(
-                    api_key=openai_api_key,
-                    embedding_model=openai_embedding_model,
-                    chat_model=openai_chat_model,
-                    expected_dim=self.expected_embedding_dim
-                )
-                self.backend_type = "openai"
-            except Exception as e:
-                logger.error(f"Failed to initialize OpenAIEmbeddings: {e}")
-                raise
+                try:
+                    return OpenAIEmbeddings(
+                        api_key=openai_api_key,
+                        embedding_model=openai_embedding_model,
+                        chat_model=openai_chat_model,
+                        expected_dim=self.expected_embedding_dim,
+                        base_url=openai_base_url,
+                        rate_limiter=rate_limiter,
+                        http_pool=http_pool,
+                        trajectory_seed=trajectory_seed,
+                        compute_trajectory=compute_trajectory
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to initialize OpenAIEmbeddings: {e}")
+                    raise
                 
-        elif azure_api_key and azure_endpoint and azure_deployment:
-            logger.info("Using Azure OpenAI embeddings and chat completions.")
-            if azure_chat_deployment:
-                logger.info(f"Azure chat completions enabled with deployment: {azure_chat_deployment}")
-            else:
-                logger.warning("No Azure chat deployment provided. LLM-powered metrics will use fallbacks.")
+            elif backend == "azure":
+                logger.info("Using Azure OpenAI embeddings and chat completions.")
+                if azure_chat_deployment:
+                    logger.info(f"Azure chat completions enabled with deployment: {azure_chat_deployment}")
+                else:
+                    logger.warning("No Azure chat deployment provided. LLM-powered metrics will use fallbacks.")
             
-            try:
-                self.embedding_provider: EmbeddingProvider = AzureEmbeddings(
-                    api_key=azure_api_key,
-                    endpoint=azure_endpoint,
-                    embedding_deployment=azure_deployment,
-                    chat_deployment=azure_chat_deployment,
-                    api_version=azure_api_version,
-                    expected_dim=self.expected_embedding_dim
-                )
-                self.backend_type = "azure"
-            except Exception as e:
-                logger.error(f"Failed to initialize AzureEmbeddings: {e}")
-                raise
-        else:
-            logger.info(f"Using open-source embeddings with model: {embedding_model}.")
-            if llm_model:
-                logger.info(f"Open-source LLM for metrics/response: {llm_model}")
+                try:
+                    return AzureEmbeddings(
+                        api_key=azure_api_key,
+                        endpoint=azure_endpoint,
+                        embedding_deployment=azure_deployment,
+                        chat_deployment=azure_chat_deployment,
+                        api_version=azure_api_version,
+                        expected_dim=self.expected_embedding_dim,
+                        rate_limiter=rate_limiter,
+                        http_pool=http_pool,
+                        trajectory_seed=trajectory_seed,
+                        compute_trajectory=compute_trajectory
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to initialize AzureEmbeddings: {e}")
+                    raise
             else:
-                logger.warning(
-                    "No LLM model for open-source backend. Metrics use defaults, responses basic. "
-                    "Accuracy may be affected if PPO model trained with LLM-derived metrics."
-                )
-            try:
-                self.embedding_provider: EmbeddingProvider = OpenSourceEmbeddings(
-                    model_name=embedding_model,
-                    device=self.inference_device,
-                    expected_dim=self.expected_embedding_dim,
-                    llm_model=llm_model
-                )
-                self.backend_type = "opensource"
-            except Exception as e:
-                logger.error(f"Failed to initialize OpenSourceEmbeddings: {e}")
-                raise
+                logger.info(f"Using open-source embeddings with model: {embedding_model}.")
+                if llm_model:
+                    logger.info(f"Open-source LLM for metrics/response: {llm_model}")
+                else:
+                    logger.warning(
+                        "No LLM model for open-source backend. Metrics use defaults, responses basic. "
+                        "Accuracy may be affected if PPO model trained with LLM-derived metrics."
+                    )
+                try:
+                    return OpenSourceEmbeddings(
+                        model_name=embedding_model,
+                        device=self.inference_device,
+                        expected_dim=self.expected_embedding_dim,
+                        llm_model=llm_model,
+                        trajectory_seed=trajectory_seed,
+                        compute_trajectory=compute_trajectory,
+                        local_files_only=local_files_only,
+                        llm_threads=self.cpu_plan.llm_threads if self.cpu_plan else None,
+                        llm_batch_threads=self.cpu_plan.llm_batch_threads if self.cpu_plan else None,
+                        # Only the embedding stage needs the encoder
+                        load_encoder=self.stage_backends['embedding'] == "opensource"
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to initialize OpenSourceEmbeddings: {e}")
+                    raise
+
+        # One provider per distinct backend, shared by the stages that use it
+        providers = {backend: create_provider(backend) for backend in dict.fromkeys(self.stage_backends.values())}
+        if len(providers) == 1 and not source_concurrency:
+            self.backend_type, self.embedding_provider = next(iter(providers.items()))
+        else:
+            self.embedding_provider = HybridProvider(
+                embedding=providers[self.stage_backends['embedding']],
+                metrics=providers[self.stage_backends['metrics']],
+                response=providers[self.stage_backends['response']],
+                concurrency=source_concurrency
+            )
+            self.backend_type = next(iter(providers)) if len(providers) == 1 else "hybrid"
+            logger.info(f"Stage backends: {self.stage_backends}, concurrency: {self.embedding_provider.concurrency}")
 
         self.conversation_states: Dict[str, Dict[str, Any]] = {}
+        # Serializes read-modify-write of one conversation's state; different conversations run in parallel
+        self._conversation_locks = KeyedLocks()
+        # Overlap history-prefix embedding work with response generation
+        self.pipeline_history = pipeline_history
+        self._prefix_executor: Optional[ThreadPoolExecutor] = None
+        # Remote LLM metrics of a batch are requested concurrently (bounded by the
+        # RateLimiter / source_concurrency); created on first use like the prefix executor
+        self._metrics_executor: Optional[ThreadPoolExecutor] = None
+        self._prefix_executor_lock = threading.Lock()
+        # Sampled profiling, off (None) unless enable_profiling is called
+        self.profiler: Optional[Profiler] = None
+
+        # Where base metrics come from: the provider's LLM analysis or a distilled MetricsHead
+        if metrics_source not in ("llm", "head"):
+            raise ValueError("metrics_source must be 'llm' or 'head'")
+        if isinstance(metrics_head, str):
+            metrics_head = MetricsHead.load(metrics_head, device=self.inference_device)
+        if metrics_source == "head" and metrics_head is None:
+            raise ValueError("metrics_source='head' requires metrics_head (a MetricsHead or a path to one)")
+        if metrics_head is not None and metrics_head.embedding_dim != self.expected_embedding_dim:
+            raise ValueError(
+                f"MetricsHead expects {metrics_head.embedding_dim}-dim embeddings, "
+                f"but this PPO model uses {self.expected_embedding_dim}"
+            )
+        self.metrics_source = metrics_source
+        self.metrics_head = metrics_head
+        # Logs (embedding, LLM metrics) pairs for training a MetricsHead
+        self.metrics_log: Optional[MetricsLog] = MetricsLog(metrics_log_path) if metrics_log_path else None
+        # Reuse a conversation's LLM metrics across turns (None: analyze on every prediction)
+        self.metrics_refresh = metrics_refresh
+        # Score with cheap metrics first, LLM metrics only near thresholds (None: always LLM)
+        self.cascade = cascade
+        # Keep LLM prompts within a token budget by summarizing older turns (None: full history)
+        self.history_compactor = history_compactor
+        # Set by warmup(): every configured stage has run once and the first request pays no setup cost
+        self.ready = False
+        self.warmup_report: Optional[Dict[str, Any]] = None
         logger.info(f"SalesPredictor initialized successfully with {self.backend_type} backend.")
 
     def _get_effective_turn_for_prediction(
@@ -164,10 +320,30 @@ class SalesPredictor:
         self,
         conversation_history: List[Dict[str, str]],
         conversation_id: str,
-        is_incremental_prediction: bool = False
+        is_incremental_prediction: bool = False,
+        embedding_prefix: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Predict conversion probability for a conversation."""
+        """Predict conversion probability for a conversation.
 
+        embedding_prefix is an optional result of the provider's
+        prepare_embedding_prefix for a known leading part of the conversation text.
+        """
+        profiler = self.profiler
+        with self._conversation_locks.hold(conversation_id), \
+                instrumentation.stage('predict', backend=self.backend_type), \
+                (profiler.sample('predict') if profiler is not None else nullcontext()):
+            return self._predict_conversion(
+                conversation_history, conversation_id, is_incremental_prediction, embedding_prefix
+            )
+
+    def _predict_conversion(
+        self,
+        conversation_history: List[Dict[str, str]],
+        conversation_id: str,
+        is_incremental_prediction: bool,
+        embedding_prefix: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
         normalized_history = conversation_history 
 
         effective_turn, previous_probs = self._get_effective_turn_for_prediction(
@@ -178,24 +354,467 @@ class SalesPredictor:
         
         logger.info(f"Predicting for conversation_id '{conversation_id}' at effective_turn: {effective_turn} (0-indexed).")
 
-        full_text = " ".join([msg['message'] for msg in normalized_history])
-        if not full_text.strip(): 
-            logger.warning(f"Empty conversation for ID '{conversation_id}'. Using zero embedding.")
-            embedding = np.zeros(self.expected_embedding_dim, dtype=np.float32)
+        backend = self.backend_type
+        with instrumentation.stage('conversation_texts', backend=backend):
+            texts = ConversationTexts.from_history(normalized_history)
+            keyword_state = self._update_keyword_counts(conversation_id, normalized_history)
+            if keyword_state is not None:
+                texts.keyword_counts = keyword_state['keyword_counts']
+        history_summary = self.conversation_states.get(conversation_id, {}).get('history_summary')
+        full_text = texts.full_text
+        with instrumentation.stage('embedding', backend=backend):
+            if not full_text.strip(): 
+                logger.warning(f"Empty conversation for ID '{conversation_id}'. Using zero embedding.")
+                embedding = np.zeros(self.expected_embedding_dim, dtype=np.float32)
+            elif embedding_prefix is not None:
+                embedding = self.embedding_provider.get_embedding(full_text, effective_turn, prefix=embedding_prefix)
+            else:
+                embedding = self.embedding_provider.get_embedding(full_text, effective_turn)
+
+        cascade = self.cascade if self.metrics_source == "llm" else None
+        first_pass_metrics = refresh_reason = None
+        with instrumentation.stage('metrics', backend=backend):
+            if cascade is not None:
+                first_pass_metrics, refresh_reason = self._first_pass_base_metrics(
+                    conversation_id, texts, effective_turn, normalized_history, embedding
+                )
+            if first_pass_metrics is not None:
+                metrics = self._analyze_metrics(texts, effective_turn, normalized_history, base_metrics=first_pass_metrics)
+                metrics_cache = self.conversation_states.get(conversation_id, {}).get('metrics_cache')
+            else:
+                metrics, metrics_cache, compacted_summary = self._analyze_metrics_adaptive(
+                    conversation_id, texts, effective_turn, normalized_history, embedding
+                )
+                history_summary = compacted_summary or history_summary
+
+        probability = self._score(embedding, metrics, effective_turn, previous_probs, normalized_history)
+
+        cascade_info = None
+        if first_pass_metrics is not None:
+            escalated = bool(cascade.escalate(probability))
+            cascade_info = {'escalated': escalated, 'first_pass_probability': probability}
+            if escalated:
+                instrumentation.count('cascade_escalations', backend=backend)
+                if refresh_reason is not None:
+                    self.metrics_refresh.record(refresh_reason)
+                    instrumentation.count('metrics_refreshes', backend=backend, reason=refresh_reason)
+                history_summary = self._compact_for_metrics(conversation_id, texts, normalized_history) or history_summary
+                with instrumentation.stage('metrics', backend=backend, mode='cascade'):
+                    metrics = self._analyze_metrics(texts, effective_turn, normalized_history, embedding=embedding)
+                if self.metrics_refresh is not None and metrics.get('metrics_source') != 'fallback':
+                    metrics_cache = self.metrics_refresh.snapshot(metrics, normalized_history, embedding)
+                probability = self._score(embedding, metrics, effective_turn, previous_probs, normalized_history)
+            cascade.stats.record(escalated, time.perf_counter() - started)
+
+        updated_probs_for_state = previous_probs + [probability]
+        self.conversation_states[conversation_id] = {
+            'probabilities': updated_probs_for_state[-10:], 
+            'turn_number': effective_turn + 1,
+            **(keyword_state or {}),
+            **({'metrics_cache': metrics_cache} if metrics_cache is not None else {}),
+            **({'history_summary': history_summary} if history_summary is not None else {})
+        }
+
+        result = self._build_result(probability, effective_turn, metrics)
+        if cascade_info is not None:
+            result['cascade'] = cascade_info
+        return result
+
+    def _score(
+        self,
+        embedding: np.ndarray,
+        metrics: Dict[str, Any],
+        turn_number: int,
+        previous_probs: List[float],
+        history: List[Dict[str, str]]
+    ) -> float:
+        backend = self.backend_type
+        with instrumentation.stage('state_assembly', backend=backend):
+            observation = self._build_observation(embedding, metrics, turn_number, previous_probs, history)
+
+        with instrumentation.stage('ppo', backend=backend):
+            action_raw, _ = self.model.predict(observation, deterministic=True)
+        return float(np.clip(action_raw[0], 0.0, 1.0))
+
+    def _first_pass_base_metrics(
+        self,
+        conversation_id: Optional[str],
+        texts: ConversationTexts,
+        turn_number: int,
+        history: List[Dict[str, str]],
+        embedding: np.ndarray
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Keyword-heuristic base metrics for the cascade's first pass, and the reason the
+        metrics_refresh policy would refresh the cached LLM metrics (recorded only if the
+        prediction escalates). (None, None) while the cached LLM metrics are still fresh:
+        they are reused as they are, with no cascade, since escalating would only pay for
+        the same analysis again. Also (None, None) if the provider has no heuristics.
+        """
+        heuristic_metrics = getattr(self.embedding_provider, 'heuristic_metrics', None)
+        if heuristic_metrics is None:
+            return None, None
+        policy = self.metrics_refresh
+        reason = None
+        if policy is not None and conversation_id is not None:
+            cache = self.conversation_states.get(conversation_id, {}).get('metrics_cache')
+            reason = policy.refresh_reason(cache, history, embedding)
+            if reason is None:
+                return None, None
+        return {**heuristic_metrics(texts, turn_number), 'metrics_source': 'heuristic'}, reason
+
+    def _analyze_metrics_adaptive(
+        self,
+        conversation_id: str,
+        texts: ConversationTexts,
+        turn_number: int,
+        history: List[Dict[str, str]],
+        embedding: np.ndarray
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        _analyze_metrics under the metrics_refresh policy; also returns the cache entry to
+        store and the rolled history summary, if the history was compacted for the LLM
+        """
+        policy = self.metrics_refresh
+        if policy is None or self.metrics_source != "llm":
+            history_summary = self._compact_for_metrics(conversation_id, texts, history)
+            return self._analyze_metrics(texts, turn_number, history, embedding=embedding), None, history_summary
+
+        cache = self.conversation_states.get(conversation_id, {}).get('metrics_cache')
+        reason = policy.refresh_reason(cache, history, embedding)
+        policy.record(reason)
+        if reason is None:
+            instrumentation.count('metrics_reused', backend=self.backend_type)
+            return self._analyze_metrics(texts, turn_number, history, base_metrics=cache['base_metrics']), cache, None
+
+        instrumentation.count('metrics_refreshes', backend=self.backend_type, reason=reason)
+        history_summary = self._compact_for_metrics(conversation_id, texts, history)
+        metrics = self._analyze_metrics(texts, turn_number, history, embedding=embedding)
+        # Fallback metrics are not worth keeping: the next turn should retry the LLM
+        if metrics.get('metrics_source') == 'fallback':
+            return metrics, None, history_summary
+        return metrics, policy.snapshot(metrics, history, embedding), history_summary
+
+    def _compact_history(self, conversation_id: Optional[str], history: List[Dict[str, str]], stage: str = 'metrics'):
+        """
+        history_compactor view of history for a prompt of stage ('metrics' or 'response'),
+        rolling the summary stored for conversation_id forward
+        """
+        stored = self.conversation_states.get(conversation_id, {}).get('history_summary')
+        if isinstance(self.embedding_provider, HybridProvider):
+            # Tokens are counted and summaries written by the model that will read the prompt
+            count_tokens, summarize = self.embedding_provider.compaction_functions(stage)
         else:
-            embedding = self.embedding_provider.get_embedding(full_text, effective_turn)
+            count_tokens = getattr(self.embedding_provider, 'count_tokens', None)
+            summarize = getattr(self.embedding_provider, 'summarize_history', None)
+        return self.history_compactor.compact(
+            history,
+            stored,
+            count_tokens=count_tokens or approximate_tokens,
+            summarize=summarize
+        )
+
+    def _compact_for_metrics(
+        self,
+        conversation_id: Optional[str],
+        texts: ConversationTexts,
+        history: Optional[List[Dict[str, str]]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Called right before LLM metrics only, so reused or first-pass metrics never pay for
+        a summarization: sets texts.compacted_transcript and returns the rolled summary state
+        """
+        if self.history_compactor is None or self.metrics_source != "llm" or history is None:
+            return None
+        with instrumentation.stage('history_compaction', backend=self.backend_type):
+            compacted, history_summary = self._compact_history(conversation_id, history)
+        if compacted.summary:
+            texts.compacted_transcript = compacted.transcript
+        return history_summary
 
-        metrics = self.embedding_provider.analyze_metrics(normalized_history, effective_turn)
+    def prompt_history(
+        self,
+        history: List[Dict[str, str]],
+        conversation_id: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        History to put in a response prompt: compacted by history_compactor, if set.
+        With a conversation_id the rolling summary stored for it is used and updated;
+        without one the history is compacted from scratch and no state is kept.
+        """
+        if self.history_compactor is None:
+            return history
+        if conversation_id is None:
+            with instrumentation.stage('history_compaction', backend=self.backend_type):
+                return self._compact_history(None, history, stage='response')[0].history
+        with self._conversation_locks.hold(conversation_id):
+            with instrumentation.stage('history_compaction', backend=self.backend_type):
+                compacted, history_summary = self._compact_history(conversation_id, history, stage='response')
+            if history_summary is not None:
+                self.conversation_states.setdefault(conversation_id, {})['history_summary'] = history_summary
+        return compacted.history
+
+    def _update_keyword_counts(
+        self,
+        conversation_id: str,
+        history: List[Dict[str, str]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Running keyword counts for the fallback metrics: only messages added since the
+        last prediction for conversation_id are scanned, and the counts equal a full
+        scan of the customer text. Falls back to a full scan when the history no longer
+        extends what was scanned before (checked with a hash of the scanned messages).
+        """
+        matcher = getattr(self.embedding_provider, 'keyword_matcher', None)
+        if matcher is None:
+            return None
+
+        stored = self.conversation_states.get(conversation_id, {})
+        counts = stored.get('keyword_counts')
+        scanned = stored.get('keyword_messages', 0)
+        digest = hashlib.blake2b(digest_size=16)
+        if counts is not None and scanned <= len(history):
+            _hash_messages(digest, history[:scanned])
+        if counts is None or scanned > len(history) or digest.hexdigest() != stored.get('keyword_digest'):
+            counts, scanned, digest = None, 0, hashlib.blake2b(digest_size=16)
+
+        counts, tail = matcher.extend(counts, stored.get('keyword_tail', "") if scanned else "", history[scanned:])
+        _hash_messages(digest, history[scanned:])
+        return {
+            'keyword_counts': counts,
+            'keyword_messages': len(history),
+            'keyword_digest': digest.hexdigest(),
+            'keyword_tail': tail
+        }
+
+    def predict_conversions_batch(
+        self,
+        conversation_histories: List[List[Dict[str, str]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        One-shot prediction for many conversations at once.
+
+        Embeddings are computed in batches where the provider supports it and the PPO
+        policy runs a single vectorized forward pass. No per-conversation state is
+        stored, so memory stays flat when scoring large archives.
+        """
+        conversation_texts = [ConversationTexts.from_history(history) for history in conversation_histories]
+        return self.predict_conversions_batch_texts(conversation_texts, conversation_histories)
+
+    def predict_conversions_batch_texts(
+        self,
+        conversation_texts: List[ConversationTexts],
+        conversation_histories: Optional[List[List[Dict[str, str]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        predict_conversions_batch for conversations already reduced to ConversationTexts.
+        With conversation_histories, histories sent to the LLM for metrics are compacted first.
+        """
+        if not conversation_texts:
+            return []
+
+        profiler = self.profiler
+        with profiler.sample('predict_batch') if profiler is not None else nullcontext():
+            return self._predict_conversions_batch_texts(conversation_texts, conversation_histories)
+
+    def _predict_conversions_batch_texts(
+        self,
+        conversation_texts: List[ConversationTexts],
+        conversation_histories: Optional[List[List[Dict[str, str]]]]
+    ) -> List[Dict[str, Any]]:
+        if conversation_histories is None:
+            conversation_histories = [None] * len(conversation_texts)
+
+        started = time.perf_counter()
+        backend = self.backend_type
+        turns = [max(texts.num_messages - 1, 0) for texts in conversation_texts]
+        matcher = getattr(self.embedding_provider, 'keyword_matcher', None)
+        if matcher is not None:
+            # One regex pass over every conversation in the batch
+            counts = matcher.count_batch([texts.customer_text for texts in conversation_texts])
+            for texts, row in zip(conversation_texts, counts.tolist()):
+                texts.keyword_counts = dict(zip(matcher.signals, row))
+        with instrumentation.stage('embedding', backend=backend, mode='batch'):
+            embeddings = self._get_embeddings_batch([texts.full_text for texts in conversation_texts], turns)
+
+        cascade = self.cascade if self.metrics_source == "llm" else None
+        heuristic_metrics = getattr(self.embedding_provider, 'heuristic_metrics', None) if cascade is not None else None
+        with instrumentation.stage('metrics', backend=backend, mode='batch'):
+            if self.metrics_source == "head":
+                base_metrics_list = self.metrics_head.predict_batch(embeddings)
+            elif heuristic_metrics is not None:
+                base_metrics_list = [
+                    {**heuristic_metrics(texts, turn), 'metrics_source': 'heuristic'}
+                    for texts, turn in zip(conversation_texts, turns)
+                ]
+            else:
+                base_metrics_list = [None] * len(conversation_texts)
+            metrics_list = self._analyze_metrics_batch(
+                conversation_texts, turns, embeddings, base_metrics_list, conversation_histories
+            )
+
+        probabilities = self._score_batch(embeddings, metrics_list, turns)
+
+        escalate = None
+        if heuristic_metrics is not None:
+            first_pass = probabilities.copy()
+            # Per-conversation share of the batch time: every conversation paid for the
+            # first pass, escalated ones also for their share of the escalation batch
+            first_pass_seconds = (time.perf_counter() - started) / len(conversation_texts)
+            escalation_seconds = 0.0
+            escalate = cascade.escalate(probabilities)
+            indices = np.flatnonzero(escalate).tolist()
+            if indices:
+                escalation_started = time.perf_counter()
+                instrumentation.count('cascade_escalations', backend=backend, value=len(indices))
+                with instrumentation.stage('metrics', backend=backend, mode='cascade'):
+                    escalated_metrics = self._analyze_metrics_batch(
+                        [conversation_texts[i] for i in indices], [turns[i] for i in indices],
+                        [embeddings[i] for i in indices], [None] * len(indices),
+                        [conversation_histories[i] for i in indices]
+                    )
+                for i, metrics in zip(indices, escalated_metrics):
+                    metrics_list[i] = metrics
+                probabilities[indices] = self._score_batch(
+                    [embeddings[i] for i in indices], escalated_metrics, [turns[i] for i in indices]
+                )
+                escalation_seconds = (time.perf_counter() - escalation_started) / len(indices)
+            for flag in escalate.tolist():
+                cascade.stats.record(flag, first_pass_seconds + (escalation_seconds if flag else 0.0))
+
+        results = [
+            self._build_result(float(probability), turn, metrics)
+            for probability, turn, metrics in zip(probabilities, turns, metrics_list)
+        ]
+        if escalate is not None:
+            for result, flag, probability in zip(results, escalate.tolist(), first_pass.tolist()):
+                result['cascade'] = {'escalated': flag, 'first_pass_probability': probability}
+        return results
+
+    def _analyze_metrics_batch(
+        self,
+        conversation_texts: List[ConversationTexts],
+        turns: List[int],
+        embeddings: List[np.ndarray],
+        base_metrics_list: List[Optional[Dict[str, Any]]],
+        conversation_histories: List[Optional[List[Dict[str, str]]]]
+    ) -> List[Dict[str, Any]]:
+        compute_trajectory = getattr(self.embedding_provider, 'compute_trajectory', False)
+
+        def analyze(item) -> Dict[str, Any]:
+            texts, turn, embedding, base_metrics, history = item
+            if base_metrics is None:
+                # On the metrics workers, and only for conversations that go to the LLM
+                self._compact_for_metrics(None, texts, history)
+            return self._analyze_metrics(
+                texts, turn,
+                compute_trajectory=False if compute_trajectory else None,
+                embedding=embedding,
+                base_metrics=base_metrics
+            )
+
+        items = list(zip(conversation_texts, turns, embeddings, base_metrics_list, conversation_histories))
+        if len(items) > 1 and self.remote_metrics and any(base is None for base in base_metrics_list):
+            # One API call per conversation: overlap them instead of waiting for each in turn
+            with self._prefix_executor_lock:
+                if self._metrics_executor is None:
+                    self._metrics_executor = ThreadPoolExecutor(
+                        max_workers=REMOTE_METRICS_WORKERS, thread_name_prefix="deepmost-metrics"
+                    )
+            metrics_list = list(self._metrics_executor.map(analyze, items))
+        else:
+            metrics_list = [analyze(item) for item in items]
+        if compute_trajectory:
+            # One vectorized pass over the whole batch instead of one loop per conversation
+            trajectories = self.embedding_provider.probability_trajectories(conversation_texts, metrics_list)
+            for metrics, trajectory in zip(metrics_list, trajectories):
+                metrics['probability_trajectory'] = trajectory
+        return metrics_list
+
+    @property
+    def remote_metrics(self) -> bool:
+        """True when conversation metrics come from an OpenAI/Azure LLM (one API call each)"""
+        return self.metrics_source == "llm" and self.stage_backends['metrics'] != "opensource"
+
+    def _score_batch(self, embeddings: List[np.ndarray], metrics_list: List[Dict[str, Any]], turns: List[int]) -> np.ndarray:
+        backend = self.backend_type
+        with instrumentation.stage('state_assembly', backend=backend, mode='batch'):
+            observations = [
+                self._build_observation(embedding, metrics, turn, [])
+                for embedding, metrics, turn in zip(embeddings, metrics_list, turns)
+            ]
+
+        with instrumentation.stage('ppo', backend=backend, mode='batch'):
+            actions, _ = self.model.predict(np.stack(observations), deterministic=True)
+        return np.clip(np.asarray(actions, dtype=np.float32).reshape(len(observations), -1)[:, 0], 0.0, 1.0)
+
+    def _get_embeddings_batch(self, texts: List[str], turns: List[int]) -> List[np.ndarray]:
+        embeddings = [np.zeros(self.expected_embedding_dim, dtype=np.float32) for _ in texts]
+        non_empty = [i for i, text in enumerate(texts) if text.strip()]
+        if not non_empty:
+            return embeddings
+
+        if hasattr(self.embedding_provider, 'get_embeddings_batch'):
+            computed = self.embedding_provider.get_embeddings_batch(
+                [texts[i] for i in non_empty], [turns[i] for i in non_empty]
+            )
+        else:
+            computed = [self.embedding_provider.get_embedding(texts[i], turns[i]) for i in non_empty]
+
+        for i, embedding in zip(non_empty, computed):
+            embeddings[i] = embedding
+        return embeddings
+
+    def _analyze_metrics(
+        self,
+        texts: ConversationTexts,
+        turn_number: int,
+        history: Optional[List[Dict[str, str]]] = None,
+        compute_trajectory: Optional[bool] = None,
+        embedding: Optional[np.ndarray] = None,
+        base_metrics: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        if base_metrics is None and self.metrics_source == "head" and embedding is not None:
+            base_metrics = self.metrics_head.predict(embedding)
+
+        started = time.perf_counter()
+        if hasattr(self.embedding_provider, 'analyze_metrics_texts'):
+            # Only pass the optional arguments in use, so minimal custom providers keep working
+            options = {}
+            if compute_trajectory is not None:
+                options['compute_trajectory'] = compute_trajectory
+            if base_metrics is not None:
+                options['base_metrics'] = base_metrics
+            metrics = self.embedding_provider.analyze_metrics_texts(texts, turn_number, **options)
+        elif history is not None:
+            metrics = self.embedding_provider.analyze_metrics(history, turn_number)
+        else:
+            raise TypeError(f"{type(self.embedding_provider).__name__} does not implement analyze_metrics_texts.")
         
         if 'outcome' not in metrics: 
             logger.error("'outcome' metric missing from provider. Defaulting to 0.5.")
             metrics['outcome'] = 0.5
 
+        if self.metrics_log is not None and embedding is not None and metrics.get('metrics_source') == 'llm':
+            try:
+                self.metrics_log.write(embedding, metrics, time.perf_counter() - started)
+            except OSError as e:
+                logger.warning(f"Could not log metrics pair to {self.metrics_log.path}: {e}")
+        return metrics
+
+    def _build_observation(
+        self,
+        embedding: np.ndarray,
+        metrics: Dict[str, Any],
+        turn_number: int,
+        previous_probs: List[float],
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> np.ndarray:
         state_obj = ConversationState( 
-            conversation_history=normalized_history,
+            conversation_history=history if history is not None else [],
             embedding=embedding,
             conversation_metrics=metrics, 
-            turn_number=effective_turn, 
+            turn_number=turn_number, 
             conversion_probabilities=previous_probs 
         )
 
@@ -205,22 +824,15 @@ class SalesPredictor:
         if observation.shape[0] != expected_shape[0]:
             logger.error(
                 f"Observation shape mismatch for PPO model! Expected ({expected_shape[0]},), got ({observation.shape[0]},). "
-                f"Effective_turn: {effective_turn}, Embedding shape: {embedding.shape}"
+                f"Effective_turn: {turn_number}, Embedding shape: {embedding.shape}"
             )
             raise ValueError("Observation shape mismatch. Cannot proceed with PPO model prediction.")
+        return observation.astype(np.float32)
 
-        action_raw, _ = self.model.predict(observation.astype(np.float32), deterministic=True)
-        probability = float(np.clip(action_raw[0], 0.0, 1.0))
-
-        updated_probs_for_state = previous_probs + [probability]
-        self.conversation_states[conversation_id] = {
-            'probabilities': updated_probs_for_state[-10:], 
-            'turn_number': effective_turn + 1 
-        }
-
+    def _build_result(self, probability: float, turn_number: int, metrics: Dict[str, Any]) -> Dict[str, Any]:
         return {
             'probability': probability,
-            'turn': effective_turn, 
+            'turn': turn_number, 
             'metrics': metrics, 
             'status': self._get_status(probability),
             'suggested_action': self._get_suggested_action(probability, metrics),
@@ -236,27 +848,195 @@ class SalesPredictor:
     ) -> Dict[str, Any]:
         """Generate sales response and then predict conversion probability."""
         
+        prefix_future = self._start_history_prefix(conversation_history, user_input)
+
         response_text = self.embedding_provider.generate_response(
-            history=conversation_history, 
+            history=self.prompt_history(conversation_history, conversation_id),
             user_input=user_input,
             system_prompt=system_prompt
         )
 
+        prediction_result = self._predict_after_response(
+            conversation_history, user_input, response_text, conversation_id, prefix_future
+        )
+
+        return {
+            'response': response_text,
+            'prediction': prediction_result
+        }
+
+    def generate_response_and_predict_stream(
+        self,
+        conversation_history: List[Dict[str, str]],
+        user_input: str,
+        conversation_id: str,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the sales response as it is generated, then predict conversion probability.
+
+        Yields {'type': 'token', 'text': ...} events while the response is being
+        generated, followed by a single {'type': 'prediction', 'response': ...,
+        'prediction': ...} event once the full response has been scored.
+        """
+        prefix_future = self._start_history_prefix(conversation_history, user_input)
+
+        chunks = []
+        for text in self.embedding_provider.generate_response_stream(
+            history=self.prompt_history(conversation_history, conversation_id),
+            user_input=user_input,
+            system_prompt=system_prompt
+        ):
+            chunks.append(text)
+            yield {'type': 'token', 'text': text}
+
+        response_text = "".join(chunks).strip()
+        prediction_result = self._predict_after_response(
+            conversation_history, user_input, response_text, conversation_id, prefix_future
+        )
+
+        yield {
+            'type': 'prediction',
+            'response': response_text,
+            'prediction': prediction_result
+        }
+
+    def _predict_after_response(
+        self,
+        conversation_history: List[Dict[str, str]],
+        user_input: str,
+        response_text: str,
+        conversation_id: str,
+        prefix_future: Optional[Future] = None
+    ) -> Dict[str, Any]:
         updated_conversation_history = conversation_history + [
             {'speaker': 'customer', 'message': user_input},
             {'speaker': 'sales_rep', 'message': response_text}
         ]
+
+        embedding_prefix = None
+        if prefix_future is not None:
+            try:
+                embedding_prefix = prefix_future.result()
+            except Exception as e:
+                logger.warning(f"History prefix preparation failed: {e}. Embedding full conversation instead.")
         
-        prediction_result = self.predict_conversion(
+        return self.predict_conversion(
             updated_conversation_history,
             conversation_id,
-            is_incremental_prediction=False 
+            is_incremental_prediction=False,
+            embedding_prefix=embedding_prefix
         )
 
-        return {
-            'response': response_text,
-            'prediction': prediction_result
+    def _start_history_prefix(
+        self,
+        conversation_history: List[Dict[str, str]],
+        user_input: str
+    ) -> Optional[Future]:
+        """
+        Start preparing the embedding input for everything that is known before the
+        reply is generated (history plus the new customer message) on a background
+        thread, so only the reply has to be processed once it arrives.
+        """
+        if not self.pipeline_history or not hasattr(self.embedding_provider, 'prepare_embedding_prefix'):
+            return None
+
+        # Must be a leading part of the text predict_conversion builds from the updated history
+        prefix_text = " ".join([msg['message'] for msg in conversation_history] + [user_input])
+
+        with self._prefix_executor_lock:
+            if self._prefix_executor is None:
+                self._prefix_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deepmost-prefix")
+        return self._prefix_executor.submit(self.embedding_provider.prepare_embedding_prefix, prefix_text)
+
+    def enable_profiling(
+        self,
+        output_dir: str = "~/.deepmost/profiles",
+        sample_rate: float = 0.01,
+        mode: str = "cprofile",
+        max_files: int = 50
+    ) -> Profiler:
+        """
+        Profile a sampled fraction of predict calls (cProfile or torch.profiler),
+        writing one trace per sampled call to output_dir. Can be switched on and off
+        while serving.
+        """
+        self.profiler = Profiler(output_dir, sample_rate=sample_rate, mode=mode, max_files=max_files)
+        logger.info(f"Profiling {sample_rate:.1%} of predictions with {mode} into {self.profiler.output_dir}")
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        self.profiler = None
+
+    def warmup(self, shapes=None, response: bool = False) -> Dict[str, Any]:
+        """
+        Run dummy inputs through every configured stage so that one-off costs (kernel
+        selection, tokenizer caches, llama.cpp buffer allocation, HTTP connection setup)
+        are paid here instead of by the first request: the encoder at each of shapes
+        (sequence lengths, or (batch_size, sequence_length) tuples), the metrics stage
+        (LLM, metrics head or heuristics), PPO for one and many observations and, with
+        response=True, response generation.
+
+        Conversation state is not touched. Returns the seconds per stage and sets
+        self.ready when no stage failed.
+        """
+        shapes = DEFAULT_WARMUP_SHAPES if shapes is None else shapes
+        stages: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        started = time.perf_counter()
+
+        def run(name: str, fn):
+            step_started = time.perf_counter()
+            try:
+                with instrumentation.stage('warmup', backend=self.backend_type, step=name):
+                    value = fn()
+            except Exception as e:
+                logger.warning(f"Warmup step '{name}' failed: {e}")
+                errors[name] = str(e)
+                return None
+            stages[name] = round(time.perf_counter() - step_started, 4)
+            return value
+
+        history = _warmup_history(8)
+        texts = ConversationTexts.from_history(history)
+        turn = len(history) - 1
+        embedding = None
+        for shape in shapes:
+            batch_size, length = (1, shape) if isinstance(shape, int) else shape
+            text = _warmup_text(length)
+            if batch_size == 1:
+                value = run(f"embedding_{length}", lambda: self.embedding_provider.get_embedding(text, turn))
+                embedding = value if value is not None else embedding
+            else:
+                run(f"embedding_{batch_size}x{length}",
+                    lambda: self._get_embeddings_batch([text] * batch_size, [turn] * batch_size))
+        if embedding is None:
+            embedding = np.zeros(self.expected_embedding_dim, dtype=np.float32)
+
+        # Metrics pairs are only logged with an embedding, so the dummy conversation stays out of the log
+        metrics = run('metrics', lambda: self._analyze_metrics(
+            texts, turn, history, embedding=embedding if self.metrics_source == "head" else None
+        ))
+        if self.cascade is not None and hasattr(self.embedding_provider, 'heuristic_metrics'):
+            run('heuristic_metrics', lambda: self.embedding_provider.heuristic_metrics(texts, turn))
+        if metrics is None:
+            metrics = {'outcome': 0.5}
+        run('ppo', lambda: self._score(embedding, metrics, turn, [], history))
+        batch_size = max([1] + [shape[0] for shape in shapes if not isinstance(shape, int)])
+        if batch_size > 1:
+            run(f"ppo_{batch_size}", lambda: self._score_batch([embedding] * batch_size, [metrics] * batch_size, [turn] * batch_size))
+        if response:
+            run('response', lambda: self.embedding_provider.generate_response(history[:-1], history[-1]['message']))
+
+        self.ready = not errors
+        self.warmup_report = {
+            'ready': self.ready,
+            'total_s': round(time.perf_counter() - started, 4),
+            'stages': stages,
+            'errors': errors
         }
+        logger.info(f"Warmup finished in {self.warmup_report['total_s']:.2f}s (ready: {self.ready})")
+        return self.warmup_report
 
     def _get_status(self, probability: float) -> str:
         if probability >= 0.5: return "🟢 High"
@@ -0,0 +1,143 @@
+"""Sampled cProfile / torch.profiler capture of individual prediction calls"""
+
+import contextlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Traces written by _next_path (any process): {stamp}-{name}-{pid}-{seq}.{ext}
+_TRACE_NAME = re.compile(r"^\d{8}-\d{6}-.+-\d+-\d{5,}\.(prof|json)$")
+
+
+class Profiler:
+    """
+    Profiles a random sample of calls and writes one trace per sampled call into
+    output_dir, keeping only the newest max_files traces.
+
+    mode='cprofile' writes .prof files (open with pstats or snakeviz); mode='torch'
+    writes Chrome traces (.json) from torch.profiler, including CUDA kernels when a
+    GPU is in use. Only one call is profiled at a time; calls sampled while another
+    profile is running are skipped.
+    """
+
+    MODES = ('cprofile', 'torch')
+
+    def __init__(
+        self,
+        output_dir: str,
+        sample_rate: float = 0.01,
+        mode: str = 'cprofile',
+        max_files: int = 50,
+        seed: Optional[int] = None
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.output_dir = os.path.expanduser(output_dir)
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.max_files = max_files
+        self._rng = random.Random(seed)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._calls = 0
+        self._written = 0
+        self._last_path: Optional[str] = None
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def should_sample(self) -> bool:
+        with self._lock:
+            self._calls += 1
+            return self.sample_rate > 0 and self._rng.random() < self.sample_rate
+
+    def sample(self, name: str):
+        """Context manager profiling the enclosed block if this call is sampled"""
+        if not self.should_sample() or not self._busy.acquire(blocking=False):
+            return contextlib.nullcontext()
+        return self._profile(name)
+
+    @contextlib.contextmanager
+    def _profile(self, name: str) -> Iterator[None]:
+        # Writing or rotating traces must never fail the profiled call: errors are only logged
+        start = time.perf_counter()
+        try:
+            if self.mode == 'cprofile':
+                import cProfile
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+                    self._save(name, "prof", profile.dump_stats, start)
+            else:
+                import torch
+                activities = [torch.profiler.ProfilerActivity.CPU]
+                if torch.cuda.is_available():
+                    activities.append(torch.profiler.ProfilerActivity.CUDA)
+                with torch.profiler.profile(activities=activities, record_shapes=True, with_stack=True) as profile:
+                    yield
+                self._save(name, "json", profile.export_chrome_trace, start)
+        finally:
+            self._busy.release()
+
+    def _save(self, name: str, extension: str, dump: Callable[[str], None], start: float) -> None:
+        path = self._next_path(name, extension)
+        try:
+            dump(path)
+        except Exception as e:
+            logger.warning(f"Could not write profile {path}: {e}")
+            return
+        with self._lock:
+            self._written += 1
+            self._last_path = path
+        logger.info(f"Profiled {name} ({(time.perf_counter() - start) * 1000:.1f} ms) -> {path}")
+        self._rotate()
+
+    def _next_path(self, name: str, extension: str) -> str:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{stamp}-{name}-{os.getpid()}-{seq:05d}.{extension}")
+
+    def _rotate(self) -> None:
+        # Other processes (e.g. forked workers) may write and rotate the same directory concurrently
+        try:
+            names = [f for f in os.listdir(self.output_dir) if _TRACE_NAME.match(f)]
+        except OSError as e:
+            logger.warning(f"Could not list {self.output_dir} to rotate profiles: {e}")
+            return
+        traces = []
+        for trace_name in names:
+            path = os.path.join(self.output_dir, trace_name)
+            try:
+                traces.append((os.path.getmtime(path), path))
+            except OSError:
+                continue   # already removed by another process
+        traces.sort()
+        for _, old in traces[:max(0, len(traces) - self.max_files)]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove old profile {old}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls_seen': self._calls,
+            'profiles_written': self._written,
+            'last_profile': self._last_path,
+            'output_dir': self.output_dir,
+            'sample_rate': self.sample_rate,
+            'mode': self.mode,
+        }
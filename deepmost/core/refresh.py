@@ -0,0 +1,110 @@
+"""Adaptive refresh of LLM conversation metrics on turn-by-turn feeds"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .keywords import KeywordMatcher
+from .metrics_head import CATEGORICAL_METRICS, NUMERIC_METRICS
+
+# Matched as whole words in customer messages only: reps mention pricing and demos in
+# most turns, and substrings ('sign' in 'design') would fire on nearly every message
+DEFAULT_TRIGGERS = {
+    'pricing': ['price', 'prices', 'pricing', 'cost', 'costs', 'budget', 'discount', 'quote', 'invoice'],
+    'objection': [
+        'expensive', 'costly', 'concern', 'concerns', 'not interested', 'problem', 'competitor', 'competitors', 'cancel'
+    ],
+    'commitment': ['sign', 'contract', 'purchase', 'buy', "let's do it", 'next steps', 'trial', 'demo'],
+}
+
+
+class MetricsRefreshPolicy:
+    """
+    Decides per prediction whether a conversation's LLM metrics must be recomputed or
+    the last ones can be reused. A refresh happens when any of these hold:
+
+    - no metrics are cached yet, or the history no longer extends the cached one
+    - max_turns or more messages were added since the last refresh
+    - the embedding moved by more than drift_threshold (cosine distance) since then
+    - a new customer message contains a trigger keyword (pricing, objection,
+      commitment) as whole words
+
+    Reused metrics keep the conversation-dependent fields (length, progress,
+    trajectory) current; only the LLM analysis is skipped.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 4,
+        drift_threshold: float = 0.05,
+        triggers: Optional[Dict[str, Sequence[str]]] = None
+    ):
+        if max_turns < 1:
+            raise ValueError("max_turns must be at least 1")
+        self.max_turns = max_turns
+        self.drift_threshold = drift_threshold
+        self.matcher = KeywordMatcher(DEFAULT_TRIGGERS if triggers is None else triggers, whole_words=True)
+        self._lock = threading.Lock()
+        self._reasons: Dict[str, int] = {}
+        self._reused = 0
+
+    def refresh_reason(
+        self,
+        cache: Optional[Dict[str, Any]],
+        history: List[Dict[str, str]],
+        embedding: np.ndarray
+    ) -> Optional[str]:
+        """Why the metrics must be recomputed, or None if the cached ones can be reused"""
+        if cache is None:
+            return 'initial'
+        seen = cache['messages']
+        if seen > len(history) or (seen > 0 and history[seen - 1]['message'] != cache['last_message']):
+            return 'reset'
+        if len(history) - seen >= self.max_turns:
+            return 'turns'
+        if self.drift_threshold is not None and _cosine_distance(embedding, cache['embedding']) > self.drift_threshold:
+            return 'drift'
+        if self.matcher.keywords and any(self.matcher.update(None, history[seen:]).values()):
+            return 'trigger'
+        return None
+
+    def snapshot(self, metrics: Dict[str, Any], history: List[Dict[str, str]], embedding: np.ndarray) -> Dict[str, Any]:
+        """Cache entry for conversation state after a refresh"""
+        return {
+            'base_metrics': {
+                **{key: metrics[key] for key in NUMERIC_METRICS + CATEGORICAL_METRICS if key in metrics},
+                'metrics_source': 'cached'
+            },
+            'embedding': np.asarray(embedding, dtype=np.float32).copy(),
+            'messages': len(history),
+            'last_message': history[-1]['message'] if history else None
+        }
+
+    def record(self, reason: Optional[str]) -> None:
+        with self._lock:
+            if reason is None:
+                self._reused += 1
+            else:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Observed refresh rate and the reasons behind the refreshes"""
+        with self._lock:
+            refreshes = sum(self._reasons.values())
+            calls = refreshes + self._reused
+            return {
+                'calls': calls,
+                'refreshes': refreshes,
+                'reused': self._reused,
+                'refresh_rate': refreshes / calls if calls else 0.0,
+                'trigger_rate': self._reasons.get('trigger', 0) / calls if calls else 0.0,
+                'reasons': dict(self._reasons),
+            }
+
+
+def _cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if norm == 0.0:
+        return 0.0 if not np.any(a) and not np.any(b) else 1.0
+    return 1.0 - float(np.dot(a, b)) / norm
@@ -0,0 +1,141 @@
+"""Partitioning of CPU cores between worker processes, the embedding encoder and the GGUF LLM"""
+
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on (its affinity mask where supported)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cores(spec: str) -> Union[int, List[int]]:
+    """'8' -> 8 cores; '0-3,8-11' -> those core ids"""
+    if spec.isdigit():
+        return int(spec)
+    cores = []
+    for part in spec.split(","):
+        start, _, end = part.partition("-")
+        cores.extend(range(int(start), int(end or start) + 1))
+    return cores
+
+
+@dataclass
+class CPUPlan:
+    """Thread counts and core sets of one CPUBudget for a given model setup"""
+    workers: int
+    encoder_threads: int
+    llm_threads: int
+    llm_batch_threads: int
+    worker_cores: List[List[int]] = field(default_factory=list)
+    pin: bool = False
+
+    def apply(self, worker_index: Optional[int] = None) -> None:
+        """
+        Configure the calling process: torch intra-op threads, one inter-op thread and,
+        if pinning, affinity to its cores (worker_index selects a worker's share; None
+        means the whole budget). llama.cpp threads are set when the LLM is created.
+        """
+        torch.set_num_threads(self.encoder_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Only settable before the first inter-op parallel work
+        if self.pin and hasattr(os, "sched_setaffinity"):
+            if worker_index is None:
+                cores = sorted({core for cores in self.worker_cores for core in cores})
+            else:
+                cores = self.worker_cores[worker_index % len(self.worker_cores)]
+            os.sched_setaffinity(0, cores)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'encoder_threads': self.encoder_threads,
+            'llm_threads': self.llm_threads,
+            'llm_batch_threads': self.llm_batch_threads,
+            'worker_cores': self.worker_cores,
+            'pin': self.pin,
+        }
+
+
+class CPUBudget:
+    """
+    A core budget divided between worker processes and, within each worker, between
+    the embedding encoder (torch intra-op threads) and the GGUF LLM (llama.cpp
+    n_threads / n_threads_batch), so that together they never ask for more threads
+    than there are cores:
+
+        budget = CPUBudget(cores=16, workers=2)            # 8 cores per worker
+        agent = sales.Agent(llm_model="...", cpu_budget=budget)
+        agent.predictor.cpu_plan.as_dict()                  # 4 encoder + 4 LLM threads per worker
+
+    cores is a number of cores or a list of core ids (default: every core this
+    process may use). llm_share is the fraction of a worker's cores given to the
+    LLM when one is loaded. With pin=True every worker is bound to its own cores,
+    which keeps caches warm and stops workers from migrating onto each other.
+    """
+
+    def __init__(
+        self,
+        cores: Optional[Union[int, Sequence[int]]] = None,
+        workers: int = 1,
+        llm_share: float = 0.5,
+        pin: bool = False
+    ):
+        available = available_cores()
+        if cores is None:
+            self.cores = available
+        elif isinstance(cores, int):
+            if cores < 1:
+                raise ValueError("cores must be positive")
+            if cores > len(available):
+                logger.warning(f"CPU budget of {cores} cores exceeds the {len(available)} available; using {len(available)}")
+            self.cores = available[:cores]
+        else:
+            self.cores = sorted(set(cores))
+            if not self.cores:
+                raise ValueError("cores must not be empty")
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        if not 0.0 < llm_share < 1.0:
+            raise ValueError("llm_share must be between 0 and 1")
+        if workers > len(self.cores):
+            logger.warning(f"{workers} workers on {len(self.cores)} cores: workers will share cores")
+        self.workers = workers
+        self.llm_share = llm_share
+        self.pin = pin
+
+    @property
+    def cores_per_worker(self) -> int:
+        return max(1, len(self.cores) // self.workers)
+
+    def plan(self, llm: bool) -> CPUPlan:
+        """Thread counts per worker, with or without a local LLM to make room for"""
+        per_worker = self.cores_per_worker
+        if llm and per_worker > 1:
+            llm_threads = min(per_worker - 1, max(1, round(per_worker * self.llm_share)))
+            encoder_threads = per_worker - llm_threads
+        else:
+            # One core: the encoder and the LLM take turns on it
+            llm_threads = encoder_threads = per_worker
+        worker_cores = [
+            self.cores[(i * per_worker) % len(self.cores):][:per_worker] or self.cores[:per_worker]
+            for i in range(self.workers)
+        ]
+        return CPUPlan(
+            workers=self.workers,
+            encoder_threads=encoder_threads,
+            llm_threads=llm_threads,
+            llm_batch_threads=llm_threads,
+            worker_cores=worker_cores,
+            pin=self.pin
+        )
@@ -1,16 +1,27 @@
 """Utility functions and classes"""
 
+import hashlib
+import json
+import logging
 import os
+import re
+import threading
+import time
+import zipfile
+import zlib
+from contextlib import contextmanager
 import torch
 import torch.nn as nn
 import numpy as np
 import requests
 from tqdm import tqdm
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 from dataclasses import dataclass
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 import gymnasium as gym
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class ConversationState:
@@ -47,6 +58,127 @@ class ConversationState:
         ]).astype(np.float32)
 
 
+@dataclass
+class ConversationTexts:
+    """Pre-joined text views of a conversation: everything embedding and metric analysis read"""
+    full_text: str
+    transcript: str
+    customer_text: str
+    num_messages: int
+    # Running keyword signal counts over customer messages (KeywordMatcher), if already known
+    keyword_counts: Optional[Dict[str, int]] = None
+    # Token-budgeted transcript for LLM prompts (HistoryCompactor), if the history was compacted
+    compacted_transcript: Optional[str] = None
+
+    @property
+    def prompt_transcript(self) -> str:
+        return self.compacted_transcript if self.compacted_transcript is not None else self.transcript
+
+    @classmethod
+    def from_history(cls, history: List[Dict[str, str]]) -> "ConversationTexts":
+        return cls(
+            full_text=" ".join([msg['message'] for msg in history]),
+            transcript="\n".join([f"{msg['speaker'].capitalize()}: {msg['message']}" for msg in history]),
+            customer_text=" ".join([msg['message'].lower() for msg in history if msg['speaker'] == 'customer']),
+            num_messages=len(history)
+        )
+
+
+_trajectory_rng = np.random.default_rng()
+
+
+def trajectory_noise(full_texts: Sequence[str], max_turns: int, scale: float, seed: Optional[int] = None) -> np.ndarray:
+    """
+    Per-turn noise for probability_trajectories, shape (len(full_texts), max_turns).
+
+    With a seed, each row is drawn from a generator keyed on (seed, conversation
+    text), so a conversation always gets the same trajectory regardless of batch
+    composition or call order.
+    """
+    if seed is None:
+        return _trajectory_rng.uniform(-scale, scale, (len(full_texts), max_turns))
+    return np.stack([
+        np.random.default_rng([seed, zlib.crc32(text.encode('utf-8'))]).uniform(-scale, scale, max_turns)
+        for text in full_texts
+    ]).reshape(len(full_texts), max_turns)
+
+
+def probability_trajectories(
+    num_turns: np.ndarray,
+    engagement: np.ndarray,
+    effectiveness: np.ndarray,
+    engagement_trend: np.ndarray,
+    objection_level: np.ndarray,
+    noise: np.ndarray,
+    start: float = 0.15,
+    engagement_drift: bool = True
+) -> np.ndarray:
+    """
+    Heuristic conversion-probability trajectories for a batch of conversations.
+
+    All metric arguments have shape (B,), noise has shape (B, T) with T >= max(num_turns).
+    Returns a (B, T) float64 array with NaN past each conversation's length.
+    engagement_drift moves engagement by (trend - 0.5) * 0.05 after every turn.
+    """
+    num_turns = np.asarray(num_turns, dtype=np.int64)
+    batch, max_turns = noise.shape
+    turn = np.arange(max_turns, dtype=np.float64)[None, :]
+    trend = np.asarray(engagement_trend, dtype=np.float64)[:, None]
+
+    # Engagement drifts linearly with the trend; clipping a monotone sequence once is
+    # equivalent to clipping it at every step
+    drift = turn * (trend - 0.5) * 0.05 if engagement_drift else 0.0
+    engagement_t = np.clip(np.asarray(engagement, dtype=np.float64)[:, None] + drift, 0.0, 1.0)
+    turn_factor = (
+        (engagement_t - 0.5) * 0.2
+        + (np.asarray(effectiveness, dtype=np.float64)[:, None] - 0.5) * 0.15
+        - np.asarray(objection_level, dtype=np.float64)[:, None] * 0.25
+    )
+    ramp = 0.05 * turn / np.maximum(1, num_turns - 1)[:, None]
+    turn_factor = turn_factor + np.where(trend > 0.7, ramp, np.where(trend < 0.3, -ramp, 0.0))
+    step = np.clip(turn_factor, -0.15, 0.15) + noise
+
+    # The running probability is clipped after every step, so only the batch axis vectorizes
+    trajectories = np.empty((batch, max_turns), dtype=np.float64)
+    current = np.full(batch, start)
+    for t in range(max_turns):
+        current = np.clip(current + step[:, t], 0.05, 0.95)
+        trajectories[:, t] = current
+    trajectories[turn >= num_turns[:, None]] = np.nan
+    return trajectories
+
+
+def probability_trajectory_dicts(
+    num_turns: Sequence[int],
+    metrics: Sequence[Dict[str, Any]],
+    full_texts: Sequence[str],
+    seed: Optional[int] = None,
+    start: float = 0.15,
+    noise_scale: float = 0.03,
+    engagement_drift: bool = True
+) -> List[Dict[int, float]]:
+    """probability_trajectories for many conversations in the {turn: probability} form used in metrics"""
+    num_turns = np.asarray(num_turns, dtype=np.int64)
+    max_turns = int(num_turns.max()) if len(num_turns) else 0
+    if max_turns == 0:
+        return [{0: 0.5} for _ in num_turns]
+
+    trajectories = np.round(probability_trajectories(
+        num_turns,
+        np.array([m.get('customer_engagement', 0.5) for m in metrics]),
+        np.array([m.get('sales_effectiveness', 0.5) for m in metrics]),
+        np.array([m.get('engagement_trend', 0.5) for m in metrics]),
+        np.array([m.get('objection_count', 0.3) for m in metrics]),
+        trajectory_noise(full_texts, max_turns, noise_scale, seed),
+        start=start,
+        engagement_drift=engagement_drift
+    ), 4)
+    return [
+        dict(enumerate(row[:n].tolist())) if n > 0 else {0: 0.5}
+        for row, n in zip(trajectories, num_turns)
+    ]
+
+
 class CustomLN(BaseFeaturesExtractor):
     """Custom feature extractor matching training architecture"""
     
@@ -67,21 +199,246 @@ class CustomLN(BaseFeaturesExtractor):
         return self.linear_network(observations)
 
 
-def download_model(url: str, dest_path: str):
-    """Download model file with progress bar"""
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    total_size = int(response.headers.get('content-length', 0))
-    
-    with open(dest_path, 'wb') as f:
-        with tqdm(total=total_size, unit='B', unit_scale=True, desc="Downloading model") as pbar:
-            for chunk in response.iter_content(chunk_size=8192):
+MANIFEST_NAME = "manifest.json"
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# Network reads are written out as they arrive, so a dropped connection loses at most this much
+DOWNLOAD_READ_SIZE = 64 << 10
+_SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+
+
+class KeyedLocks:
+    """
+    One lock per key (e.g. conversation id), created on first use and dropped once no
+    thread holds or waits for it, so memory does not grow with the number of keys.
+
+        with locks.hold(conversation_id):
+            ...   # read-modify-write of that conversation's state
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[Any, list] = {}   # key -> [lock, holders and waiters]
+
+    @contextmanager
+    def hold(self, key: Any):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._locks)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on path across processes on this host (the file is created if missing)"""
+    with open(path, 'a+b') as f:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def sha256_file(path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(directory: str) -> Dict[str, Dict[str, Any]]:
+    """{file name: {'url', 'sha256', 'size'}} for the models in directory"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except FileNotFoundError:
+        return {}
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable model manifest {path}: {e}")
+        return {}
+
+
+def write_manifest_entry(path: str, entry: Dict[str, Any]) -> None:
+    """Record (atomically) entry for the model file at path in its directory's manifest"""
+    directory = os.path.dirname(path)
+    files = read_manifest(directory)
+    files[os.path.basename(path)] = entry
+    tmp_path = os.path.join(directory, f".{MANIFEST_NAME}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'files': files}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+
+def model_file_ready(path: str) -> bool:
+    """
+    Cheap completeness check for a model file: present, of the size recorded in the
+    manifest (if any) and, for zips, with a readable central directory, which a
+    truncated download lacks.
+    """
+    if not os.path.isfile(path):
+        return False
+    entry = read_manifest(os.path.dirname(os.path.abspath(path))).get(os.path.basename(path))
+    if entry and entry.get('size') is not None and os.path.getsize(path) != entry['size']:
+        return False
+    if path.lower().endswith('.zip') and not zipfile.is_zipfile(path):
+        return False
+    return True
+
+
+def download_model(
+    url: str,
+    dest_path: str,
+    sha256: Optional[str] = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    max_retries: int = 5,
+    timeout: float = 30.0
+) -> str:
+    """
+    Download a model file with progress bar. Safe to interrupt and to run from several
+    processes at once:
+
+    - data goes to dest_path + '.part' and is renamed into place only once verified,
+      so dest_path never holds a truncated file
+    - an existing .part is resumed with an HTTP Range request (also on connection
+      errors mid-download, up to max_retries times)
+    - the SHA-256 is checked against sha256, else the manifest entry for dest_path,
+      else the hash the server publishes (Hugging Face X-Linked-Etag); the result is
+      recorded in the manifest next to dest_path
+    - a lock file serializes workers, and later ones find the verified file and return
+    """
+    dest_path = os.path.abspath(os.path.expanduser(dest_path))
+    directory = os.path.dirname(dest_path)
+    os.makedirs(directory, exist_ok=True)
+
+    with file_lock(dest_path + ".lock"):
+        entry = read_manifest(directory).get(os.path.basename(dest_path), {})
+        expected = (sha256 or entry.get('sha256') or '').lower() or None
+        if os.path.exists(dest_path):
+            if expected is None and model_file_ready(dest_path):
+                return dest_path
+            if expected is not None and sha256_file(dest_path, chunk_size) == expected:
+                return dest_path
+            logger.warning(f"{dest_path} is incomplete or does not match its checksum. Downloading again.")
+
+        part_path = dest_path + ".part"
+        # A .part left by an earlier process may belong to another version of the file;
+        # if the resumed result fails verification, start over once from scratch
+        stale_part_possible = os.path.exists(part_path)
+        while True:
+            published = _fetch_with_retries(url, part_path, chunk_size, timeout, max_retries)
+            expected = expected or published
+            actual = sha256_file(part_path, chunk_size)
+            if expected is None or actual == expected:
+                break
+            os.remove(part_path)
+            if not stale_part_possible:
+                raise ValueError(f"Checksum mismatch for {url}: expected sha256 {expected}, got {actual}")
+            logger.warning(f"Resumed download of {url} failed verification. Downloading from scratch.")
+            stale_part_possible = False
+        if expected is None:
+            logger.warning(f"No checksum known for {url}; recording sha256 {actual} without verification.")
+
+        os.replace(part_path, dest_path)
+        write_manifest_entry(dest_path, {'url': url, 'sha256': actual, 'size': os.path.getsize(dest_path)})
+        return dest_path
+
+
+def _fetch_with_retries(url: str, part_path: str, chunk_size: int, timeout: float, max_retries: int) -> Optional[str]:
+    attempt = 0
+    while True:
+        try:
+            return _fetch(url, part_path, chunk_size, timeout)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = min(2 ** attempt, 30)
+            logger.warning(f"Download of {url} interrupted ({e}). Resuming in {delay}s ({attempt}/{max_retries}).")
+            time.sleep(delay)
+
+
+def _fetch(url: str, part_path: str, chunk_size: int, timeout: float) -> Optional[str]:
+    """Download (or resume) url into part_path; returns the SHA-256 the server publishes, if any"""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+    with requests.get(url, stream=True, headers=headers, timeout=timeout) as response:
+        published = _published_sha256(response)
+        if response.status_code == 416:
+            # Range starts at or past the end: the part is complete, or stale if longer
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit() and int(total) == offset:
+                return published
+            os.remove(part_path)
+            raise requests.ConnectionError(f"Stale partial download ({offset} bytes); restarting")
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            logger.info(f"Server ignored the Range request for {url}; restarting the download.")
+            offset = 0
+
+        total_size = offset + int(response.headers.get('content-length', 0))
+        with open(part_path, 'ab' if offset else 'wb') as f, \
+                tqdm(total=total_size or None, initial=offset, unit='B', unit_scale=True, desc="Downloading model") as pbar:
+            for chunk in response.iter_content(chunk_size=min(chunk_size, DOWNLOAD_READ_SIZE)):
                 f.write(chunk)
                 pbar.update(len(chunk))
 
+    if total_size > offset and os.path.getsize(part_path) < total_size:
+        raise requests.ConnectionError(f"Connection closed after {os.path.getsize(part_path)} of {total_size} bytes")
+    return published
+
+
+def _published_sha256(response: requests.Response) -> Optional[str]:
+    # Hugging Face sends the LFS object's SHA-256 on the redirect to its CDN. A plain
+    # ETag is an opaque version tag; even 64 hex digits need not be the file's hash
+    for r in list(response.history) + [response]:
+        value = r.headers.get('X-Linked-Etag', '').strip().strip('"').lower()
+        if _SHA256_HEX.match(value):
+            return value
+    return None
+
+
+# Map of accepted speaker/role names to the two canonical speakers
+SPEAKER_ALIASES = {
+    'user': 'customer',
+    'customer': 'customer',
+    'assistant': 'sales_rep',
+    'sales_rep': 'sales_rep',
+    'agent': 'sales_rep',
+    'bot': 'sales_rep',
+    'model': 'sales_rep',
+}
+
 
 def normalize_conversation(history: List[Dict[str, str]]) -> List[Dict[str, str]]:
     """Normalize conversation format"""
@@ -93,14 +450,9 @@ def normalize_conversation(history: List[Dict[str, str]]) -> List[Dict[str, str]
         message = msg.get('message', msg.get('content', ''))
         
         # Map to standard speakers
-        if speaker in ['user', 'customer']:
-            speaker = 'customer'
-        elif speaker in ['assistant', 'sales_rep', 'agent', 'bot', 'model']:
-            speaker = 'sales_rep'
-        
         normalized.append({
-            'speaker': speaker,
+            'speaker': SPEAKER_ALIASES.get(speaker, speaker),
             'message': message
         })
     
-    return normalized
\ No newline at end of file
+    return normalized
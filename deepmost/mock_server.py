@@ -0,0 +1,368 @@
+"""
+Local OpenAI-compatible mock server for load-testing the remote backends.
+
+Implements the embeddings and chat completions endpoints in both the OpenAI
+(`/v1/embeddings`, `/v1/chat/completions`) and Azure
+(`/openai/deployments/<name>/embeddings`, `.../chat/completions`) URL layouts, with
+configurable latency distributions, 429 injection, deterministic embeddings and
+canned JSON metrics for analysis prompts. With files_dir set, `/files/<name>` also
+serves model files (with Range requests and an X-Linked-Etag SHA-256, like Hugging
+Face) for testing downloads; file_drop_after cuts each file response after that
+many bytes to simulate interrupted transfers.
+
+    deepmost mock-server --port 8089 --embedding-latency lognormal:40,0.5 --rate-limit-rpm 600
+
+    agent = sales.Agent(openai_api_key="mock", openai_base_url="http://127.0.0.1:8089/v1",
+                        openai_chat_model="mock-chat")
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CANNED_METRICS = {
+    "customer_engagement": 0.62,
+    "sales_effectiveness": 0.58,
+    "conversation_style": "direct_professional",
+    "conversation_flow": "standard_linear",
+    "communication_channel": "chat",
+    "primary_customer_needs": ["efficiency", "reporting"],
+    "engagement_trend": 0.55,
+    "objection_count": 0.2,
+    "value_proposition_mentions": 0.4,
+    "technical_depth": 0.3,
+    "urgency_level": 0.3,
+    "competitive_context": 0.1,
+    "pricing_sensitivity": 0.4,
+    "decision_authority_signals": 0.5,
+}
+
+CANNED_REPLY = (
+    "Thanks for sharing that. Our platform automates lead scoring and follow-ups, "
+    "and most teams see value within the first month. Would a short demo this week help?"
+)
+
+
+def deterministic_embedding(text: str, dim: int) -> np.ndarray:
+    """Unit-norm float32 pseudo-embedding that only depends on the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class LatencyDistribution:
+    """
+    Latency in milliseconds parsed from a spec string:
+    'fixed:50', 'uniform:20,80', 'normal:50,10', 'lognormal:50,0.5' (median, sigma)
+    or 'exp:50' (mean).
+    """
+
+    def __init__(self, spec: str = "fixed:0", seed: int = 0):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def sample_seconds(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                ms = self.params[0] if self.params else 0.0
+            elif self.kind == "uniform":
+                ms = self._rng.uniform(self.params[0], self.params[1])
+            elif self.kind == "normal":
+                ms = self._rng.normal(self.params[0], self.params[1])
+            elif self.kind == "lognormal":
+                ms = self.params[0] * self._rng.lognormal(0.0, self.params[1])
+            else:
+                ms = self._rng.exponential(self.params[0])
+        return max(0.0, float(ms)) / 1000.0
+
+
+@dataclass
+class MockServerConfig:
+    """Behaviour of the mock server. Latency specs follow LatencyDistribution."""
+    embedding_dim: int = 3072
+    embedding_latency: str = "fixed:20"
+    chat_latency: str = "fixed:100"
+    ms_per_output_token: float = 5.0
+    rate_limit_rpm: Optional[int] = None
+    rate_limit_probability: float = 0.0
+    retry_after: float = 1.0
+    metrics: Dict[str, Any] = field(default_factory=lambda: dict(CANNED_METRICS))
+    reply: str = CANNED_REPLY
+    seed: int = 0
+    files_dir: Optional[str] = None
+    file_drop_after: Optional[int] = None
+
+
+class _RateLimiter:
+    """Fixed one-minute window request counter plus random 429 injection"""
+
+    def __init__(self, config: MockServerConfig):
+        self.config = config
+        self._rng = np.random.default_rng(config.seed + 1)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._count = 0
+
+    def check(self) -> Optional[float]:
+        """Return a Retry-After value if this request should get a 429"""
+        with self._lock:
+            if self.config.rate_limit_probability and self._rng.random() < self.config.rate_limit_probability:
+                return self.config.retry_after
+            if self.config.rate_limit_rpm:
+                now = time.monotonic()
+                if now - self._window_start >= 60.0:
+                    self._window_start = now
+                    self._count = 0
+                if self._count >= self.config.rate_limit_rpm:
+                    return max(0.0, 60.0 - (now - self._window_start))
+                self._count += 1
+        return None
+
+
+def _is_metrics_request(messages: List[Dict[str, Any]]) -> bool:
+    return any("JSON" in str(m.get('content', '')) for m in messages)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockOpenAIServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("mock-server: " + format, *args)
+
+    def _route(self) -> Optional[str]:
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/embeddings"):
+            return "embeddings"
+        if path.endswith("/chat/completions"):
+            return "chat"
+        return None
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/stats"):
+            self._send_json(200, self.server.stats())
+        elif self.path.startswith("/files/") and self.server.config.files_dir:
+            self._handle_file(self.path.split("?", 1)[0][len("/files/"):])
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        route = self._route()
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if route is None:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        retry_after = self.server.rate_limiter.check()
+        if retry_after is not None:
+            self.server.count("rate_limited")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": f"{retry_after:.3f}", "x-ratelimit-remaining-requests": "0"}
+            )
+            return
+
+        if route == "embeddings":
+            self.server.count("embeddings")
+            self._handle_embeddings(body)
+        else:
+            self.server.count("chat")
+            self._handle_chat(body)
+
+    def _handle_file(self, name: str) -> None:
+        path = os.path.join(self.server.config.files_dir, os.path.basename(name))
+        if not os.path.isfile(path):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        self.server.count("files")
+        with open(path, "rb") as f:
+            data = f.read()
+        size = len(data)
+        headers = {"Accept-Ranges": "bytes", "X-Linked-Etag": f'"{hashlib.sha256(data).hexdigest()}"'}
+
+        start, status = 0, 200
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("X-Linked-Etag", headers["X-Linked-Etag"])
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{size - 1}/{size}"
+
+        body = data[start:]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        drop_after = self.server.config.file_drop_after
+        if drop_after is not None and drop_after < len(body):
+            self.wfile.write(body[:drop_after])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def _handle_embeddings(self, body: Dict[str, Any]) -> None:
+        config = self.server.config
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        dim = int(body.get("dimensions") or config.embedding_dim)
+        time.sleep(self.server.embedding_latency.sample_seconds())
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = deterministic_embedding(str(text), dim)
+            if body.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(len(str(text).split()) for text in inputs)
+        self._send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "mock-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def _handle_chat(self, body: Dict[str, Any]) -> None:
+        config = self.server.config
+        messages = body.get("messages", [])
+        if _is_metrics_request(messages):
+            content = json.dumps(config.metrics)
+            tokens = [content]
+            n_tokens = len(content) // 4
+        else:
+            words = config.reply.split(" ")[:int(body.get("max_tokens") or 200)]
+            tokens = [w if i == 0 else " " + w for i, w in enumerate(words)]
+            n_tokens = len(tokens)
+
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens}
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "mock-chat")}
+        time.sleep(self.server.chat_latency.sample_seconds())
+
+        if not body.get("stream"):
+            time.sleep(n_tokens * config.ms_per_output_token / 1000.0)
+            self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop"
+            }]))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        per_chunk = n_tokens * config.ms_per_output_token / 1000.0 / max(1, len(tokens))
+        for token in tokens:
+            time.sleep(per_chunk)
+            chunk = dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "delta": {"content": token}, "finish_reason": None
+            }])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        final = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Threaded HTTP server; use start()/stop() to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[MockServerConfig] = None):
+        super().__init__((host, port), _Handler)
+        self.config = config or MockServerConfig()
+        self.embedding_latency = LatencyDistribution(self.config.embedding_latency, self.config.seed)
+        self.chat_latency = LatencyDistribution(self.config.chat_latency, self.config.seed + 2)
+        self.rate_limiter = _RateLimiter(self.config)
+        self._counts: Dict[str, int] = {"embeddings": 0, "chat": 0, "rate_limited": 0, "files": 0}
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str) -> None:
+        with self._counts_lock:
+            self._counts[key] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="deepmost-mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8089, config: Optional[MockServerConfig] = None) -> None:
+    """Run the mock server in the foreground until interrupted"""
+    server = MockOpenAIServer(host, port, config)
+    print(f"DeepMost mock OpenAI server listening on {server.url} "
+          f"(OpenAI base_url: {server.url}/v1, Azure endpoint: {server.url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -3,9 +3,16 @@
 import os
 import sys
 import logging
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Union, Iterator, Any
+from .core.clients import HTTPPool, RateLimiter
 from .core.predictor import SalesPredictor
-from .core.utils import download_model
+from .core.bundle import load_bundle
+from .core.cascade import CascadePolicy
+from .core.compaction import HistoryCompactor
+from .core.metrics_head import MetricsHead
+from .core.refresh import MetricsRefreshPolicy
+from .core.resources import CPUBudget
+from .core.utils import download_model, model_file_ready, normalize_conversation
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -37,6 +44,16 @@ def _get_default_model_info(backend_type: str = "opensource"):
         return OPENSOURCE_MODEL_URL, OPENSOURCE_MODEL_PATH
 
 
+def _to_message_dicts(conversation: Union[List[Dict[str, str]], List[str]]) -> List[Dict[str, str]]:
+    """Convert any supported conversation format to speaker/message dicts"""
+    if conversation and isinstance(conversation[0], str):
+        return [
+            {"speaker": "customer" if i % 2 == 0 else "sales_rep", "message": msg}
+            for i, msg in enumerate(conversation)
+        ]
+    return normalize_conversation(conversation)
+
+
 class Agent:
     """Sales prediction agent with support for three backends: open-source, Azure OpenAI, and standard OpenAI"""
     
@@ -53,12 +70,30 @@ class Agent:
         openai_api_key: Optional[str] = None,
         openai_embedding_model: str = "text-embedding-3-large",
         openai_chat_model: Optional[str] = None,
+        openai_base_url: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        http_pool: Optional[HTTPPool] = None,
         # Open-source parameters
         embedding_model: str = "BAAI/bge-m3",
         llm_model: Optional[str] = None,
         use_gpu: bool = True,
         auto_download: bool = True,
-        force_backend: Optional[str] = None
+        force_backend: Optional[str] = None,
+        trajectory_seed: Optional[int] = None,
+        compute_trajectory: bool = True,
+        metrics_source: str = "llm",
+        metrics_head: Optional[Union[str, MetricsHead]] = None,
+        metrics_log_path: Optional[str] = None,
+        embedding_backend: Optional[str] = None,
+        metrics_backend: Optional[str] = None,
+        response_backend: Optional[str] = None,
+        source_concurrency: Optional[Dict[str, int]] = None,
+        metrics_refresh: Optional[MetricsRefreshPolicy] = None,
+        cascade: Optional[CascadePolicy] = None,
+        history_compactor: Optional[HistoryCompactor] = None,
+        model_bundle: Optional[str] = None,
+        offline: bool = False,
+        cpu_budget: Optional[CPUBudget] = None
     ):
         """
         Initialize the sales agent with support for three backends.
@@ -83,6 +118,12 @@ class Agent:
             openai_api_key: Standard OpenAI API key
             openai_embedding_model: OpenAI embedding model (default: "text-embedding-3-large")
             openai_chat_model: OpenAI chat model (e.g., "gpt-4o", "gpt-4o-mini")
+            openai_base_url: Alternative OpenAI-compatible endpoint (e.g. a proxy or `deepmost mock-server`)
+            
+            # Remote backends (Azure / OpenAI)
+            rate_limiter: Shared RateLimiter applying RPM/TPM quotas, retries with backoff,
+                bounded concurrency and a circuit breaker to every API call
+            http_pool: HTTPPool to send requests through (default: the process-wide shared pool)
             
             # Open-source Backend
             embedding_model: HuggingFace model name for embeddings (default: "BAAI/bge-m3")
@@ -92,7 +133,46 @@ class Agent:
             # General
             auto_download: Whether to auto-download model if not found
             force_backend: Force specific backend ('azure', 'openai', 'opensource')
+            trajectory_seed: Seed for the probability_trajectory noise; the same conversation
+                then always gets the same trajectory
+            compute_trajectory: Set False to skip computing metrics['probability_trajectory']
+            metrics_source: 'llm' (default) or 'head' to estimate the LLM metrics from the
+                embedding with a distilled MetricsHead (see `deepmost metrics-head train`)
+            metrics_head: Path to a trained MetricsHead (or a MetricsHead instance)
+            metrics_log_path: Append (embedding, LLM metrics) pairs to this JSONL file for training
+            
+            # Hybrid backends
+            embedding_backend / metrics_backend / response_backend: Run that stage on another
+                backend ('azure', 'openai', 'opensource'), e.g. local bge-m3 embeddings with
+                OpenAI metrics and responses. The PPO model is chosen by the embedding backend.
+            source_concurrency: Max in-flight calls per stage, e.g. {'metrics': 4, 'response': 8}
+            metrics_refresh: MetricsRefreshPolicy reusing a conversation's LLM metrics across
+                turns until enough turns, embedding drift or a trigger keyword call for a refresh
+            cascade: CascadePolicy scoring with keyword-heuristic metrics first and calling
+                the LLM metrics only when the probability lands near a status threshold
+            history_compactor: HistoryCompactor keeping the conversation in metric and response
+                prompts within a token budget, older turns replaced by a rolling summary
+            
+            # Air-gapped / fast-starting deployments
+            model_bundle: Directory from `deepmost models pull` (default: $DEEPMOST_MODEL_BUNDLE).
+                Its PPO model, encoder and GGUF LLM are used and offline is implied.
+            offline: Never touch the network for models: no auto-download, HuggingFace
+                models and GGUF repos only from local files or the local cache
+            cpu_budget: CPUBudget dividing cores between worker processes, the encoder's
+                torch threads and llama.cpp's threads (None: each library picks its own)
         """
+        model_bundle = model_bundle or os.getenv("DEEPMOST_MODEL_BUNDLE")
+        if model_bundle:
+            bundle = load_bundle(model_bundle)
+            logger.info(f"Loading models from bundle {model_bundle}")
+            model_path = model_path or bundle['ppo_model']
+            embedding_model = bundle.get('embedding_model', embedding_model)
+            llm_model = bundle.get('llm_model', llm_model)
+            force_backend = force_backend or bundle['backend']
+            offline = True
+        if offline:
+            auto_download = False
+
         # Determine backend
         if force_backend:
             self.backend_type = force_backend.lower()
@@ -106,12 +186,15 @@ class Agent:
             self.backend_type = 'opensource'
         
         logger.info(f"Using {self.backend_type} backend")
+        hybrid = any([embedding_backend, metrics_backend, response_backend, source_concurrency])
+        # The PPO model's input size follows the embedding source
+        model_backend = (embedding_backend or self.backend_type).lower()
         
         # Handle model path
         if model_path is None:
-            model_url, model_path = _get_default_model_info(self.backend_type)
-            if not os.path.exists(model_path) and auto_download:
-                print(f"Downloading {self.backend_type} model to {model_path}...")
+            model_url, model_path = _get_default_model_info(model_backend)
+            if not model_file_ready(model_path) and auto_download:
+                print(f"Downloading {model_backend} model to {model_path}...")
                 download_model(model_url, model_path)
         elif model_path.startswith(('http://', 'https://')):
             # Handle URL: download to local cache
@@ -119,7 +202,7 @@ class Agent:
             url_hash = hashlib.md5(model_path.encode()).hexdigest()[:8]
             local_model_path = os.path.expanduser(f"~/.deepmost/models/downloaded_{url_hash}.zip")
             
-            if not os.path.exists(local_model_path) and auto_download:
+            if not model_file_ready(local_model_path) and auto_download:
                 print(f"Downloading model from URL to {local_model_path}...")
                 download_model(model_path, local_model_path)
             elif not os.path.exists(local_model_path):
@@ -128,7 +211,40 @@ class Agent:
             model_path = local_model_path
         
         # Initialize predictor with appropriate backend
-        if self.backend_type == 'azure':
+        if hybrid:
+            self.predictor = SalesPredictor(
+                model_path=model_path,
+                azure_api_key=azure_api_key,
+                azure_endpoint=azure_endpoint,
+                azure_deployment=azure_deployment,
+                azure_chat_deployment=azure_chat_deployment,
+                azure_api_version=azure_api_version,
+                openai_api_key=openai_api_key,
+                openai_embedding_model=openai_embedding_model,
+                openai_chat_model=openai_chat_model,
+                openai_base_url=openai_base_url,
+                rate_limiter=rate_limiter,
+                http_pool=http_pool,
+                embedding_model=embedding_model,
+                llm_model=llm_model,
+                use_gpu=use_gpu,
+                local_files_only=offline,
+                trajectory_seed=trajectory_seed,
+                compute_trajectory=compute_trajectory,
+                metrics_source=metrics_source,
+                metrics_head=metrics_head,
+                metrics_log_path=metrics_log_path,
+                metrics_refresh=metrics_refresh,
+                cascade=cascade,
+                history_compactor=history_compactor,
+                cpu_budget=cpu_budget,
+                embedding_backend=model_backend,
+                metrics_backend=(metrics_backend or self.backend_type).lower(),
+                response_backend=(response_backend or self.backend_type).lower(),
+                source_concurrency=source_concurrency
+            )
+            self.backend_type = self.predictor.backend_type
+        elif self.backend_type == 'azure':
             self.predictor = SalesPredictor(
                 model_path=model_path,
                 azure_api_key=azure_api_key,
@@ -136,7 +252,19 @@ class Agent:
                 azure_deployment=azure_deployment,
                 azure_chat_deployment=azure_chat_deployment,
                 azure_api_version=azure_api_version,
-                use_gpu=use_gpu
+                rate_limiter=rate_limiter,
+                http_pool=http_pool,
+                use_gpu=use_gpu,
+                local_files_only=offline,
+                trajectory_seed=trajectory_seed,
+                compute_trajectory=compute_trajectory,
+                metrics_source=metrics_source,
+                metrics_head=metrics_head,
+                metrics_log_path=metrics_log_path,
+                metrics_refresh=metrics_refresh,
+                cascade=cascade,
+                history_compactor=history_compactor,
+                cpu_budget=cpu_budget
             )
         elif self.backend_type == 'openai':
             self.predictor = SalesPredictor(
@@ -144,14 +272,37 @@ class Agent:
                 openai_api_key=openai_api_key,
                 openai_embedding_model=openai_embedding_model,
                 openai_chat_model=openai_chat_model,
-                use_gpu=use_gpu
+                openai_base_url=openai_base_url,
+                rate_limiter=rate_limiter,
+                http_pool=http_pool,
+                use_gpu=use_gpu,
+                local_files_only=offline,
+                trajectory_seed=trajectory_seed,
+                compute_trajectory=compute_trajectory,
+                metrics_source=metrics_source,
+                metrics_head=metrics_head,
+                metrics_log_path=metrics_log_path,
+                metrics_refresh=metrics_refresh,
+                cascade=cascade,
+                history_compactor=history_compactor,
+                cpu_budget=cpu_budget
             )
         else:  # opensource
             self.predictor = SalesPredictor(
                 model_path=model_path,
                 embedding_model=embedding_model,
                 llm_model=llm_model,
-                use_gpu=use_gpu
+                use_gpu=use_gpu,
+                local_files_only=offline,
+                trajectory_seed=trajectory_seed,
+                compute_trajectory=compute_trajectory,
+                metrics_source=metrics_source,
+                metrics_head=metrics_head,
+                metrics_log_path=metrics_log_path,
+                metrics_refresh=metrics_refresh,
+                cascade=cascade,
+                history_compactor=history_compactor,
+                cpu_budget=cpu_budget
             )
     
     def predict(
@@ -172,13 +323,7 @@ class Agent:
             Dict with 'probability' and other metrics
         """
         # Normalize conversation format
-        if conversation and isinstance(conversation[0], str):
-            # Convert list of strings to list of dicts
-            normalized = []
-            for i, msg in enumerate(conversation):
-                speaker = "customer" if i % 2 == 0 else "sales_rep"
-                normalized.append({"speaker": speaker, "message": msg})
-            conversation = normalized
+        conversation = _to_message_dicts(conversation)
         
         # Generate conversation ID if not provided
         if conversation_id is None:
@@ -193,6 +338,84 @@ class Agent:
         
         return result
     
+    def predict_batch(
+        self,
+        conversations: List[Union[List[Dict[str, str]], List[str]]]
+    ) -> List[Dict[str, float]]:
+        """
+        Predict conversion probability for many independent conversations at once.
+        
+        Embeddings and PPO inference are batched, and no per-conversation state is
+        kept, which makes this the preferred entry point for offline re-scoring.
+        
+        Args:
+            conversations: List of conversations, each in any format accepted by predict
+        
+        Returns:
+            List of result dicts in the same order as the input
+        """
+        return self.predictor.predict_conversions_batch(
+            [_to_message_dicts(conversation) for conversation in conversations]
+        )
+    
+    def enable_profiling(
+        self,
+        output_dir: str = "~/.deepmost/profiles",
+        sample_rate: float = 0.01,
+        mode: str = "cprofile",
+        max_files: int = 50
+    ):
+        """
+        Capture a profile of a sampled fraction of prediction calls.
+        
+        Args:
+            output_dir: Directory for the traces; only the newest max_files are kept
+            sample_rate: Fraction of calls to profile (1.0 profiles every call)
+            mode: 'cprofile' (.prof files for pstats/snakeviz) or 'torch'
+                  (torch.profiler Chrome traces, including CUDA kernels)
+            max_files: Number of traces to keep in output_dir
+        
+        Returns:
+            The Profiler; its stats() reports how many traces were written
+        """
+        return self.predictor.enable_profiling(output_dir, sample_rate, mode, max_files)
+    
+    def disable_profiling(self):
+        """Stop profiling; prediction calls return to the unprofiled path"""
+        self.predictor.disable_profiling()
+
+    def warmup(self, shapes=None, response: bool = False) -> Dict[str, Any]:
+        """
+        Run dummy passes through every configured stage so the first real request
+        runs at steady-state speed.
+
+        Args:
+            shapes: Embedding input shapes to warm up: sequence lengths in tokens, or
+                    (batch_size, sequence_length) tuples. Default: 16, 128 and 512
+                    tokens plus a batch of 8 x 128
+            response: Also generate a dummy response (costs LLM tokens)
+
+        Returns:
+            {'ready', 'total_s', 'stages': {step: seconds}, 'errors': {step: message}}
+        """
+        return self.predictor.warmup(shapes=shapes, response=response)
+
+    @property
+    def ready(self) -> bool:
+        """True once warmup() has completed without errors (for readiness probes)"""
+        return self.predictor.ready
+
+    def prepare_for_fork(self) -> Dict[str, Any]:
+        """
+        Make the loaded models shareable by worker processes forked after this call
+        (preload-then-fork serving, e.g. gunicorn --preload or `deepmost score --workers`).
+
+        Returns:
+            MB of weights shared through memory-mapped files and through shared memory
+        """
+        from .core.forking import prepare_for_fork
+        return prepare_for_fork(self.predictor)
+
     def analyze_conversation_progression(
         self,
         conversation: Union[List[Dict[str, str]], List[str]],
@@ -211,12 +434,7 @@ class Agent:
             List of dicts with turn-by-turn analysis results
         """
         # Normalize conversation format
-        if conversation and isinstance(conversation[0], str):
-            normalized = []
-            for i, msg in enumerate(conversation):
-                speaker = "customer" if i % 2 == 0 else "sales_rep"
-                normalized.append({"speaker": speaker, "message": msg})
-            conversation = normalized
+        conversation = _to_message_dicts(conversation)
         
         if conversation_id is None:
             import uuid
@@ -283,12 +501,7 @@ class Agent:
             Dict with 'response' and 'prediction' keys
         """
         # Normalize conversation format
-        if conversation and isinstance(conversation[0], str):
-            normalized = []
-            for i, msg in enumerate(conversation):
-                speaker = "customer" if i % 2 == 0 else "sales_rep"
-                normalized.append({"speaker": speaker, "message": msg})
-            conversation = normalized
+        conversation = _to_message_dicts(conversation)
         
         if conversation_id is None:
             import uuid
@@ -301,6 +514,47 @@ class Agent:
             system_prompt=system_prompt
         )
 
+    def predict_with_response_stream(
+        self,
+        conversation: Union[List[Dict[str, str]], List[str]],
+        user_input: str,
+        conversation_id: Optional[str] = None,
+        system_prompt: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a sales response token by token, then predict conversion probability.
+        
+        Args:
+            conversation: Conversation history
+            user_input: Latest user message
+            conversation_id: Optional conversation ID
+            system_prompt: Optional system prompt for LLM
+        
+        Yields:
+            {'type': 'token', 'text': ...} events as the response is generated,
+            then one {'type': 'prediction', 'response': ..., 'prediction': ...} event
+        
+        Example:
+            for event in agent.predict_with_response_stream(history, "What does it cost?"):
+                if event['type'] == 'token':
+                    print(event['text'], end='', flush=True)
+                else:
+                    print(f"\nProbability: {event['prediction']['probability']:.2%}")
+        """
+        # Normalize conversation format
+        conversation = _to_message_dicts(conversation)
+        
+        if conversation_id is None:
+            import uuid
+            conversation_id = str(uuid.uuid4())
+        
+        return self.predictor.generate_response_and_predict_stream(
+            conversation_history=conversation,
+            user_input=user_input,
+            conversation_id=conversation_id,
+            system_prompt=system_prompt
+        )
+
 
 # Convenience function for quick predictions
 def predict(conversation: Union[List[Dict[str, str]], List[str]], **kwargs) -> float:
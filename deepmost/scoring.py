@@ -0,0 +1,314 @@
+"""Bulk scoring of conversation archives streamed from JSONL"""
+
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def read_records(stream: IO[str]) -> Iterator[Tuple[int, str]]:
+    """Yield (line_number, raw_line) for every non-blank line of a JSONL stream"""
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield line_number, line
+
+
+def parse_record(line_number: int, line: str) -> Tuple[str, Any]:
+    """Parse one JSONL record into (conversation_id, conversation).
+
+    Accepted shapes: {"conversation_id"|"id": ..., "conversation"|"messages": [...]}
+    or a bare list of messages.
+    """
+    record = json.loads(line)
+    if isinstance(record, list):
+        return str(line_number), record
+    conversation_id = record.get('conversation_id', record.get('id', line_number))
+    conversation = record.get('conversation', record.get('messages'))
+    if not isinstance(conversation, list):
+        raise ValueError("record has no 'conversation' or 'messages' list")
+    return str(conversation_id), conversation
+
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most size items without materializing it"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ScoringCheckpoint:
+    """Progress marker written next to the output so a killed job can resume.
+
+    Stores how many input records have been fully written and the output size at
+    that point. On resume the output is truncated back to that size, which drops a
+    partially written batch.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, input_path: str, records_done: int, output_offset: int) -> None:
+        state = {
+            'input': os.path.abspath(input_path) if input_path != '-' else '-',
+            'records_done': records_done,
+            'output_offset': output_offset,
+            'updated_at': time.time()
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ThroughputMeter:
+    """Running conversations/s and tokens/s counters.
+
+    Tokens are counted as whitespace-separated words, which keeps the meter
+    independent of the backend's tokenizer.
+    """
+
+    def __init__(self, report_interval: float = 10.0, stream: IO[str] = sys.stderr):
+        self.report_interval = report_interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.conversations = 0
+        self.tokens = 0
+        self.errors = 0
+
+    def update(self, conversations: int, tokens: int, errors: int = 0) -> None:
+        self.conversations += conversations
+        self.tokens += tokens
+        self.errors += errors
+        now = time.perf_counter()
+        if self.report_interval and now - self.last_report >= self.report_interval:
+            self.last_report = now
+            self.report()
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return {
+            'conversations': self.conversations,
+            'tokens': self.tokens,
+            'errors': self.errors,
+            'elapsed_s': elapsed,
+            'conversations_per_s': self.conversations / elapsed,
+            'tokens_per_s': self.tokens / elapsed
+        }
+
+    def report(self) -> None:
+        stats = self.summary()
+        print(
+            f"[deepmost score] {stats['conversations']} conversations "
+            f"({stats['errors']} errors) in {stats['elapsed_s']:.1f}s - "
+            f"{stats['conversations_per_s']:.1f} conv/s, {stats['tokens_per_s']:.0f} tokens/s",
+            file=self.stream,
+            flush=True
+        )
+
+
+def _count_tokens(conversation: List[Any]) -> int:
+    total = 0
+    for msg in conversation:
+        text = msg if isinstance(msg, str) else msg.get('message', msg.get('content', ''))
+        total += len(text.split())
+    return total
+
+
+def _score_batch(agent, batch: List[Tuple[int, str]], include_metrics: bool) -> Tuple[List[Dict[str, Any]], int, int]:
+    parsed = []
+    tokens = 0
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+    for i, (line_number, line) in enumerate(batch):
+        try:
+            conversation_id, conversation = parse_record(line_number, line)
+            # Also rejects messages that are neither strings nor dicts with text
+            record_tokens = _count_tokens(conversation)
+        except (ValueError, AttributeError, TypeError) as e:
+            rows[i] = {'line': line_number, 'error': f"invalid record: {e}"}
+            continue
+        parsed.append((i, conversation_id, conversation))
+        tokens += record_tokens
+
+    try:
+        results = agent.predict_batch([conversation for _, _, conversation in parsed])
+    except Exception as e:
+        # Isolate the failing record(s) instead of losing the whole batch
+        logger.warning(f"Batch prediction failed ({e}); scoring records individually.")
+        results = []
+        for _, conversation_id, conversation in parsed:
+            try:
+                results.append(agent.predict_batch([conversation])[0])
+            except Exception as record_error:
+                results.append({'error': str(record_error)})
+
+    for (i, conversation_id, _), result in zip(parsed, results):
+        if 'error' in result:
+            rows[i] = {'conversation_id': conversation_id, 'error': result['error']}
+            continue
+        row = {
+            'conversation_id': conversation_id,
+            'probability': result['probability'],
+            'status': result['status'],
+            'turn': result['turn'],
+            'suggested_action': result['suggested_action'],
+            'backend': result['backend']
+        }
+        if include_metrics:
+            row['metrics'] = result['metrics']
+        rows[i] = row
+
+    errors = sum(1 for row in rows if 'error' in row)
+    return rows, tokens, errors
+
+
+# Agent inherited by forked scoring workers (set in the parent before forking)
+_worker_agent = None
+
+
+def _score_in_worker(batch: List[Tuple[int, str]], include_metrics: bool) -> Tuple[List[Dict[str, Any]], int, int, int]:
+    rows, tokens, errors = _score_batch(_worker_agent, batch, include_metrics)
+    return rows, tokens, errors, os.getpid()
+
+
+def _scored_batches(agent, batches: Iterable[List[Tuple[int, str]]], include_metrics: bool, workers: int, memory: Dict[str, Any]):
+    """Yield (batch, rows, tokens, errors) in input order, scored in-process or by forked workers"""
+    if workers <= 1:
+        for batch in batches:
+            yield (batch, *_score_batch(agent, batch, include_metrics))
+        return
+
+    global _worker_agent
+    from .core.forking import fork_pool, prepare_for_fork, process_memory
+
+    prepare_for_fork(agent.predictor)
+    _worker_agent = agent
+    memory['parent'] = process_memory()
+    pids = set()
+    cpu_plan = agent.predictor.cpu_plan
+    if cpu_plan is not None and cpu_plan.workers != workers:
+        logger.warning(f"CPU plan is sized for {cpu_plan.workers} workers, scoring with {workers}")
+    pool = fork_pool(workers, cpu_plan=cpu_plan, predictor=agent.predictor)
+    try:
+        # Bounded window of batches in flight keeps memory independent of archive size
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.apply_async(_score_in_worker, (batch, include_metrics))))
+            if len(pending) >= 2 * workers:
+                batch, result = pending.popleft()
+                *scored, pid = result.get()
+                pids.add(pid)
+                yield (batch, *scored)
+        while pending:
+            batch, result = pending.popleft()
+            *scored, pid = result.get()
+            pids.add(pid)
+            yield (batch, *scored)
+        memory['workers'] = {pid: process_memory(pid) for pid in sorted(pids)}
+    finally:
+        pool.terminate()
+        pool.join()
+        _worker_agent = None
+
+
+def score_jsonl(
+    agent,
+    input_path: str,
+    output_path: str,
+    batch_size: int = 32,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = True,
+    include_metrics: bool = False,
+    report_interval: float = 10.0,
+    workers: int = 1
+) -> Dict[str, Any]:
+    """
+    Score every conversation in a JSONL file (or stdin with '-') and append one JSON
+    result per line to output_path (or stdout with '-').
+
+    Input is streamed and scored batch_size records at a time, so memory use does not
+    depend on archive size. With a file output, a checkpoint is updated after every
+    batch and a rerun resumes after the last completed batch. The checkpoint is
+    removed once the whole input has been scored.
+
+    With workers > 1, the models loaded in this process are prepared for sharing
+    (see core.forking.prepare_for_fork) and batches are scored by that many forked
+    workers, which share the model weights instead of loading their own copy. Output
+    order and checkpoints are the same as with one process; the summary then also has
+    'memory' with the parent's and each worker's rss/pss/uss.
+    """
+    if output_path == '-':
+        checkpoint = None
+    else:
+        checkpoint = ScoringCheckpoint(checkpoint_path or f"{output_path}.checkpoint")
+
+    records_done = 0
+    output_offset = 0
+    state = checkpoint.load() if (checkpoint and resume) else None
+    if state:
+        if input_path != '-' and state['input'] not in ('-', os.path.abspath(input_path)):
+            raise ValueError(
+                f"Checkpoint {checkpoint.path} belongs to input {state['input']}; "
+                f"pass --no-resume to start over."
+            )
+        if input_path == '-':
+            logger.warning("Resuming from stdin: the caller must replay the same stream from the start.")
+        records_done = state['records_done']
+        output_offset = state['output_offset']
+        print(f"[deepmost score] Resuming after {records_done} records.", file=sys.stderr, flush=True)
+
+    in_stream = sys.stdin if input_path == '-' else open(input_path, 'r', encoding='utf-8')
+    if output_path == '-':
+        out_stream = sys.stdout.buffer
+    else:
+        out_stream = open(output_path, 'r+b' if (state and os.path.exists(output_path)) else 'wb')
+        out_stream.seek(output_offset)
+        out_stream.truncate()
+
+    meter = ThroughputMeter(report_interval=report_interval)
+    memory: Dict[str, Any] = {}
+    try:
+        records = itertools.islice(read_records(in_stream), records_done, None)
+        scored = _scored_batches(agent, batched(records, batch_size), include_metrics, workers, memory)
+        for batch, rows, tokens, errors in scored:
+            out_stream.write("".join(json.dumps(row) + "\n" for row in rows).encode('utf-8'))
+            out_stream.flush()
+            records_done += len(batch)
+            if checkpoint:
+                os.fsync(out_stream.fileno())
+                checkpoint.save(input_path, records_done, out_stream.tell())
+            meter.update(len(batch) - errors, tokens, errors)
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not sys.stdout.buffer:
+            out_stream.close()
+
+    if checkpoint:
+        checkpoint.clear()
+    meter.report()
+    summary = meter.summary()
+    if memory:
+        summary['memory'] = memory
+    return summary
@@ -0,0 +1,453 @@
+"""
+HTTP prediction server with cross-request dynamic batching.
+
+An asyncio HTTP/1.1 server (standard library only) in front of one Agent. Concurrent
+requests are not scored one by one: a DynamicBatcher collects the conversations of
+all requests that arrive within max_wait_ms (up to max_batch_size) and scores them
+with a single batched embedding pass and a single PPO forward pass.
+
+    deepmost serve --port 8000 --max-batch-size 32 --max-wait-ms 5
+
+    POST /predict                {"conversation": [...]}
+    POST /progression            {"conversation": [...]}
+    POST /predict_with_response  {"conversation": [...], "user_input": "...", "system_prompt": null}
+    GET  /healthz                200 while the process serves requests
+    GET  /readyz                 200 once warmed up and not overloaded, else 503
+    GET  /stats                  queue depth, batch sizes, rejections
+
+Predictions are one-shot, like Agent.predict_batch: each request carries the whole
+conversation and no per-conversation state is kept between requests. When more
+than max_queue conversations are waiting, new requests get 503 with Retry-After
+instead of queueing without bound.
+"""
+
+import asyncio
+import json
+import logging
+import signal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+@dataclass
+class ServerConfig:
+    max_batch_size: int = 32            # Stop collecting a batch at this many conversations
+    max_wait_ms: float = 5.0            # How long the first request of a batch waits for company
+    max_queue: int = 1024               # Conversations waiting before requests are rejected with 503
+    request_timeout: Optional[float] = 30.0
+    max_body_bytes: int = 4 * 2**20
+    response_threads: int = 8           # Concurrent LLM response generations
+    concurrent_batches: Optional[int] = None  # Batches scored at once (default: 1, or 4 with remote LLM metrics)
+    warmup: bool = True
+
+
+class Overloaded(Exception):
+    """The batcher queue is full; the client should retry later"""
+
+
+class _Pending:
+    __slots__ = ('histories', 'future', 'enqueued')
+
+    def __init__(self, histories: List[List[Dict[str, str]]], future: asyncio.Future, enqueued: float):
+        self.histories = histories
+        self.future = future
+        self.enqueued = enqueued
+
+
+class DynamicBatcher:
+    """
+    Merges the conversations of concurrent requests into batched predictions.
+
+    The oldest waiting request opens a batch; the batch is scored once max_batch_size
+    conversations are waiting or that request has waited max_wait_ms, whichever
+    comes first.
+    Batches run on dedicated threads, concurrent_batches at a time, and requests
+    arriving meanwhile form the next batch, so under load batches fill up without
+    any added wait. One batch at a time suits local models, which a second batch
+    would only compete with for the same cores; with remote LLM metrics a batch
+    mostly waits on API calls, so several are scored at once.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 1024,
+        concurrent_batches: int = 1
+    ):
+        if max_batch_size < 1 or max_queue < 1 or concurrent_batches < 1:
+            raise ValueError("max_batch_size, max_queue and concurrent_batches must be positive")
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.concurrent_batches = concurrent_batches
+        self.queued = 0
+        self.scoring = 0
+        self.batches = 0
+        self.batched_conversations = 0
+        self.rejected = 0
+        self._pending: Deque[_Pending] = deque()
+        self._arrived: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor = ThreadPoolExecutor(max_workers=concurrent_batches, thread_name_prefix="deepmost-batch")
+
+    def start(self) -> None:
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrent_batches)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, histories: List[List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+        """Score the conversations with the next batch; raises Overloaded when the queue is full"""
+        if not histories:
+            return []
+        if self.queued + len(histories) > self.max_queue:
+            self.rejected += 1
+            instrumentation.count('server_rejected')
+            raise Overloaded(f"{self.queued} conversations queued")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queued += len(histories)
+        self._pending.append(_Pending(histories, future, loop.time()))
+        self._arrived.set()
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            while not self._pending:
+                self._arrived.clear()
+                await self._arrived.wait()
+            deadline = self._pending[0].enqueued + self.max_wait
+            while self.queued < self.max_batch_size and loop.time() < deadline:
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            batch, size = [], 0
+            while self._pending and size < self.max_batch_size:
+                batch.append(self._pending.popleft())
+                size += len(batch[-1].histories)
+            self.queued -= size
+            self.scoring += size
+            loop.create_task(self._score(batch)).add_done_callback(lambda _, size=size: self._finished(size))
+
+    def _finished(self, size: int) -> None:
+        self.scoring -= size
+        self._slots.release()
+
+    async def _score(self, batch: List[_Pending]) -> None:
+        # Requests that timed out or disconnected while waiting are dropped
+        batch = [pending for pending in batch if not pending.future.done()]
+        if not batch:
+            return
+        histories = [history for pending in batch for history in pending.histories]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for pending in batch:
+            instrumentation.observe('server_queue_wait', started - pending.enqueued)
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self.predictor.predict_conversions_batch, histories
+            )
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_conversations += len(histories)
+        instrumentation.observe('server_batch', loop.time() - started)
+        instrumentation.count('server_batch_conversations', len(histories))
+        offset = 0
+        for pending in batch:
+            count = len(pending.histories)
+            if not pending.future.done():
+                pending.future.set_result(results[offset:offset + count])
+            offset += count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queued,
+            'scoring': self.scoring,
+            'max_queue': self.max_queue,
+            'batches': self.batches,
+            'conversations': self.batched_conversations,
+            'mean_batch_size': round(self.batched_conversations / self.batches, 2) if self.batches else 0.0,
+            'rejected': self.rejected,
+        }
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _conversation(body: Dict[str, Any]) -> List[Dict[str, str]]:
+    from .sales import _to_message_dicts
+
+    conversation = body.get('conversation', body.get('messages'))
+    if not isinstance(conversation, list):
+        raise _HTTPError(400, "body needs a 'conversation' list")
+    if conversation and isinstance(conversation[0], str):
+        valid = all(isinstance(msg, str) for msg in conversation)
+    else:
+        valid = all(
+            isinstance(msg, dict)
+            and isinstance(msg.get('speaker', msg.get('role', '')), str)
+            and isinstance(msg.get('message', msg.get('content', '')), str)
+            for msg in conversation
+        )
+    if not valid:
+        raise _HTTPError(400, "invalid conversation: messages must all be strings, or all objects with string speaker and message")
+    return _to_message_dicts(conversation)
+
+
+class PredictionServer:
+    """
+    Serves one Agent over HTTP. start() binds the socket and, if configured, warms
+    the models up in the background: /healthz answers at once, /readyz turns 200
+    when warmup has finished.
+    """
+
+    def __init__(self, agent, config: Optional[ServerConfig] = None):
+        self.agent = agent
+        self.config = config or ServerConfig()
+        concurrent_batches = self.config.concurrent_batches
+        if concurrent_batches is None:
+            concurrent_batches = 4 if agent.predictor.remote_metrics else 1
+        self.batcher = DynamicBatcher(
+            agent.predictor,
+            max_batch_size=self.config.max_batch_size,
+            max_wait_ms=self.config.max_wait_ms,
+            max_queue=self.config.max_queue,
+            concurrent_batches=concurrent_batches
+        )
+        self.warmed_up = not self.config.warmup or agent.ready
+        self._responses = ThreadPoolExecutor(
+            max_workers=self.config.response_threads, thread_name_prefix="deepmost-response"
+        )
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = set()
+        self._warmup_task: Optional[asyncio.Task] = None
+        self.routes = {
+            ('GET', '/healthz'): self._healthz,
+            ('GET', '/readyz'): self._readyz,
+            ('GET', '/stats'): self._stats,
+            ('POST', '/predict'): self._predict,
+            ('POST', '/progression'): self._progression,
+            ('POST', '/predict_with_response'): self._predict_with_response,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.warmed_up and self.batcher.queued < self.batcher.max_queue
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> Tuple[str, int]:
+        """Start serving; returns the bound (host, port) (port 0 picks a free one)"""
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        if not self.warmed_up:
+            self._warmup_task = asyncio.get_running_loop().create_task(self._warmup())
+        address = self._server.sockets[0].getsockname()[:2]
+        logger.info(f"Serving on http://{address[0]}:{address[1]}")
+        return address
+
+    async def stop(self) -> None:
+        """Stop accepting connections, let queued batches finish, then close idle connections"""
+        if self._server is not None:
+            self._server.close()
+        while self.batcher.queued or self.batcher.scoring:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0)   # let handlers write the last responses
+        for writer in list(self._connections):
+            writer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+        await self.batcher.close()
+        self._responses.shutdown(wait=True)
+
+    async def _warmup(self) -> None:
+        report = await asyncio.get_running_loop().run_in_executor(self._responses, self.agent.warmup)
+        if report['errors']:
+            logger.warning(f"Warmup failed: {report['errors']}; not ready")
+            return
+        self.warmed_up = True
+        logger.info(f"Warmup finished in {report['total_s']:.2f}s")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and parts[-1:] == ['HTTP/1.1']
+
+                extra_headers = {}
+                if len(parts) != 3:
+                    status, payload = 400, {'error': "malformed request line"}
+                    keep_alive = False
+                elif not (headers.get('content-length') or '0').isdigit():
+                    status, payload = 400, {'error': "invalid Content-Length"}
+                    keep_alive = False
+                else:
+                    length = int(headers.get('content-length') or 0)
+                    if length > self.config.max_body_bytes:
+                        status, payload = 413, {'error': f"body larger than {self.config.max_body_bytes} bytes"}
+                        keep_alive = False
+                    else:
+                        body = await reader.readexactly(length) if length else b""
+                        status, payload, extra_headers = await self._dispatch(parts[0], parts[1].split('?')[0], body)
+
+                data = json.dumps(payload).encode('utf-8')
+                head = [
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(data)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ] + [f"{name}: {value}" for name, value in extra_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any, Dict[str, str]]:
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                return 405, {'error': f"{method} not allowed on {path}"}, {}
+            return 404, {'error': f"no route {path}"}, {}
+        try:
+            request = json.loads(body) if body else {}
+            if not isinstance(request, dict):
+                raise _HTTPError(400, "body must be a JSON object")
+            if method == 'GET':
+                return (*await handler(request), {})
+            return 200, await asyncio.wait_for(handler(request), self.config.request_timeout), {}
+        except json.JSONDecodeError as e:
+            return 400, {'error': f"invalid JSON: {e}"}, {}
+        except _HTTPError as e:
+            return e.status, {'error': str(e)}, {}
+        except Overloaded as e:
+            return 503, {'error': f"overloaded: {e}"}, {'Retry-After': "1"}
+        except asyncio.TimeoutError:
+            return 504, {'error': f"not scored within {self.config.request_timeout}s"}, {}
+        except Exception as e:
+            logger.exception(f"{method} {path} failed")
+            return 500, {'error': str(e)}, {}
+
+    # GET handlers return (status, payload)
+
+    async def _healthz(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        return 200, {'status': 'ok'}
+
+    async def _readyz(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        ready = self.ready
+        return (200 if ready else 503), {'ready': ready, 'warmed_up': self.warmed_up, 'queued': self.batcher.queued}
+
+    async def _stats(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        return 200, {**self.batcher.stats(), 'ready': self.ready}
+
+    async def _predict(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self.batcher.submit([_conversation(request)]))[0]
+
+    async def _progression(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        conversation = _conversation(request)
+        if len(conversation) > self.batcher.max_queue:
+            raise _HTTPError(413, f"{len(conversation)} messages exceed the queue of {self.batcher.max_queue} conversations")
+        # Every prefix of the conversation joins the same batch
+        results = await self.batcher.submit([conversation[:i + 1] for i in range(len(conversation))])
+        return [
+            {
+                'turn': i + 1,
+                'speaker': message['speaker'],
+                'message': message['message'],
+                'probability': result['probability'],
+                'status': result['status'],
+                'metrics': result['metrics'],
+            }
+            for i, (message, result) in enumerate(zip(conversation, results))
+        ]
+
+    async def _predict_with_response(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        conversation = _conversation(request)
+        user_input = request.get('user_input')
+        if not isinstance(user_input, str):
+            raise _HTTPError(400, "body needs a 'user_input' string")
+        predictor = self.agent.predictor
+
+        def generate() -> str:
+            # No state is kept between requests, so the history is compacted from scratch
+            return predictor.embedding_provider.generate_response(
+                history=predictor.prompt_history(conversation),
+                user_input=user_input,
+                system_prompt=request.get('system_prompt')
+            )
+
+        # Responses are generated one per request; only the scoring is batched
+        response_text = await asyncio.get_running_loop().run_in_executor(self._responses, generate)
+        prediction = await self._predict({'conversation': conversation + [
+            {'speaker': 'customer', 'message': user_input},
+            {'speaker': 'sales_rep', 'message': response_text},
+        ]})
+        return {'response': response_text, 'prediction': prediction}
+
+
+def serve(agent, host: str = "127.0.0.1", port: int = 8000, config: Optional[ServerConfig] = None) -> None:
+    """Run a PredictionServer until SIGINT/SIGTERM, then drain queued requests and exit"""
+
+    async def main():
+        server = PredictionServer(agent, config)
+        await server.start(host, port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not on Windows or outside the main thread; Ctrl+C still interrupts
+        await stop.wait()
+        logger.info("Shutting down")
+        await server.stop()
+
+    asyncio.run(main())
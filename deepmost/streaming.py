@@ -0,0 +1,331 @@
+"""Scoring of live conversation feeds: one event per message, history kept server-side"""
+
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, IO, Iterable, Iterator, List, NamedTuple, Optional
+
+from .core.utils import KeyedLocks, normalize_conversation
+
+logger = logging.getLogger(__name__)
+
+
+class TurnEvent(NamedTuple):
+    conversation_id: str
+    message: Optional[Dict[str, str]]   # None for an end-only event
+    timestamp: Optional[float]          # Event time in epoch seconds, if the feed provides it
+    end: bool                           # The conversation is over after this event
+
+
+def parse_event(event: Any) -> TurnEvent:
+    """Parse one turn event.
+
+    Accepted shape: {"conversation_id"|"id": ..., "speaker"|"role": ..., "message"|"content": ...,
+    "timestamp": optional epoch seconds, "end": optional bool}. An event with "end": true
+    and no message only closes its conversation.
+    """
+    if isinstance(event, (str, bytes)):
+        event = json.loads(event)
+    if not isinstance(event, dict):
+        raise ValueError("event must be a JSON object")
+    conversation_id = event.get('conversation_id', event.get('id'))
+    if conversation_id is None:
+        raise ValueError("event has no 'conversation_id'")
+    end = bool(event.get('end', False))
+    message = None
+    if any(key in event for key in ('message', 'content', 'speaker', 'role')):
+        message = normalize_conversation([event])[0]
+        if not isinstance(message['message'], str) or not message['speaker']:
+            raise ValueError("event needs a 'speaker' and a 'message' string")
+    elif not end:
+        raise ValueError("event has no 'message'")
+    timestamp = event.get('timestamp')
+    return TurnEvent(str(conversation_id), message, float(timestamp) if timestamp is not None else None, end)
+
+
+class _LiveConversation:
+    __slots__ = ('history', 'last_seen', 'last_result')
+
+    def __init__(self, now: float):
+        self.history: List[Dict[str, str]] = []
+        self.last_seen = now
+        self.last_result: Optional[Dict[str, Any]] = None
+
+
+class ConversationStream:
+    """
+    Scores a feed of turn events, one message per event, instead of full transcripts.
+
+    Each conversation's history and incremental prediction state (probability
+    history, keyword counts, cached metrics, history summary) are kept here, so the
+    feed sends every message once and gets an updated probability back for it:
+
+        stream = ConversationStream(agent, idle_timeout=1800)
+        for update in stream.process(events):     # or: async for ... in stream.process_async(events)
+            if update['type'] == 'prediction':
+                print(update['conversation_id'], update['probability'])
+
+    Updates are {'type': 'prediction', ...} per message, {'type': 'closed', ...} when
+    an event ends its conversation, {'type': 'expired', ...} when a conversation has
+    had no events for idle_timeout seconds (or is evicted beyond max_conversations),
+    and {'type': 'error', ...} for events that could not be parsed or scored. Closed
+    and expired conversations are forgotten, including their state in the predictor.
+
+    Idleness is measured in event time when events carry a 'timestamp' (so replays of
+    recorded feeds expire like the live feed did), otherwise in wall-clock time.
+    """
+
+    def __init__(
+        self,
+        agent,
+        idle_timeout: float = 1800.0,
+        max_conversations: Optional[int] = None,
+        include_metrics: bool = False
+    ):
+        self.predictor = agent.predictor
+        self.idle_timeout = idle_timeout
+        self.max_conversations = max_conversations
+        self.include_metrics = include_metrics
+        # Least recently active first, so expiry only looks at the front
+        self._conversations: "OrderedDict[str, _LiveConversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conversation_locks = KeyedLocks()
+        self._event_time = False
+        self.counts = {'events': 0, 'predictions': 0, 'errors': 0, 'closed': 0, 'expired': 0}
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def push(self, event: Any) -> List[Dict[str, Any]]:
+        """Score one event; returns its updates: idle expiries, its prediction, then evictions or its close"""
+        try:
+            turn_event = parse_event(event)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._count('events', 'errors')
+            return [{'type': 'error', 'error': f"invalid event: {e}"}]
+        return self._push(turn_event)
+
+    def process(self, events: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        """Score events (dicts or JSON strings) in order, yielding every update"""
+        for event in events:
+            yield from self.push(event)
+
+    async def process_async(self, events: AsyncIterable[Any], concurrency: int = 8) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Score events from an async iterator, yielding updates as they are ready.
+
+        Up to concurrency events are scored at once on worker threads; events of the
+        same conversation are still scored one after another, in feed order. Without
+        event timestamps, idle conversations also expire while the feed is quiet.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="deepmost-stream")
+        updates: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(concurrency)
+        tails: Dict[str, asyncio.Task] = {}
+        done = object()
+
+        async def score(turn_event: TurnEvent, previous: Optional[asyncio.Task]) -> None:
+            try:
+                if previous is not None:
+                    await asyncio.wait([previous])
+                for update in await loop.run_in_executor(executor, self._push, turn_event):
+                    updates.put_nowait(update)
+            finally:
+                slots.release()
+                if tails.get(turn_event.conversation_id) is asyncio.current_task():
+                    del tails[turn_event.conversation_id]
+
+        async def feed() -> None:
+            try:
+                async for event in events:
+                    try:
+                        turn_event = parse_event(event)
+                    except (ValueError, TypeError, AttributeError) as e:
+                        self._count('events', 'errors')
+                        updates.put_nowait({'type': 'error', 'error': f"invalid event: {e}"})
+                        continue
+                    await slots.acquire()
+                    previous = tails.get(turn_event.conversation_id)
+                    tails[turn_event.conversation_id] = loop.create_task(score(turn_event, previous))
+                if tails:
+                    await asyncio.wait(list(tails.values()))
+            finally:
+                updates.put_nowait(done)
+
+        async def sweep() -> None:
+            while True:
+                await asyncio.sleep(max(1.0, min(self.idle_timeout / 4, 60.0)))
+                if not self._event_time:
+                    for update in await loop.run_in_executor(executor, self.expire, time.time()):
+                        updates.put_nowait(update)
+
+        feeder = loop.create_task(feed())
+        sweeper = loop.create_task(sweep())
+        try:
+            while True:
+                update = await updates.get()
+                if update is done:
+                    break
+                yield update
+            await feeder   # re-raise errors of the input iterator
+        finally:
+            for task in (sweeper, feeder, *tails.values()):
+                task.cancel()
+            executor.shutdown(wait=False)
+
+    def expire(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Forget conversations idle for idle_timeout or longer; returns their 'expired' updates"""
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            for conversation_id, live in self._conversations.items():
+                if now - live.last_seen < self.idle_timeout:
+                    break
+                expired.append(conversation_id)
+        # Re-checked under the lock: an event may have arrived in the meantime
+        still_idle = lambda live: now - live.last_seen >= self.idle_timeout
+        return [
+            update for conversation_id in expired
+            for update in self._forget(conversation_id, 'expired', reason='idle', check=still_idle)
+        ]
+
+    def close(self) -> List[Dict[str, Any]]:
+        """End every open conversation (e.g. at the end of a recorded feed); returns their 'closed' updates"""
+        with self._lock:
+            conversation_ids = list(self._conversations)
+        return [update for conversation_id in conversation_ids for update in self._forget(conversation_id, 'closed', reason='end_of_stream')]
+
+    def _count(self, *kinds: str) -> None:
+        with self._lock:
+            for kind in kinds:
+                self.counts[kind] += 1
+
+    def _push(self, event: TurnEvent) -> List[Dict[str, Any]]:
+        self._count('events')
+        if event.timestamp is not None:
+            self._event_time = True
+        now = time.time() if event.timestamp is None else event.timestamp
+        updates = self.expire(now)
+        conversation_id = event.conversation_id
+
+        with self._conversation_locks.hold(conversation_id):
+            with self._lock:
+                live = self._conversations.get(conversation_id)
+                if live is None:
+                    live = self._conversations[conversation_id] = _LiveConversation(now)
+                self._conversations.move_to_end(conversation_id)
+                live.last_seen = max(live.last_seen, now)
+                evicted = []
+                if self.max_conversations is not None and len(self._conversations) > self.max_conversations:
+                    evicted = list(self._conversations)[:len(self._conversations) - self.max_conversations]
+
+            if event.message is not None:
+                live.history.append(event.message)
+                updates.append(self._predict(conversation_id, live))
+
+        over_capacity = lambda live: len(self._conversations) > self.max_conversations
+        for evicted_id in evicted:
+            updates.extend(self._forget(evicted_id, 'expired', reason='capacity', check=over_capacity))
+        if event.end:
+            updates.extend(self._forget(conversation_id, 'closed', reason='end'))
+        return updates
+
+    def _predict(self, conversation_id: str, live: _LiveConversation) -> Dict[str, Any]:
+        try:
+            result = self.predictor.predict_conversion(live.history, conversation_id, is_incremental_prediction=True)
+        except Exception as e:
+            logger.warning(f"Scoring event for conversation '{conversation_id}' failed: {e}")
+            self._count('errors')
+            return {'type': 'error', 'conversation_id': conversation_id, 'error': str(e)}
+        self._count('predictions')
+        live.last_result = result
+        update = {
+            'type': 'prediction',
+            'conversation_id': conversation_id,
+            'turn': result['turn'],
+            'speaker': live.history[-1]['speaker'],
+            'probability': result['probability'],
+            'status': result['status'],
+            'suggested_action': result['suggested_action'],
+            'backend': result['backend']
+        }
+        if self.include_metrics:
+            update['metrics'] = result['metrics']
+        return update
+
+    def _forget(
+        self,
+        conversation_id: str,
+        kind: str,
+        reason: str,
+        check: Optional[Callable[[_LiveConversation], bool]] = None
+    ) -> List[Dict[str, Any]]:
+        """Drop a conversation and its predictor state, unless it is gone or check(live) fails"""
+        with self._conversation_locks.hold(conversation_id):
+            with self._lock:
+                live = self._conversations.get(conversation_id)
+                if live is None or (check is not None and not check(live)):
+                    return []
+                del self._conversations[conversation_id]
+                self.counts[kind] += 1
+            self.predictor.conversation_states.pop(conversation_id, None)
+        last = live.last_result
+        return [{
+            'type': kind,
+            'reason': reason,
+            'conversation_id': conversation_id,
+            'messages': len(live.history),
+            'probability': last['probability'] if last else None,
+            'status': last['status'] if last else None
+        }]
+
+
+def stream_jsonl(
+    agent,
+    input_path: str = '-',
+    output_path: str = '-',
+    idle_timeout: float = 1800.0,
+    max_conversations: Optional[int] = None,
+    include_metrics: bool = False,
+    close_at_end: bool = True
+) -> Dict[str, Any]:
+    """
+    Score a JSONL feed of turn events (a file, or stdin with '-' as they arrive) and
+    write one JSON update per line to output_path (stdout with '-'), flushed as it is
+    produced. At the end of the input, open conversations are closed with their final
+    probability unless close_at_end is False. Returns the event counts.
+    """
+    stream = ConversationStream(
+        agent, idle_timeout=idle_timeout, max_conversations=max_conversations, include_metrics=include_metrics
+    )
+    in_stream: IO[str] = sys.stdin if input_path == '-' else open(input_path, encoding='utf-8')
+    out_stream: IO[str] = sys.stdout if output_path == '-' else open(output_path, 'a', encoding='utf-8')
+
+    def write(updates: List[Dict[str, Any]], line_number: Optional[int] = None) -> None:
+        for update in updates:
+            if update['type'] == 'error' and line_number is not None:
+                update['line'] = line_number
+            out_stream.write(json.dumps(update) + "\n")
+        out_stream.flush()
+
+    try:
+        for line_number, line in enumerate(in_stream, start=1):
+            if line.strip():
+                write(stream.push(line), line_number)
+        if close_at_end:
+            write(stream.close())
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not sys.stdout:
+            out_stream.close()
+
+    summary = {**stream.counts, 'open': len(stream)}
+    logger.info(f"Event stream finished: {summary}")
+    return summary